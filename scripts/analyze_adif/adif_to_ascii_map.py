@@ -1,5 +1,6 @@
 """Module to convert adif file into ascii map."""
-import re
+from collections import Counter
+import locator
 import common
 
 
@@ -10,46 +11,60 @@ import common
 WIDTH = 100
 HEIGHT = 30
 
-# ----------------------------------------------------------------------
-# 2. FONCTIONS DE CONVERSION
-# ----------------------------------------------------------------------
+class AsciiMapAnalysis(common.Analysis):
+    """Compte les contacts par carré (4 chars) pour la carte ASCII."""
 
-def locator_to_latlon(locator):
-    """Convertit un Maidenhead Locator (ex: JN23) en Lat/Lon décimales."""
-    locator = locator.upper()
-    try:
-        # Longitude : les deux premières lettres
-        lon = (ord(locator[0]) - ord('A')) * 20 - 180
-        # Latitude : les deux lettres suivantes
-        lat = (ord(locator[1]) - ord('A')) * 10 - 90
-
-        # Ajout des chiffres pour plus de précision (4 caractères)
-        if len(locator) >= 4:
-            lon += int(locator[2]) * 2
-            lat += int(locator[3]) * 1
-
-        # On centre au milieu du carreau (0.5 pour la précision)
-        return lat + 0.5, lon + 1.0
-    except Exception:
-        return None
-
-def parse_adif_locators(filepath):
-    """Extrait les codes GRIDSQUARE du fichier ADIF."""
+    # Champs ADIF utilisés
+    FIELDS = frozenset(['GRIDSQUARE'])
+
+    def __init__(self):
+        self.locators = Counter()
+
+    def update(self, qso):
+        if not qso.grid:
+            return False
+        self.locators[qso.grid[:4]] += 1
+        return True
+
+    def run_store(self, store):
+        for grid, count in store.select("substr(grid, 1, 4), COUNT(*)", "grid IS NOT NULL", "1"):
+            self.locators[grid] += count
+        return self
+
+    def retained_count(self):
+        # QSO avec locator
+        return self.locators.total()
+
+    def params(self):
+        return {'width': WIDTH, 'height': HEIGHT}
+
+    def result(self):
+        return common.table_result("Carte des contacts", ['locator', 'contacts'],
+                                   sorted(self.locators.items()), total=self.locators.total())
+
+    def report(self):
+        tracer_carte(self.locators)
+
+def extract_locators(adif_records):
+    """Extrait les codes GRIDSQUARE (carré de 4 chars, ex: JN23) des enregistrements ADIF."""
+    return [qso.grid[:4] for qso in common.iter_qsos(adif_records) if qso.grid]
+
+def parse_adif_locators(filepaths, use_cache=True, jobs=1):
+    """Extrait les codes GRIDSQUARE des fichiers ADIF (un chemin ou une liste, dossiers acceptés)."""
     try:
-        with open(filepath, 'r', encoding='utf-8', errors='ignore') as f:
-            content = f.read()
-            # On cherche les balises <GRIDSQUARE:4>JN23 par exemple
-            return re.findall(r'<GRIDSQUARE:\d+>([A-R]{2}\d{2})', content, re.IGNORECASE)
-    except FileNotFoundError:
-        print(f"Erreur : Le fichier '{filepath}' est introuvable.")
+        table = common.load_qso_logs(filepaths, use_cache=use_cache, jobs=jobs,
+                                     fields=AsciiMapAnalysis.FIELDS)
+        return extract_locators(table)
+    except FileNotFoundError as e:
+        print(f"Erreur : Le fichier '{e.filename}' est introuvable.")
         return []
 
 # ----------------------------------------------------------------------
-# 3. GÉNÉRATION DE LA CARTE
+# 2. GÉNÉRATION DE LA CARTE
 # ----------------------------------------------------------------------
 
 def tracer_carte(locators):
-    """Trace ascii map function."""
+    """Trace ascii map function (liste de locators ou Counter {locator: contacts})."""
     # Initialiser une grille vide
     grid = [[' ' for _ in range(WIDTH)] for _ in range(HEIGHT)]
 
@@ -69,10 +84,13 @@ def tracer_carte(locators):
 
     # --- PLACER LES CONTACTS ---
     points_plottes = 0
-    for loc in locators:
-        coords = locator_to_latlon(loc)
-        if coords:
-            lat, lon = coords
+    counts = locators if isinstance(locators, Counter) else Counter(locators)
+    for loc, count in counts.items():
+        try:
+            lat, lon = locator.locator_to_latlon(loc)
+        except ValueError:
+            lat = lon = None
+        if lat is not None:
             # Projection simple sur la grille
             # X: -180 à 180 -> 0 à WIDTH
             x = int(((lon + 180) / 360) * (WIDTH - 1))
@@ -82,11 +100,11 @@ def tracer_carte(locators):
             if 0 <= x < WIDTH and 0 <= y < HEIGHT:
                 # 'X' écrase l'équateur si le contact est pile dessus
                 grid[y][x] = 'X'
-                points_plottes += 1
+                points_plottes += count
 
     # --- AFFICHAGE FINAL ---
     print("\n" + "=" * WIDTH)
-    print(f" CARTE DES CONTACTS ADIF - F4LNO (Total: {len(locators)} contacts)")
+    print(f" CARTE DES CONTACTS ADIF - F4LNO (Total: {counts.total()} contacts)")
     print("=" * WIDTH)
 
     for row in grid:
@@ -98,10 +116,16 @@ def tracer_carte(locators):
     print("")
 
 # ----------------------------------------------------------------------
-# 4. LANCEMENT
+# 3. LANCEMENT
 # ----------------------------------------------------------------------
 if __name__ == "__main__":
     args = common.get_args("Adif to Ascii Map")
-    liste_locs = parse_adif_locators(args.file)
-    if liste_locs:
-        tracer_carte(liste_locs)
+    try:
+        records = common.load_qso_logs(args.file, use_cache=args.cache, jobs=args.jobs,
+                                       fields=AsciiMapAnalysis.FIELDS)
+    except FileNotFoundError as e:
+        print(f"Erreur : Le fichier '{e.filename}' est introuvable.")
+    else:
+        carte = AsciiMapAnalysis().run(records)
+        if carte.locators:
+            carte.report()
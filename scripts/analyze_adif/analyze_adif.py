@@ -2,39 +2,286 @@
 """
 Analyse les fichiers ADIF
 """
-import adif_to_ascii_map as aam
-import analyze_adif_dx_performance as adx
-import analyze_adif_schedule as ads
-import analyze_snr_performance as asp
-import find_top_dx_contacts as ftdx
-import analyze_adif_mode as adm
-import analyze_greyline_dx as agd
-import analyze_weekly_traffic as awt
-import analyze_by_country as abc
-import analyze_antipode as aap
-import generate_antenna_pattern as gap
+# Les modules des analyses, de la base SQLite et du profilage sont importés à la demande : une sous-commande ne charge que ce qu'elle utilise.
+# pylint: disable=import-outside-toplevel
+import os
+import sys
+import time
+import argparse
+import importlib
+from datetime import datetime
 import common
+import results
+import shared_table
 
-def main(adif_records, adif_file, locator, cty_dat_path=None):
-    """ Exécute toutes les analyses ADIF disponibles. """
-    aam.tracer_carte(aam.parse_adif_locators(adif_file))
-    gap.draw_star_radar(adif_records, locator)
-    aap.find_closest_points(adif_records, locator)
-    adx.analyze_dx_performance(adif_records, locator)
-    awt.analyze_weekly_traffic(adif_records)
-    adm.analyze_adif_modes(adif_records)
-    ads.analyze_adif_log(adif_records)
-    asp.analyze_snr(adif_records)
-    abc.analyze_contacts_by_band_country(adif_records, cty_dat_path=cty_dat_path)
-    ftdx.find_top_dx(adif_records, locator, cty_dat_path=cty_dat_path)
-    agd.analyze_greyline(adif_records, locator)
+# Suffixe du fichier d'état du mode incrémental (ex: f4lno.adif.state)
+STATE_SUFFIX = '.state'
+# Version du format de l'état : à incrémenter quand les analyses changent
+STATE_VERSION = 7
+# Intervalle (secondes) entre deux vérifications du fichier en mode --watch
+WATCH_INTERVAL = 5.0
 
-if __name__ == "__main__":
-    args = common.get_args()
+# Registre des analyses du rapport complet, dans l'ordre d'affichage :
+# nom (sous-commande ou option --only) -> (module, fabrique (module, locator, cty_dat_path) -> Analysis).
+# Le module d'une analyse n'est importé qu'à sa création.
+ANALYSES = {
+    'map': ('adif_to_ascii_map', lambda m, locator, cty_dat_path: m.AsciiMapAnalysis()),
+    'radar': ('generate_antenna_pattern', lambda m, locator, cty_dat_path: m.StarRadarAnalysis(locator)),
+    'antipode': ('analyze_antipode', lambda m, locator, cty_dat_path: m.AntipodeAnalysis(locator)),
+    'dx': ('analyze_adif_dx_performance', lambda m, locator, cty_dat_path: m.DxPerformanceAnalysis(locator)),
+    'weekly': ('analyze_weekly_traffic', lambda m, locator, cty_dat_path: m.WeeklyTrafficAnalysis()),
+    'mode': ('analyze_adif_mode', lambda m, locator, cty_dat_path: m.ModeAnalysis()),
+    'schedule': ('analyze_adif_schedule', lambda m, locator, cty_dat_path: m.ScheduleAnalysis()),
+    'snr': ('analyze_snr_performance', lambda m, locator, cty_dat_path: m.SnrAnalysis()),
+    'country': ('analyze_by_country',
+                lambda m, locator, cty_dat_path: m.CountryAnalysis(cty_dat_path=cty_dat_path)),
+    'zones': ('analyze_by_zone', lambda m, locator, cty_dat_path: m.ZoneAnalysis(cty_dat_path=cty_dat_path)),
+    'topdx': ('find_top_dx_contacts',
+              lambda m, locator, cty_dat_path: m.TopDxAnalysis(locator, cty_dat_path=cty_dat_path)),
+    'greyline': ('analyze_greyline_dx', lambda m, locator, cty_dat_path: m.GreylineAnalysis(locator)),
+}
+
+def analysis_names(only=None):
+    """ Noms des analyses du rapport complet (ou de celles nommées dans only), dans l'ordre d'affichage. """
+    return [name for name in ANALYSES if not only or name in only]
+
+def analysis_arg(name):
+    """ Type argparse des sous-commandes : nom d'une analyse du registre. """
+    if name not in ANALYSES:
+        raise argparse.ArgumentTypeError(f"analyse inconnue : {name} (choix : {', '.join(ANALYSES)})")
+    return name
+
+def build_analysis(name, locator, cty_dat_path=None):
+    """ Crée l'analyse name, en important son module si besoin. """
+    module_name, factory = ANALYSES[name]
+    return factory(importlib.import_module(module_name), locator, cty_dat_path)
+
+def build_analyses(locator, cty_dat_path=None, only=None):
+    """ Crée les analyses du rapport complet (ou celles nommées dans only), dans l'ordre d'affichage. """
+    return [build_analysis(name, locator, cty_dat_path) for name in analysis_names(only)]
+
+def main(adif_records, locator, cty_dat_path=None, only=None):
+    """ Exécute toutes les analyses ADIF disponibles sur une même QSOTable (ou un QSOStore).
+
+    Les analyses sont alimentées ensemble, en un seul passage sur les QSO.
+    """
+    print(run_and_render(build_analyses(locator, cty_dat_path, only), adif_records,
+                         names=analysis_names(only)), end='')
+
+def run_and_render(analyses, adif_records, jobs=1, fmt='text', names=None):
+    """ Alimente les analyses (en un seul passage, ou en parallèle sur jobs processus),
+        puis retourne le rendu de leurs résultats dans l'ordre, au format fmt.
+    """
+    analyses = shared_table.run_analyses_parallel(analyses, adif_records, jobs)
+    return results.render(list(zip(names or analysis_names(), analyses)), fmt)
+
+def write_output(output, path=None):
+    """ Affiche le rendu du rapport, ou l'écrit dans le fichier path. """
+    if not path:
+        print(output, end='')
+        return
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        f.write(output)
+    print(f"Rapport écrit dans {path}", file=sys.stderr)
+
+def cached_report(args, named_analyses):
+    """ Cache des rendus et clé du rapport demandé, ou (None, None) avec --no-cache. """
+    if not args.cache:
+        return None, None
+    adif_files = common.list_adif_files(args.file)
+    store_params = () if args.store is None else (
+        'store', args.store, args.band, args.mode, args.since, args.until)
+    key = results.result_key(adif_files, args.ctydat, args.format, named_analyses, store_params)
+    return results.ResultCache(adif_files), key
+
+def load_records(args, analyses):
+    """ Charge les QSO des fichiers : QSOTable des champs utiles aux analyses,
+        ou base SQLite synchronisée et filtrée avec --store.
+    """
+    if args.store is None:
+        return common.load_qso_logs(args.file, use_cache=args.cache, jobs=args.jobs,
+                                    fields=common.analysis_fields(analyses))
+    import qso_store
+    store, read_qsos = qso_store.open_store(args.file, args.store or None)
+    store.set_filter(band=args.band, mode=args.mode, since=args.since, until=args.until)
+    print(f"Base {store.db_path} : {read_qsos} nouveaux QSO lus, {len(store)} QSO analysés", file=sys.stderr)
+    return store
+
+def run_report(args):
+    """ Rapport complet selon les options ; avec --profile/--cprofile, chaque étape est mesurée.
+
+    Hors profilage, un rendu déjà calculé pour les mêmes fichiers et
+    paramètres est repris du cache (<fichier>.results) sans relire les QSO.
+    """
+    names = analysis_names(args.only)
+    analyses = build_analyses(args.locator, args.ctydat, args.only)
+    if args.profile is None and args.cprofile is None:
+        cache, key = cached_report(args, list(zip(names, analyses)))
+        output = cache.get(key) if cache else None
+        if output is not None:
+            write_output(output, args.output)
+            return
+        adif_records = load_records(args, analyses)
+        output = run_and_render(analyses, adif_records, jobs=args.jobs, fmt=args.format, names=names)
+        if cache:
+            cache.put(key, output)
+        write_output(output, args.output)
+    else:
+        import profiling
+        # Les analyses sont exécutées une par une, pour être mesurées séparément
+        with profiling.Profiler(args.cprofile) as profiler:
+            adif_records, _ = profiler.measure('chargement', load_records, args, analyses)
+            profiler.run_analyses(list(zip(names, analyses)), adif_records)
+        write_output(results.render(list(zip(names, analyses)), args.format), args.output)
+        profiler.report()
+        if args.profile:
+            profiler.write_json(args.profile)
+            print(f"Profil écrit dans {args.profile}", file=sys.stderr)
+    if args.store is not None:
+        adif_records.close()
+
+def load_state(adif_file, locator, cty_dat_path=None, only=None):
+    """ Charge l'état incrémental sauvegardé, ou en crée un nouveau.
+
+    L'état sauvegardé n'est repris que si les paramètres (analyses choisies
+    comprises) sont identiques et si le fichier n'a fait que grandir depuis
+    (début et fin déjà lus inchangés).
+    """
+    params = (os.path.abspath(adif_file), locator, cty_dat_path, tuple(sorted(only or ())))
+    state = common.load_pickle(adif_file + STATE_SUFFIX, STATE_VERSION)
+    if state and state['params'] == params and state_matches(state, adif_file):
+        return state
+    return {'version': STATE_VERSION, 'params': params, 'offset': 0,
+            'checks': common.append_checks(adif_file, 0),
+            'analyses': build_analyses(locator, cty_dat_path, only), 'seen': set()}
+
+def state_matches(state, adif_file):
+    """ Vrai si le fichier n'a fait que grandir depuis la dernière lecture de l'état. """
+    return (os.path.getsize(adif_file) >= state['offset']
+            and state['checks'] == common.append_checks(adif_file, state['offset']))
+
+def update_state(state, adif_file):
+    """ Ajoute aux analyses les QSO écrits après l'offset sauvegardé ; retourne leur nombre.
+
+    Les doublons (clé common.qso_key déjà lue) sont ignorés, comme par common.load_qso_logs.
+    """
+    analyses, seen = state['analyses'], state['seen']
+    wanted = common.analysis_fields(analyses) | common.DEDUP_FIELDS
+    new_qsos = 0
+    for record, end in common.iter_adif_tail(adif_file, state['offset'], wanted=wanted):
+        qso = common.record_to_qso(record)
+        state['offset'] = end
+        new_qsos += 1
+        if qso.time is not None:
+            key = common.qso_key(qso)
+            if key in seen:
+                continue
+            seen.add(key)
+        for analysis in analyses:
+            analysis.update(qso)
+    state['checks'] = common.append_checks(adif_file, state['offset'])
+    return new_qsos
+
+def run_incremental(adif_file, locator, cty_dat_path=None, only=None, *, fmt='text', output=None):
+    """ Rapport complet en ne lisant que les QSO ajoutés depuis la dernière exécution.
+
+    Le rapport est rendu dans le format fmt et écrit dans output si fourni.
+    """
+    state = load_state(adif_file, locator, cty_dat_path, only)
+    start = state['offset']
+    new_qsos = update_state(state, adif_file)
+    common.save_pickle(adif_file + STATE_SUFFIX, state)
+    print(f"Mode incrémental : {new_qsos} nouveaux QSO lus à partir de l'octet {start}", file=sys.stderr)
+    write_output(results.render(list(zip(analysis_names(only), state['analyses'])), fmt), output)
+
+def watch(adif_file, locator, cty_dat_path=None, only=None, interval=WATCH_INTERVAL, *, fmt='text', output=None):
+    """ Surveille le fichier ADIF et réaffiche les rapports à chaque nouveau QSO (Ctrl+C pour arrêter).
+
+    Le fichier n'est relu que si sa taille ou sa date de modification change,
+    et seulement à partir du dernier offset lu : les analyses restent en
+    mémoire entre deux mises à jour, l'état est sauvegardé comme en mode -i.
+    Chaque rapport est rendu dans le format fmt ; avec output, le fichier
+    est réécrit à chaque mise à jour.
+    """
+    state = load_state(adif_file, locator, cty_dat_path, only)
+    last_stat = None
+    try:
+        while True:
+            stat = os.stat(adif_file)
+            if (stat.st_size, stat.st_mtime_ns) != last_stat:
+                first = last_stat is None
+                last_stat = (stat.st_size, stat.st_mtime_ns)
+                if not state_matches(state, adif_file):
+                    # Fichier réécrit (et non seulement complété) : on repart de zéro
+                    state = {**state, 'offset': 0, 'checks': common.append_checks(adif_file, 0),
+                             'analyses': build_analyses(locator, cty_dat_path, only), 'seen': set()}
+                start = state['offset']
+                new_qsos = update_state(state, adif_file)
+                if new_qsos or first:
+                    common.save_pickle(adif_file + STATE_SUFFIX, state)
+                    print(f"\n=== {datetime.now():%H:%M:%S} : {new_qsos} nouveaux QSO lus"
+                          f" à partir de l'octet {start} ===", file=sys.stderr)
+                    write_output(results.render(list(zip(analysis_names(only), state['analyses'])), fmt), output)
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        print("\nSurveillance arrêtée.", file=sys.stderr)
+
+def build_parser():
+    """Construit l'analyseur de la ligne de commande de analyze_adif.py"""
+    parser = common.build_parser()
+    parser.add_argument('analyses', nargs='*', type=analysis_arg, metavar='ANALYSE',
+                        help="Sous-commandes : analyses à exécuter (ex: analyze_adif.py schedule snr),"
+                        " comme --only ; seuls leurs modules sont importés")
+    parser.add_argument('-i', '--incremental', action='store_true',
+                        help=f"Ne lire que les QSO ajoutés depuis la dernière exécution (état dans <fichier>{STATE_SUFFIX})")
+    parser.add_argument('--only', nargs='+', choices=ANALYSES, metavar='ANALYSE',
+                        help=f"N'exécuter que ces analyses ({', '.join(ANALYSES)}) : seuls les champs ADIF"
+                        " dont elles ont besoin sont décodés")
+    parser.add_argument('-w', '--watch', nargs='?', type=float, const=WATCH_INTERVAL, metavar='SECONDES',
+                        help="Surveiller le fichier et réafficher les rapports à chaque nouveau QSO"
+                        f" (vérification toutes les {WATCH_INTERVAL:g} s par défaut)")
+    parser.add_argument('--format', choices=results.FORMATS, default='text',
+                        help="Format du rapport : texte, JSON ou CSV (une section par analyse) (defaut: text)")
+    parser.add_argument('-o', '--output', metavar='FICHIER', help="Écrire le rapport dans FICHIER")
+    profile_group = parser.add_argument_group("profilage")
+    profile_group.add_argument('--profile', nargs='?', const='', metavar='JSON',
+                               help="Mesurer chaque analyse (temps réel et CPU, QSO traités et ignorés,"
+                               " pic mémoire) ; écrit aussi les mesures dans JSON si fourni")
+    profile_group.add_argument('--cprofile', choices=ANALYSES, metavar='ANALYSE',
+                               help="Profiler une analyse avec cProfile (fichier <analyse>.pstats)")
+    store_group = parser.add_argument_group("base SQLite")
+    store_group.add_argument('--store', nargs='?', const='', metavar='BASE',
+                             help="Analyser via une base SQLite indexée, mise à jour de façon incrémentale"
+                             " (defaut: <fichier>.sqlite)")
+    store_group.add_argument('--band', help="Avec --store : ne garder qu'une bande (ex: 20m)")
+    store_group.add_argument('--mode', help="Avec --store : ne garder qu'un mode (ex: FT8)")
+    store_group.add_argument('--since', type=common.date_arg,
+                             help="Avec --store : QSO à partir de cette date (AAAAMMJJ)")
+    store_group.add_argument('--until', type=common.date_arg,
+                             help="Avec --store : QSO jusqu'à cette date incluse (AAAAMMJJ)")
+    return parser
+
+def cli():
+    """ Point d'entrée de la ligne de commande. """
+    args = common.get_args(parser=build_parser())
+    args.only = (args.only or []) + args.analyses or None
     try:
-        records = common.read_file_content(args.file)
-        main(records, args.file, args.locator, cty_dat_path=args.ctydat)
-    except FileNotFoundError:
-        print(f"ERREUR: Le fichier {args.file} est introuvable.")
+        if args.incremental or args.watch is not None:
+            adif_files = common.list_adif_files(args.file)
+            if len(adif_files) > 1:
+                print("ERREUR: Les modes incrémental et surveillance ne prennent qu'un seul fichier ADIF.", file=sys.stderr)
+            elif args.watch is not None:
+                watch(adif_files[0], args.locator, cty_dat_path=args.ctydat, only=args.only, interval=args.watch,
+                      fmt=args.format, output=args.output)
+            else:
+                run_incremental(adif_files[0], args.locator, cty_dat_path=args.ctydat, only=args.only,
+                                fmt=args.format, output=args.output)
+        else:
+            run_report(args)
+    except FileNotFoundError as e:
+        print(f"ERREUR: Le fichier {e.filename} est introuvable.", file=sys.stderr)
     except Exception as e:
-        print(f"Une erreur s'est produite lors de l'exécution: {e}")
+        print(f"Une erreur s'est produite lors de l'exécution: {e}", file=sys.stderr)
+
+if __name__ == "__main__":
+    cli()
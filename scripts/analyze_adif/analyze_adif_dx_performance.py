@@ -1,113 +1,178 @@
 """ Analyse de Performance DX (Mode et Bande) """
-import re
 from collections import defaultdict
+import geodesy
+import distance_cache
 import common
 
-# --- Fonction d'Analyse Principale ---
 
-def analyze_dx_performance(adif_records, my_locator):
-    """ Analyse la performance DX par mode et bande à partir des enregistrements ADIF. """
-    # my_loc_lat, my_loc_lon sont calculés une seule fois
-    my_loc_lat, my_loc_lon = common.locator_to_latlon(my_locator)
+def _empty_dx():
+    """ Somme des distances et nombre de contacts à zéro pour une combinaison (bande, mode). """
+    return {'distance_sum': 0.0, 'count': 0}
 
-    if my_loc_lat is None:
-        print(f"ERREUR: Localisateur QRA '{my_locator}' invalide ou trop court. Le programme s'arrête.")
-        return
-
-    # Structure de stockage : {(band, mode): {'distances': [list], 'count': int}}
-    dx_data = defaultdict(lambda: {'distances': [], 'count': 0})
-    total_contacts = 0
-    contacts_with_locators = 0
+# --- Fonction d'Analyse Principale ---
 
-    # Regex pour extraire les champs
-    re_mode = re.compile(r'<MODE:\d+>([A-Z0-9]+)')
-    re_freq = re.compile(r'<FREQ:\d+>([\d.]+)')
-    re_grid = re.compile(r'<GRIDSQUARE:\d+>([A-Z]{2}\d{2}[A-Z]{0,2})') # Capture jusqu'à 6 chars (ex: JN33AA)
+class DxPerformanceAnalysis(common.Analysis):
+    """ Performance DX (distance moyenne) par mode et bande. """
 
-    for record in adif_records:
-        if not record.strip():
-            continue
+    # Champs ADIF utilisés
+    FIELDS = frozenset(['MODE', 'FREQ', 'GRIDSQUARE', 'MY_GRIDSQUARE'])
 
-        total_contacts += 1
+    def __init__(self, my_locator):
+        self.my_locator = my_locator
+        # my_loc_lat, my_loc_lon sont calculés une seule fois
+        self.my_loc_lat, self.my_loc_lon = common.locator_to_latlon(my_locator)
 
-        # 1. Extraction
-        match_mode = re_mode.search(record)
-        match_freq = re_freq.search(record)
-        match_grid = re_grid.search(record)
+        # Structure de stockage : {(band, mode): {'distance_sum': float, 'count': int}}
+        self.dx_data = defaultdict(_empty_dx)
+        self.total_contacts = 0
+        self.contacts_with_locators = 0
 
-        if not (match_mode and match_freq and match_grid):
-            continue
+    def update(self, qso):
+        if self.my_loc_lat is None:
+            return False
 
-        mode = match_mode.group(1).strip()
-        freq_mhz = float(match_freq.group(1))
-        band = common.get_band_from_frequency(freq_mhz)
-        other_locator = match_grid.group(1).strip()
+        self.total_contacts += 1
 
-        if len(other_locator) < 4:
-            continue # Nécessite au moins 4 caractères pour le calcul
+        # 1. Extraction (locator jusqu'à 6 chars, ex: JN33AA)
+        mode, band = qso.mode, qso.band
 
-        contacts_with_locators += 1
+        if not mode or band is None or not qso.grid:
+            return False
 
-        # 2. Calcul de la distance
-        other_lat, other_lon = common.locator_to_latlon(other_locator)
-        if other_lat is None:
-            continue
+        self.contacts_with_locators += 1
 
-        distance_km = common.haversine_distance(my_loc_lat, my_loc_lon, other_lat, other_lon)
+        # 2. Distance depuis la station du QSO (MY_GRIDSQUARE, sinon --locator), cache partagé
+        distance_km = distance_cache.shared_cache().lookup(qso.my_grid or self.my_locator, qso.grid)[0]
 
         # 3. Agrégation
         key = (band, mode)
-        dx_data[key]['distances'].append(distance_km)
-        dx_data[key]['count'] += 1
-
-    # --- Calcul des Résultats Finals ---
-    results = []
-    for (band, mode), data in dx_data.items():
-        if data['count'] > 0:
-            avg_distance = sum(data['distances']) / data['count']
-            results.append({
-                'band': band,
-                'mode': mode,
-                'count': data['count'],
-                'avg_distance': avg_distance
-            })
-
-    # Trier les résultats par distance moyenne (du plus grand au plus petit)
-    results.sort(key=lambda x: x['avg_distance'], reverse=True)
-
-    # --- Affichage ---
-    print("\n--- Analyse de Performance DX (Mode et Bande) ---")
-    print(f"Localisateur QRA de la station : {my_locator}")
-    print(f"Total des contacts analysés : {total_contacts}")
-    print(f"Contacts avec localisateur QRA : {contacts_with_locators}\n")
-
-    header = f"{'Bande':<6} | {'Mode':<6} | {'Contacts':<8} | {'Distance Moyenne (km)':<25}"
-    separator = "-" * len(header)
-
-    print("Classement des Combinaisons (Mode / Bande) par Performance DX :")
-    print(separator)
-    print(header)
-    print(separator)
-
-    for item in results:
-        row = (
-            f"{item['band']:<6} | "
-            f"{item['mode']:<6} | "
-            f"{item['count']:<8} | "
-            f"{item['avg_distance']:<25.2f}"
-        )
-        print(row)
-
-    print(separator)
-    print("\n*La Distance Moyenne (km) est l'indicateur clé de la performance DX.")
+        self.dx_data[key]['distance_sum'] += distance_km
+        self.dx_data[key]['count'] += 1
+        return True
+
+    def run_table(self, table):
+        np = geodesy.numpy_module()
+        if np is None or self.my_loc_lat is None:
+            return super().run_table(table)
+
+        self.total_contacts += len(table)
+        cols = table.columns
+        bands = np.asarray(cols['band']).astype(np.int64)
+        modes = np.asarray(cols['mode']).astype(np.int64)
+        rows = (modes >= 0) & (bands >= 0) & (np.asarray(cols['grid']) >= 0)
+        self.contacts_with_locators += int(rows.sum())
+
+        # Une distance par couple (station, locator) distinct, lue dans le cache partagé
+        # ou calculée en un lot
+        cache = distance_cache.shared_cache()
+        distances, _ = cache.lookup_rows(table, self.my_locator, np.flatnonzero(rows))
+        # Agrégation par (bande, mode) ; bincount somme dans l'ordre des QSO, comme update()
+        mode_count = len(table.strings['mode'])
+        keys, firsts, groups = np.unique(bands[rows] * mode_count + modes[rows],
+                                         return_index=True, return_inverse=True)
+        sums = np.bincount(groups, weights=distances, minlength=len(keys))
+        counts = np.bincount(groups, minlength=len(keys))
+        for i in np.argsort(firsts):
+            band, mode = divmod(int(keys[i]), mode_count)
+            data = self.dx_data[(common.BANDS[band], table.strings['mode'][mode])]
+            data['distance_sum'] += float(sums[i])
+            data['count'] += int(counts[i])
+        cache.save()
+        return self
+
+    def run_store(self, store):
+        if self.my_loc_lat is None:
+            return self
+
+        self.total_contacts += store.count()
+        # Une distance par couple (station, locator) distinct, pondérée par le nombre de contacts
+        cache = distance_cache.shared_cache()
+        for band, mode, grid, my_grid, count in store.select(
+                "band, mode, grid, my_grid, COUNT(*)",
+                "mode IS NOT NULL AND band IS NOT NULL AND grid IS NOT NULL", "band, mode, grid, my_grid"):
+            self.contacts_with_locators += count
+            distance_km = cache.lookup(my_grid or self.my_locator, grid)[0]
+            self.dx_data[(band, mode)]['distance_sum'] += distance_km * count
+            self.dx_data[(band, mode)]['count'] += count
+        return self
+
+    def params(self):
+        return {'locator': self.my_locator}
+
+    def ranking(self):
+        """ Combinaisons (bande, mode) classées par distance moyenne décroissante. """
+        results = []
+        for (band, mode), data in self.dx_data.items():
+            if data['count'] > 0:
+                avg_distance = data['distance_sum'] / data['count']
+                results.append({
+                    'band': band,
+                    'mode': mode,
+                    'count': data['count'],
+                    'avg_distance': avg_distance
+                })
+
+        # Trier les résultats par distance moyenne (du plus grand au plus petit)
+        results.sort(key=lambda x: x['avg_distance'], reverse=True)
+        return results
+
+    def retained_count(self):
+        # QSO dont la distance est calculée
+        return self.contacts_with_locators
+
+    def result(self):
+        return common.table_result(
+            "Performance DX par mode et bande", ['band', 'mode', 'contacts', 'avg_distance_km'],
+            ((item['band'], item['mode'], item['count'], item['avg_distance']) for item in self.ranking()),
+            locator=self.my_locator, locator_valid=self.my_loc_lat is not None,
+            total_contacts=self.total_contacts, contacts_with_locators=self.contacts_with_locators)
+
+    def report(self):
+        if self.my_loc_lat is None:
+            print(f"ERREUR: Localisateur QRA '{self.my_locator}' invalide ou trop court. Le programme s'arrête.")
+            return
+
+        results = self.ranking()
+
+        # --- Affichage ---
+        print("\n--- Analyse de Performance DX (Mode et Bande) ---")
+        print(f"Localisateur QRA de la station : {self.my_locator}")
+        print(f"Total des contacts analysés : {self.total_contacts}")
+        print(f"Contacts avec localisateur QRA : {self.contacts_with_locators}\n")
+
+        header = f"{'Bande':<6} | {'Mode':<6} | {'Contacts':<8} | {'Distance Moyenne (km)':<25}"
+        separator = "-" * len(header)
+
+        print("Classement des Combinaisons (Mode / Bande) par Performance DX :")
+        print(separator)
+        print(header)
+        print(separator)
+
+        for item in results:
+            row = (
+                f"{item['band']:<6} | "
+                f"{item['mode']:<6} | "
+                f"{item['count']:<8} | "
+                f"{item['avg_distance']:<25.2f}"
+            )
+            print(row)
+
+        print(separator)
+        print("\n*La Distance Moyenne (km) est l'indicateur clé de la performance DX.")
+
+
+def analyze_dx_performance(adif_records, my_locator):
+    """ Analyse la performance DX par mode et bande à partir des enregistrements ADIF. """
+    DxPerformanceAnalysis(my_locator).run(adif_records).report()
 
 # --- Exécution ---
 if __name__ == "__main__":
     args = common.get_args("Analyse de Performance DX (Mode et Bande)")
     try:
-        records = common.read_file_content(args.file)
+        records = common.load_qso_logs(args.file, use_cache=args.cache, jobs=args.jobs,
+                                       fields=DxPerformanceAnalysis.FIELDS)
         analyze_dx_performance(records, args.locator)
-    except FileNotFoundError:
-        print(f"ERREUR: Le fichier {args.file} est introuvable.")
+    except FileNotFoundError as e:
+        print(f"ERREUR: Le fichier {e.filename} est introuvable.")
     except Exception as e:
         print(f"Une erreur s'est produite lors de l'analyse: {e}")
@@ -1,41 +1,164 @@
 """Module to calculate antipode, antecoique, periecoique from adif file"""
-import re
+import csv
+import geodesy
+import spatial_index
 import common # Utilise ton fichier common.py existant
 
-def find_closest_points(adif_records, my_loc):
-    """Closest contact from adif file for antipode, antecoique, periecoique"""
-    lat, lon = common.locator_to_latlon(my_loc)
 
-    # Définition des 3 points cibles
-    targets = {
+def load_targets(csv_path):
+    """Charge des points cibles d'un CSV : nom,latitude,longitude ou nom,locator par ligne.
+
+    Les lignes vides, commentées (#) ou dont les coordonnées sont illisibles
+    (ligne d'en-tête) sont ignorées. Retourne {nom: (lat, lon)}.
+    """
+    targets = {}
+    with open(csv_path, encoding='utf-8', newline='') as f:
+        for row in csv.reader(f):
+            row = [value.strip() for value in row]
+            if not row or not row[0] or row[0].startswith('#'):
+                continue
+            try:
+                if len(row) >= 3:
+                    targets[row[0]] = (float(row[1]), float(row[2]))
+                elif len(row) == 2 and common.RE_GRID.fullmatch(row[1].upper()):
+                    targets[row[0]] = common.locator_to_latlon(row[1])
+            except ValueError:
+                continue
+    return targets
+
+def home_targets(lat, lon):
+    """Antipode, antécoïque et périécoïque d'une station en (lat, lon)."""
+    return {
         "Antipode": (-1 * lat, (lon + 180 + 180) % 360 - 180),
         "Antécoïque": (-1 * lat, lon),
         "Périécoïque": (lat, (lon + 180 + 180) % 360 - 180)
     }
 
-    results = {k: {"dist": float('inf'), "call": None} for k in targets}
-    re_grid = re.compile(r'(?i)<GRIDSQUARE:\d+>([A-Z]{2}\d{2})')
-    re_call = re.compile(r'(?i)<CALL:\d+>([^>]+)')
+class AntipodeAnalysis(common.Analysis):
+    """Closest contacts to antipode, antecoique, periecoique
 
-    for record in adif_records:
-        m_grid = re_grid.search(record)
-        m_call = re_call.search(record)
-        if m_grid and m_call:
-            c_lat, c_lon = common.locator_to_latlon(m_grid.group(1))
-            if c_lat is None:
-                continue
+    Les 3 points sont ceux de la station du QSO (MY_GRIDSQUARE, ex: activation /P),
+    sinon ceux de my_loc ; les cibles fournies sont les mêmes pour tous les QSO.
+    """
+
+    # Champs ADIF utilisés
+    FIELDS = frozenset(['CALL', 'GRIDSQUARE', 'MY_GRIDSQUARE'])
+
+    def __init__(self, my_loc, extra_targets=None):
+        self.my_loc = my_loc
+        self.extra_targets = dict(extra_targets or {})
+
+        # Définition des 3 points cibles, plus les cibles fournies (ex: DXpéditions)
+        self.targets = home_targets(*common.locator_to_latlon(my_loc))
+        self.targets.update(self.extra_targets)
+        # Cibles des autres stations : {locator MY_GRIDSQUARE: cibles}
+        self.targets_by_grid = {}
 
+        self.results = {k: {"dist": float('inf'), "call": None} for k in self.targets}
+        # QSO avec indicatif et locator
+        self.contacts = 0
+
+    def station_targets(self, my_grid):
+        """Cibles des QSO faits depuis le locator my_grid (None : depuis my_loc)."""
+        if not my_grid:
+            return self.targets
+        targets = self.targets_by_grid.get(my_grid)
+        if targets is None:
+            targets = self.targets_by_grid[my_grid] = home_targets(*common.locator_to_latlon(my_grid))
+            targets.update(self.extra_targets)
+        return targets
+
+    def update(self, qso):
+        if not (qso.grid and qso.call):
+            return False
+        self.contacts += 1
+        for name, coords in self.station_targets(qso.my_grid).items():
+            d = common.haversine_distance(qso.lat, qso.lon, coords[0], coords[1])
+            if d < self.results[name]["dist"]:
+                self.results[name] = {"dist": d, "call": qso.call}
+        return True
+
+    def run_table(self, table):
+        # Pour chaque station, un index de ses locators (premier QSO avec indicatif de
+        # chacun) sert à toutes ses cibles ; à distance égale, le premier QSO l'emporte,
+        # comme dans update()
+        calls, grids, my_grids = table.columns['call'], table.columns['grid'], table.columns['my_grid']
+        rows_by_home = {}
+        np = geodesy.numpy_module()
+        if np is not None:
+            rows = np.flatnonzero((np.asarray(calls) >= 0) & (np.asarray(grids) >= 0))
+            homes = np.asarray(my_grids)[rows]
+            for home in np.unique(homes).tolist():
+                rows_by_home[home] = rows[homes == home]
+        else:
+            for row, call in enumerate(calls):
+                if call >= 0 and grids[row] >= 0:
+                    rows_by_home.setdefault(my_grids[row], []).append(row)
+        self.contacts += sum(len(rows) for rows in rows_by_home.values())
+        for home, rows in sorted(rows_by_home.items(), key=lambda item: item[1][0]):
+            index = spatial_index.GridIndex.from_table(table, rows)
+            targets = self.station_targets(table.strings['my_grid'][home] if home >= 0 else None)
             for name, coords in targets.items():
-                d = common.haversine_distance(c_lat, c_lon, coords[0], coords[1])
-                if d < results[name]["dist"]:
-                    results[name] = {"dist": d, "call": m_call.group(1).split('<')[0]}
+                for dist, row in index.nearest(coords[0], coords[1]):
+                    if dist < self.results[name]["dist"]:
+                        self.results[name] = {"dist": dist, "call": table.strings['call'][calls[row]]}
+        return self
+
+    def retained_count(self):
+        # QSO avec indicatif et locator
+        return self.contacts
+
+    def params(self):
+        return {'locator': self.my_loc}
+
+    def result(self):
+        return common.table_result(
+            "Records de proximité", ['target', 'target_lat', 'target_lon', 'call', 'distance_km'],
+            ((name, *self.targets[name], data['call'], data['dist'] if data['call'] else None)
+             for name, data in self.results.items()),
+            locator=self.my_loc)
+
+    def report(self):
+        print(f"--- Records de proximité pour {self.my_loc} ---")
+        for name, data in self.results.items():
+            print(f"{name:<12}: {data['call'] or 'Aucun':<10} à {data['dist']:7.1f} km du point idéal")
+
+def find_closest_points(adif_records, my_loc, extra_targets=None):
+    """Closest contact from adif file for antipode, antecoique, periecoique"""
+    AntipodeAnalysis(my_loc, extra_targets).run(adif_records).report()
 
-    print(f"--- Records de proximité pour {my_loc} ---")
-    for name, data in results.items():
-        print(f"{name:<12}: {data['call'] or 'Aucun':<10} à {data['dist']:7.1f} km du point idéal")
+def print_nearest_contacts(table, targets, k=5, radius_km=None):
+    """Liste, pour chaque cible, les k locators contactés les plus proches (ou ceux à moins de radius_km)."""
+    calls, grids = table.columns['call'], table.columns['grid']
+    index = spatial_index.GridIndex.from_table(table)
+    for name, (lat, lon) in targets.items():
+        if radius_km is None:
+            found = index.nearest(lat, lon, k)
+            print(f"\n--- {name} ({lat:.2f}, {lon:.2f}) : {len(found)} locators les plus proches ---")
+        else:
+            found = index.within(lat, lon, radius_km)
+            print(f"\n--- {name} ({lat:.2f}, {lon:.2f}) : {len(found)} locators à moins de {radius_km:g} km ---")
+        for dist, row in found:
+            call = table.strings['call'][calls[row]] if calls[row] >= 0 else '-'
+            print(f"{table.strings['grid'][grids[row]]:<8} {call:<12} {dist:9.1f} km")
 
 if __name__ == "__main__":
-    args = common.get_args()
-    with open(args.file, "r", encoding="ascii") as f:
-        records = re.split(r'(?i)<EOR>', f.read())
-    find_closest_points(records, args.locator)
+    parser = common.build_parser()
+    parser.add_argument('--targets', metavar='CSV',
+                        help="Cibles supplémentaires (nom,latitude,longitude ou nom,locator par ligne)")
+    parser.add_argument('-k', '--nearest', type=int, metavar='K',
+                        help="Lister les K locators contactés les plus proches de chaque cible")
+    parser.add_argument('--radius', type=float, metavar='KM',
+                        help="Lister les locators contactés à moins de KM km de chaque cible")
+    args = common.get_args(parser=parser)
+    try:
+        extra = load_targets(args.targets) if args.targets else None
+        records = common.load_qso_logs(args.file, use_cache=args.cache, jobs=args.jobs,
+                                       fields=AntipodeAnalysis.FIELDS)
+    except FileNotFoundError as e:
+        print(f"ERREUR: Le fichier {e.filename} est introuvable.")
+    else:
+        analysis = AntipodeAnalysis(args.locator, extra).run(records)
+        analysis.report()
+        if args.nearest or args.radius is not None:
+            print_nearest_contacts(records, analysis.targets, k=args.nearest or 5, radius_km=args.radius)
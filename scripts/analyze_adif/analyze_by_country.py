@@ -1,101 +1,171 @@
 """ Analyse les contacts ADIF par pays/DXCC et par bande. """
-import re
-import os
-from collections import defaultdict
-from cty import CTY
+from collections import Counter, defaultdict
+from cty import load_cty
+import geodesy
 import common
 
 # --- Fonction d'Analyse Principale ---
 
-def analyze_contacts_by_band_country(adif_records, cty_dat_path=None):
-    """ Analyse les contacts ADIF par pays/DXCC et par bande. """
-    # Chargement du fichier cty.dat si fourni et disponible (pour recherche de pays par callsign)
-    cty = CTY(cty_dat_path) if cty_dat_path and os.path.exists(cty_dat_path) else None
-
-
-    # Structure de stockage :
-    # {
-    #     "Japan": {"17m": 12, "15m": 5, "12m": 4},
-    #     "China": {"17m": 10, "15m": 3, "12m": 2},
-    #     ...
-    # }
-    contacts_by_country = defaultdict(lambda: defaultdict(int))
-    total_count = 0
-
-    # Regex pour extraire les champs
-    re_call = re.compile(r'<CALL:\d+>([A-Z0-9/]+)')
-    re_freq = re.compile(r'<FREQ:\d+>([\d.]+)')
-    re_grid = re.compile(r'<GRIDSQUARE:\d+>([A-Z]{2}\d{2}[A-Z]{0,2})')
-    # NOUVELLE REGEX pour le Pays/DXCC
-    # On cherche le tag <COUNTRY:n> suivi du nom, jusqu'à la balise suivante <
-    re_country = re.compile(r'<COUNTRY:\d+>(.+?)<')
-
-    for record in adif_records:
-        if not record.strip():
-            continue
-
+class CountryAnalysis(common.Analysis):
+    """ Contacts par pays/DXCC et par bande. """
+
+    # Champs ADIF utilisés
+    FIELDS = frozenset(['CALL', 'FREQ', 'GRIDSQUARE', 'COUNTRY'])
+
+    def __init__(self, cty_dat_path=None):
+        # Chargement du fichier cty.dat si fourni et disponible (pour recherche de pays par callsign)
+        self.cty_dat_path = cty_dat_path
+        self.cty = load_cty(cty_dat_path)
+
+        # Structure de stockage :
+        # {
+        #     "Japan": {"17m": 12, "15m": 5, "12m": 4},
+        #     "China": {"17m": 10, "15m": 3, "12m": 2},
+        #     ...
+        # }
+        self.contacts_by_country = defaultdict(Counter)
+        self.total_count = 0
+
+    def __getstate__(self):
+        # Les données cty.dat ne sont pas sauvegardées : elles sont rechargées
+        state = self.__dict__.copy()
+        del state['cty']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.cty = load_cty(self.cty_dat_path)
+
+    def update(self, qso):
         # 1. Extraction des champs
-        match_call = re_call.search(record)
-        match_freq = re_freq.search(record)
-        match_grid = re_grid.search(record)
-        match_country = re_country.search(record) # Extraction du pays
-
-        if not (match_call and match_freq) or (not match_grid and cty is None):
-            continue
-
-        # Nettoyage des données
-        callsign = match_call.group(1).strip()
-        freq_mhz = float(match_freq.group(1))
-        band = common.get_band_from_frequency(freq_mhz)
-
-        # Pays : utilisation de la valeur trouvée sinon recherche via cty.dat
-        if match_country:
-            country = match_country.group(1).strip().title()
-        elif cty:
-            # Recherche du pays dans le fichier cty.dat
-            country, _, _ = cty.callsign_lookup(callsign)
+        callsign, band = qso.call, qso.band
+
+        if not callsign or band is None or (not qso.grid and self.cty is None):
+            return False
+
+        # Pays : utilisation de la valeur trouvée (champ COUNTRY) sinon recherche via cty.dat
+        if qso.country:
+            country = qso.country
+        elif self.cty:
+            # Recherche du pays dans le fichier cty.dat (ND si l'indicatif est inconnu)
+            country = self.cty.callsign_lookup(callsign).country or "ND"
         else:
             country = "ND"
 
         # Ajout du contact au pays correspondant
-        contacts_by_country[country][band] += 1
-        total_count += 1
-
-    # Affichage des résultats
-    print("\n--- Analyse des Contacts par Pays/DXCC et par Bande ---")
-    header = f"{'Pays/DXCC':<25} |{'Total':>6}|" + " |".join(f"{band:>5}" for band in common.ALL_BANDS) + " |"
-    separator = "-" * len(header)
-    print(header)
-    print(separator)
-
-    sorted_countries = dict(sorted(contacts_by_country.items()))
-
-    for country, bands in sorted_countries.items():
-        counts = [bands.get(band, 0) for band in common.ALL_BANDS]
-        row = f"{country[:25]:<25} | {sum(bands.values()):5}" + " | " + " | ".join(f"{count:4}" for count in counts) + " |"
-        print(row)
-
-    print(separator)
+        self.contacts_by_country[country][band] += 1
+        self.total_count += 1
+        return True
+
+    def run_table(self, table):
+        np = geodesy.numpy_module()
+        if np is None:
+            return super().run_table(table)
+
+        cols, strings = table.columns, table.strings
+        calls = np.asarray(cols['call'])
+        bands = np.asarray(cols['band']).astype(np.int64)
+        countries = np.asarray(cols['country']).astype(np.int64)
+        rows = (calls >= 0) & (bands >= 0)
+        if self.cty is None:
+            rows &= np.asarray(cols['grid']) >= 0
+        # Pays des QSO sans champ COUNTRY : chaque indicatif n'est cherché qu'une fois (cty.dat)
+        names = list(strings['country'])
+        name_ids = {name: i for i, name in enumerate(names)}
+        missing = rows & (countries < 0)
+        call_ids = np.unique(calls[missing]).tolist()
+        if self.cty:
+            found = self.cty.callsign_lookups(strings['call'][i] for i in call_ids)
+            call_countries = [found[strings['call'][i]].country or "ND" for i in call_ids]
+        else:
+            call_countries = ["ND"] * len(call_ids)
+        call_country_ids = np.full(len(strings['call']), -1, dtype=np.int64)
+        for call_id, country in zip(call_ids, call_countries):
+            if country not in name_ids:
+                name_ids[country] = len(names)
+                names.append(country)
+            call_country_ids[call_id] = name_ids[country]
+        countries = np.where(missing, call_country_ids[calls], countries)
+
+        # Comptage par (pays, bande), dans l'ordre du premier QSO de chaque couple comme update()
+        band_count = len(common.BANDS)
+        keys, firsts, counts = np.unique(countries[rows] * band_count + bands[rows],
+                                         return_index=True, return_counts=True)
+        for i in np.argsort(firsts, kind='stable').tolist():
+            country, band = divmod(int(keys[i]), band_count)
+            self.contacts_by_country[names[country]][common.BANDS[band]] += int(counts[i])
+        self.total_count += int(rows.sum())
+        return self
+
+    def run_store(self, store):
+        where = "call IS NOT NULL AND band IS NOT NULL"
+        if self.cty is None:
+            where += " AND grid IS NOT NULL"
+        # Un groupe par pays connu, ou par indicatif quand le pays est à rechercher
+        for country, callsign, band, count in store.select(
+                "country, call, band, COUNT(*)", where,
+                "country, CASE WHEN country IS NULL THEN call END, band"):
+            if not country:
+                country = (self.cty.callsign_lookup(callsign).country or "ND") if self.cty else "ND"
+            self.contacts_by_country[country][band] += count
+            self.total_count += count
+        return self
+
+    def retained_count(self):
+        # QSO attribués à un pays
+        return self.total_count
+
+    def params(self):
+        return {'cty_dat_path': self.cty_dat_path}
+
+    def result(self):
+        rows = ([country, sum(bands.values()), *(bands.get(band, 0) for band in common.ALL_BANDS)]
+                for country, bands in sorted(self.contacts_by_country.items()))
+        return common.table_result("Contacts par pays/DXCC et par bande", ['country', 'total', *common.ALL_BANDS],
+                                   rows, total_contacts=self.total_count, countries=len(self.contacts_by_country))
+
+    def report(self):
+        # Affichage des résultats
+        print("\n--- Analyse des Contacts par Pays/DXCC et par Bande ---")
+        header = f"{'Pays/DXCC':<25} |{'Total':>6}|" + " |".join(f"{band:>5}" for band in common.ALL_BANDS) + " |"
+        separator = "-" * len(header)
+        print(header)
+        print(separator)
+
+        sorted_countries = dict(sorted(self.contacts_by_country.items()))
+
+        for country, bands in sorted_countries.items():
+            counts = [bands.get(band, 0) for band in common.ALL_BANDS]
+            row = f"{country[:25]:<25} | {sum(bands.values()):5}" + " | " + " | ".join(f"{count:4}" for count in counts) + " |"
+            print(row)
+
+        print(separator)
+
+        # --- LIGNE DE TOTAL MODIFIÉE ---
+        # On calcule le nombre de pays via len(sorted_countries)
+        label_total = f"Total = {len(sorted_countries)}/340"
+
+        total_row = (
+            f"{label_total:<25} | {self.total_count:5} | " +
+            " | ".join(f"{sum(bands.get(band, 0) for bands in sorted_countries.values()):4}" for band in common.ALL_BANDS) +
+            " |"
+        )
+        print(total_row)
+        print(separator)
 
-    # --- LIGNE DE TOTAL MODIFIÉE ---
-    # On calcule le nombre de pays via len(sorted_countries)
-    label_total = f"Total = {len(sorted_countries)}/340"
 
-    total_row = (
-        f"{label_total:<25} | {total_count:5} | " +
-        " | ".join(f"{sum(bands.get(band, 0) for bands in sorted_countries.values()):4}" for band in common.ALL_BANDS) +
-        " |"
-    )
-    print(total_row)
-    print(separator)
+def analyze_contacts_by_band_country(adif_records, cty_dat_path=None):
+    """ Analyse les contacts ADIF par pays/DXCC et par bande. """
+    CountryAnalysis(cty_dat_path=cty_dat_path).run(adif_records).report()
 
 # --- Exécution ---
 if __name__ == "__main__":
     args = common.get_args("Analyse les contacts ADIF par pays/DXCC et par bande.")
     try:
-        records = common.read_file_content(args.file)
+        records = common.load_qso_logs(args.file, use_cache=args.cache, jobs=args.jobs,
+                                       fields=CountryAnalysis.FIELDS)
         analyze_contacts_by_band_country(records, cty_dat_path=args.ctydat)
-    except FileNotFoundError:
-        print(f"ERREUR: Le fichier {args.file} est introuvable.")
+    except FileNotFoundError as e:
+        print(f"ERREUR: Le fichier {e.filename} est introuvable.")
     except Exception as e:
         print(f"Une erreur s'est produite lors de l'exécution: {e}")
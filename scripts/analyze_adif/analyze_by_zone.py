@@ -0,0 +1,158 @@
+""" Analyse les contacts ADIF par continent, par zone CQ et par zone ITU (entités de cty.dat). """
+from collections import Counter, defaultdict
+from cty import load_cty
+import geodesy
+import common
+
+# Noms des continents de cty.dat
+CONTINENTS = {
+    'AF': 'Afrique', 'AN': 'Antarctique', 'AS': 'Asie', 'EU': 'Europe',
+    'NA': 'Amérique du Nord', 'OC': 'Océanie', 'SA': 'Amérique du Sud',
+}
+
+# --- Fonction d'Analyse Principale ---
+
+class ZoneAnalysis(common.Analysis):
+    """ Contacts par continent, par zone CQ et par zone ITU, et par bande.
+
+        Le continent et les zones sont ceux de l'entité cty.dat de l'indicatif
+        (préfixes portables et surcharges (zone CQ) [zone ITU] comprises) : une
+        seule recherche par indicatif donne les trois.
+    """
+
+    # Champs ADIF utilisés
+    FIELDS = frozenset(['CALL', 'FREQ'])
+
+    def __init__(self, cty_dat_path=None):
+        # Chargement du fichier cty.dat (indispensable : il donne continents et zones)
+        self.cty_dat_path = cty_dat_path
+        self.cty = load_cty(cty_dat_path)
+
+        # Structure de stockage : {continent: {bande: nombre}}, {zone CQ: {bande: nombre}}
+        # et {zone ITU: {bande: nombre}}
+        self.contacts_by_continent = defaultdict(Counter)
+        self.contacts_by_zone = defaultdict(Counter)
+        self.contacts_by_itu_zone = defaultdict(Counter)
+        self.total_count = 0
+        # Indicatifs sans entité (inconnus de cty.dat, /MM, /AM)
+        self.unknown_count = 0
+
+    def __getstate__(self):
+        # Les données cty.dat ne sont pas sauvegardées : elles sont rechargées
+        state = self.__dict__.copy()
+        del state['cty']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.cty = load_cty(self.cty_dat_path)
+
+    def _add(self, entry, band, count=1):
+        """ Compte count contacts de l'entité cty.dat entry sur la bande band. """
+        if entry.country is None:
+            self.unknown_count += count
+            return False
+        self.contacts_by_continent[entry.continent][band] += count
+        self.contacts_by_zone[entry.cq_zone][band] += count
+        self.contacts_by_itu_zone[entry.itu_zone][band] += count
+        self.total_count += count
+        return True
+
+    def update(self, qso):
+        if self.cty is None or not qso.call or qso.band is None:
+            return False
+        return self._add(self.cty.callsign_lookup(qso.call), qso.band)
+
+    def run_table(self, table):
+        np = geodesy.numpy_module()
+        if np is None or self.cty is None:
+            return super().run_table(table)
+
+        cols, strings = table.columns, table.strings
+        calls = np.asarray(cols['call'])
+        bands = np.asarray(cols['band']).astype(np.int64)
+        rows = (calls >= 0) & (bands >= 0)
+        # Chaque indicatif n'est cherché qu'une fois ; comptage par (indicatif, bande)
+        band_count = len(common.BANDS)
+        keys, counts = np.unique(calls[rows].astype(np.int64) * band_count + bands[rows],
+                                 return_counts=True)
+        call_ids = (keys // band_count).tolist()
+        found = self.cty.callsign_lookups(strings['call'][i] for i in set(call_ids))
+        for call_id, band, count in zip(call_ids, (keys % band_count).tolist(), counts.tolist()):
+            self._add(found[strings['call'][call_id]], common.BANDS[band], count)
+        return self
+
+    def run_store(self, store):
+        if self.cty is None:
+            return self
+        for callsign, band, count in store.select(
+                "call, band, COUNT(*)", "call IS NOT NULL AND band IS NOT NULL", "call, band"):
+            self._add(self.cty.callsign_lookup(callsign), band, count)
+        return self
+
+    def retained_count(self):
+        # QSO attribués à une entité cty.dat
+        return self.total_count
+
+    def params(self):
+        return {'cty_dat_path': self.cty_dat_path}
+
+    def groups(self):
+        """ Lignes (groupe, clé, compteurs par bande) : continents, zones CQ puis zones ITU, triés. """
+        return ([('continent', continent, bands) for continent, bands in sorted(self.contacts_by_continent.items())]
+                + [('cq_zone', zone, bands) for zone, bands in sorted(self.contacts_by_zone.items())]
+                + [('itu_zone', zone, bands) for zone, bands in sorted(self.contacts_by_itu_zone.items())])
+
+    def result(self):
+        rows = ([group, key, sum(bands.values()), *(bands.get(band, 0) for band in common.ALL_BANDS)]
+                for group, key, bands in self.groups())
+        return common.table_result("Contacts par continent, par zone CQ et par zone ITU", ['group', 'key', 'total', *common.ALL_BANDS],
+                                   rows, cty_loaded=self.cty is not None, total_contacts=self.total_count,
+                                   unknown_contacts=self.unknown_count)
+
+    def report(self):
+        if self.cty is None:
+            print("ERREUR: Le fichier cty.dat est nécessaire pour l'analyse par continent et par zone CQ/ITU.")
+            return
+
+        # Affichage des résultats
+        print("\n--- Analyse des Contacts par Continent / Zone CQ / Zone ITU et par Bande ---")
+        header = f"{'Continent / Zone':<25} |{'Total':>6}|" + " |".join(f"{band:>5}" for band in common.ALL_BANDS) + " |"
+        separator = "-" * len(header)
+        print(header)
+        print(separator)
+
+        previous_group = None
+        for group, key, bands in self.groups():
+            if previous_group is not None and group != previous_group:
+                print(separator)
+            previous_group = group
+            if group == 'continent':
+                label = CONTINENTS.get(key, key)
+            else:
+                label = f"Zone {'CQ' if group == 'cq_zone' else 'ITU'} {key}"
+            counts = [bands.get(band, 0) for band in common.ALL_BANDS]
+            row = f"{label[:25]:<25} | {sum(bands.values()):5}" + " | " + " | ".join(f"{count:4}" for count in counts) + " |"
+            print(row)
+
+        print(separator)
+        print(f"Total : {self.total_count} contacts, {len(self.contacts_by_continent)} continents, "
+              f"{len(self.contacts_by_zone)}/40 zones CQ, {len(self.contacts_by_itu_zone)}/90 zones ITU"
+              f" ({self.unknown_count} indicatifs sans entité)")
+
+
+def analyze_contacts_by_zone(adif_records, cty_dat_path=None):
+    """ Analyse les contacts ADIF par continent, par zone CQ et par zone ITU. """
+    ZoneAnalysis(cty_dat_path=cty_dat_path).run(adif_records).report()
+
+# --- Exécution ---
+if __name__ == "__main__":
+    args = common.get_args("Analyse les contacts ADIF par continent, par zone CQ et par zone ITU.")
+    try:
+        records = common.load_qso_logs(args.file, use_cache=args.cache, jobs=args.jobs,
+                                       fields=ZoneAnalysis.FIELDS)
+        analyze_contacts_by_zone(records, cty_dat_path=args.ctydat)
+    except FileNotFoundError as e:
+        print(f"ERREUR: Le fichier {e.filename} est introuvable.")
+    except Exception as e:
+        print(f"Une erreur s'est produite lors de l'analyse: {e}")
@@ -1,143 +1,187 @@
 """ Analyse de la Propagation Greyline à partir d'un fichier ADIF."""
-import re
 # NOUVEL IMPORT : Ajout de timezone
 from datetime import datetime, timedelta, timezone
+from functools import lru_cache
 from astral import LocationInfo
 from astral import sun
+import geodesy
+import distance_cache
 import common
 
 # --- Distance minimum pour considérer un DX ---
 MIN_DX_DISTANCE_KM = 3500
 # --- Période de Greyline (minutes avant/après lever/coucher) ---
 GREYLINE_WINDOW_MINUTES = 30
+# --- Nombre de contacts Greyline listés dans le rapport ---
+MAX_LISTED_CONTACTS = 100
+# --- Nombre de couples (position, jour) dont les heures du soleil sont gardées en cache ---
+SUN_CACHE_SIZE = 1 << 16
 # -------------------------------
 
+
+@lru_cache(maxsize=SUN_CACHE_SIZE)
+def sun_times(lat, lon, date):
+    """ Heures (UTC) du lever et du coucher du soleil au point (lat, lon) le jour date.
+
+        Calculées une fois par position et par jour ; None si le calcul échoue
+        (jour ou nuit polaire).
+    """
+    try:
+        location = LocationInfo("Station", "", "UTC", lat, lon)
+        sun_info = sun.sun(location.observer, date=date, tzinfo=timezone.utc)
+    except (ValueError, Exception):
+        return None
+    return tuple(sun_info[key] for key in ('sunrise', 'sunset') if sun_info[key])
+
 # --- Fonction d'Analyse Principale ---
 
-def analyze_greyline(adif_records, my_locator):
-    """ Analyse la proportion de contacts DX effectués pendant les périodes Greyline. """
-    my_loc_lat, my_loc_lon = common.locator_to_latlon(my_locator)
-    if my_loc_lat is None:
-        print(f"ERREUR: Localisateur QRA '{my_locator}' invalide ou trop court. Le programme s'arrête.")
-        return
+class GreylineAnalysis(common.Analysis):
+    """ Proportion de contacts DX effectués pendant les périodes Greyline.
 
-    # my_location utilise UTC par défaut
-    my_location = LocationInfo("My Station", my_locator, "UTC", my_loc_lat, my_loc_lon)
+        La position de la station est celle du QSO (MY_GRIDSQUARE), sinon my_locator.
+    """
 
-    # Stockage des résultats
-    total_dx_contacts = 0
-    greyline_contacts = []
+    # Champs ADIF utilisés
+    FIELDS = frozenset(['CALL', 'QSO_DATE', 'TIME_ON', 'GRIDSQUARE', 'MY_GRIDSQUARE'])
 
-    # Regex
-    re_date = re.compile(r'<QSO_DATE:\d+>(\d{8})')
-    re_time = re.compile(r'<TIME_ON:\d+>(\d{6})')
-    re_grid = re.compile(r'<GRIDSQUARE:\d+>([A-Z]{2}\d{2}[A-Z]{0,2})')
-    re_call = re.compile(r'<CALL:\d+>([A-Z0-9/]+)')
+    def __init__(self, my_locator):
+        self.my_locator = my_locator
+        self.my_loc_lat, self.my_loc_lon = common.locator_to_latlon(my_locator)
 
-    for record in adif_records:
-        if not record.strip():
-            continue
+        # my_location utilise UTC par défaut
+        self.my_location = None
+        if self.my_loc_lat is not None:
+            self.my_location = LocationInfo("My Station", my_locator, "UTC", self.my_loc_lat, self.my_loc_lon)
 
-        # Extraction
-        match_date = re_date.search(record)
-        match_time = re_time.search(record)
-        match_grid = re_grid.search(record)
-        match_call = re_call.search(record)
+        # Stockage des résultats (seuls les premiers contacts Greyline sont conservés pour l'affichage)
+        self.total_dx_contacts = 0
+        self.greyline_count = 0
+        self.greyline_contacts = []
 
-        if not (match_date and match_time and match_grid and match_call):
-            continue
+    def _home(self, my_grid):
+        """ Position (lat, lon) de la station : locator my_grid du QSO, sinon my_locator. """
+        if my_grid:
+            return common.locator_to_latlon(my_grid)
+        return self.my_loc_lat, self.my_loc_lon
 
-        # Conversion Date/Heure : UTILISATION DE timezone.utc
-        qso_date_str = match_date.group(1)
-        qso_time_str = match_time.group(1)
-        qso_datetime = datetime.strptime(qso_date_str + qso_time_str, '%Y%m%d%H%M%S').replace(tzinfo=timezone.utc)
+    def update(self, qso):
+        if self.my_location is None:
+            return False
 
-        other_locator = match_grid.group(1).strip()
-        callsign = match_call.group(1).strip()
+        # Extraction
+        other_locator, callsign = qso.grid, qso.call
 
-        if len(other_locator) < 4:
-            continue
-        other_lat, other_lon = common.locator_to_latlon(other_locator)
-        if other_lat is None:
-            continue
+        if not (qso.time is not None and other_locator and callsign):
+            return False
 
-        distance_km = common.haversine_distance(my_loc_lat, my_loc_lon, other_lat, other_lon)
+        distance_km = distance_cache.shared_cache().lookup(qso.my_grid or self.my_locator, other_locator)[0]
 
         # 1. Filtrer uniquement le DX longue distance
         if distance_km < MIN_DX_DISTANCE_KM:
-            continue
-        total_dx_contacts += 1
-
-        # 2. Calculer le lever/coucher du soleil pour les deux stations
-        try:
-            # Heures du soleil pour la station locale
-            sun_info_my = sun.sun(my_location.observer, date=qso_datetime.date(), tzinfo=timezone.utc)
-
-            # Heures du soleil pour la station distante
-            other_location = LocationInfo("DX Station", other_locator, "UTC", other_lat, other_lon)
-            sun_info_other = sun.sun(other_location.observer, date=qso_datetime.date(), tzinfo=timezone.utc)
-
-        except (ValueError, Exception):
-            continue
-
-        # Périodes de Greyline (lever/coucher du soleil pour les deux stations)
-        greyline_times = []
-        if sun_info_my['sunrise']:
-            greyline_times.append(sun_info_my['sunrise'])
-        if sun_info_my['sunset']:
-            greyline_times.append(sun_info_my['sunset'])
-        if sun_info_other['sunrise']:
-            greyline_times.append(sun_info_other['sunrise'])
-        if sun_info_other['sunset']:
-            greyline_times.append(sun_info_other['sunset'])
-
-        # 3. Vérifier si le QSO est dans la fenêtre Greyline
-        is_greyline_qso = False
-        for sun_time in greyline_times:
-            if sun_time is None:
-                continue
-
-            # Définir la fenêtre : [SunTime - 30 min, SunTime + 30 min]
-            start_time = sun_time - timedelta(minutes=GREYLINE_WINDOW_MINUTES)
-            end_time = sun_time + timedelta(minutes=GREYLINE_WINDOW_MINUTES)
-
-            if start_time <= qso_datetime <= end_time:
-                is_greyline_qso = True
-                break
-
-        if is_greyline_qso:
-            greyline_contacts.append((callsign, qso_datetime, distance_km))
-
-    # --- Affichage des Résultats ---
-    print(f"\n--- Analyse de Propagation Greyline (DX > {MIN_DX_DISTANCE_KM} km) ---")
-    print(f"Fenêtre Greyline (autour du lever/coucher) : +/- {GREYLINE_WINDOW_MINUTES} minutes (Terre et DX).")
-    print(f"Total des contacts DX analysés : {total_dx_contacts}")
-
-    if total_dx_contacts > 0:
-        percent_greyline = (len(greyline_contacts) / total_dx_contacts) * 100
-        print(f"Contacts effectués dans la fenêtre Greyline : {len(greyline_contacts)}")
-        print(f"**Pourcentage de votre DX qui s'est produit sur la Greyline : {percent_greyline:.2f} %**")
-        print(f"**Contacts Greyline : {len(greyline_contacts)}**")
-        # --- Affichage des Résultats (Limité aux 100 premiers) ---
-        nb_affiche = 100
-        for callsign, qso_datetime, distance_km in greyline_contacts[:nb_affiche]:
-            # Formatage de la date pour plus de lisibilité (JJ/MM HH:MM)
-            dt_format = qso_datetime.strftime("%d/%m %H:%M")
-            print(f" - {callsign:<10} à {dt_format} UTC ({distance_km:7.1f} km)")
-
-    else:
-        print(f"Pas assez de contacts DX (>{MIN_DX_DISTANCE_KM} km) pour une analyse Greyline significative.")
+            return False
+        return self._add_dx(callsign, qso.time, distance_km, self._home(qso.my_grid), (qso.lat, qso.lon))
+
+    def _add_dx(self, callsign, qso_time, distance_km, home, other):
+        """ Compte un contact DX et retient s'il a eu lieu pendant la Greyline ;
+            home et other sont les positions (lat, lon) des deux stations.
+        """
+        self.total_dx_contacts += 1
+        # Conversion Date/Heure : UTILISATION DE timezone.utc
+        qso_datetime = datetime.fromtimestamp(qso_time, tz=timezone.utc)
+
+        # 2. Lever/coucher du soleil pour les deux stations (Greyline)
+        sun_info_my = sun_times(*home, qso_datetime.date())
+        sun_info_other = sun_times(*other, qso_datetime.date())
+        if sun_info_my is None or sun_info_other is None:
+            # Compté parmi les contacts DX, sans pouvoir être classé Greyline
+            return True
+
+        # 3. Vérifier si le QSO est dans la fenêtre Greyline : [SunTime - 30 min, SunTime + 30 min]
+        window = timedelta(minutes=GREYLINE_WINDOW_MINUTES)
+        if any(sun_time - window <= qso_datetime <= sun_time + window
+               for sun_time in sun_info_my + sun_info_other):
+            self.greyline_count += 1
+            if len(self.greyline_contacts) < MAX_LISTED_CONTACTS:
+                self.greyline_contacts.append((callsign, qso_datetime, distance_km))
+        return True
+
+    def run_table(self, table):
+        np = geodesy.numpy_module()
+        if np is None or self.my_location is None:
+            return super().run_table(table)
+
+        cols = table.columns
+        rows = np.flatnonzero((np.asarray(cols['time']) != common.NO_TIME)
+                              & (np.asarray(cols['grid']) >= 0) & (np.asarray(cols['call']) >= 0))
+        # Distances depuis la station de chaque QSO, en un lot ; seul le DX passe au calcul du soleil
+        cache = distance_cache.shared_cache()
+        distances, _ = cache.lookup_rows(table, self.my_locator, rows)
+        dx = distances >= MIN_DX_DISTANCE_KM
+        rows = rows[dx]
+        home_lats, home_lons = distance_cache.home_positions(table, self.my_locator, rows)
+        calls, times = table.strings['call'], cols['time']
+        for row, distance_km, home in zip(rows.tolist(), distances[dx].tolist(),
+                                          zip(home_lats.tolist(), home_lons.tolist())):
+            self._add_dx(calls[cols['call'][row]], times[row], distance_km, home,
+                         (cols['lat'][row], cols['lon'][row]))
+        cache.save()
+        return self
+
+    def retained_count(self):
+        # Contacts DX (au-delà de MIN_DX_DISTANCE_KM)
+        return self.total_dx_contacts
+
+    def params(self):
+        return {'locator': self.my_locator, 'min_dx_km': MIN_DX_DISTANCE_KM,
+                'window_minutes': GREYLINE_WINDOW_MINUTES, 'max_listed': MAX_LISTED_CONTACTS}
+
+    def result(self):
+        percent = self.greyline_count / self.total_dx_contacts * 100 if self.total_dx_contacts else None
+        return common.table_result(
+            f"Propagation greyline (DX > {MIN_DX_DISTANCE_KM} km)", ['call', 'time_utc', 'distance_km'],
+            self.greyline_contacts, locator=self.my_locator, locator_valid=self.my_location is not None,
+            total_dx_contacts=self.total_dx_contacts, greyline_count=self.greyline_count,
+            greyline_percent=percent)
+
+    def report(self):
+        if self.my_location is None:
+            print(f"ERREUR: Localisateur QRA '{self.my_locator}' invalide ou trop court. Le programme s'arrête.")
+            return
+
+        # --- Affichage des Résultats ---
+        print(f"\n--- Analyse de Propagation Greyline (DX > {MIN_DX_DISTANCE_KM} km) ---")
+        print(f"Fenêtre Greyline (autour du lever/coucher) : +/- {GREYLINE_WINDOW_MINUTES} minutes (Terre et DX).")
+        print(f"Total des contacts DX analysés : {self.total_dx_contacts}")
+
+        if self.total_dx_contacts > 0:
+            percent_greyline = (self.greyline_count / self.total_dx_contacts) * 100
+            print(f"Contacts effectués dans la fenêtre Greyline : {self.greyline_count}")
+            print(f"**Pourcentage de votre DX qui s'est produit sur la Greyline : {percent_greyline:.2f} %**")
+            print(f"**Contacts Greyline : {self.greyline_count}**")
+            # --- Affichage des Résultats (Limité aux MAX_LISTED_CONTACTS premiers) ---
+            for callsign, qso_datetime, distance_km in self.greyline_contacts:
+                # Formatage de la date pour plus de lisibilité (JJ/MM HH:MM)
+                dt_format = qso_datetime.strftime("%d/%m %H:%M")
+                print(f" - {callsign:<10} à {dt_format} UTC ({distance_km:7.1f} km)")
+
+        else:
+            print(f"Pas assez de contacts DX (>{MIN_DX_DISTANCE_KM} km) pour une analyse Greyline significative.")
 
 
+def analyze_greyline(adif_records, my_locator):
+    """ Analyse la proportion de contacts DX effectués pendant les périodes Greyline. """
+    GreylineAnalysis(my_locator).run(adif_records).report()
+
 # --- Exécution ---
 if __name__ == "__main__":
     args = common.get_args(f"Analyse de Propagation Greyline (DX > {MIN_DX_DISTANCE_KM} km)")
     try:
-        records = common.read_file_content(args.file)
+        records = common.load_qso_logs(args.file, use_cache=args.cache, jobs=args.jobs,
+                                       fields=GreylineAnalysis.FIELDS)
         analyze_greyline(records, args.locator)
     except ImportError:
         print("\nERREUR: La librairie 'astral' est nécessaire. Veuillez l'installer avec : pip install astral")
-    except FileNotFoundError:
-        print(f"ERREUR: Le fichier {args.file} est introuvable.")
+    except FileNotFoundError as e:
+        print(f"ERREUR: Le fichier {e.filename} est introuvable.")
     except Exception as e:
         print(f"Une erreur s'est produite lors de l'analyse: {e}")
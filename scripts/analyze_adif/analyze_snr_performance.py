@@ -1,104 +1,127 @@
 """ Analyse de la Performance SNR à partir d'un fichier ADIF."""
-import re
 from collections import defaultdict
 import common
 
+# --- Nombre minimum de contacts pour une moyenne de SNR fiable ---
+MIN_CONTACTS = 10
 
-def analyze_snr(adif_records):
-    """ Analyse la performance SNR par mode et bande à partir des enregistrements ADIF. """
-    # Stockage : {(band, mode): {'snr_sum': float, 'count': int}}
-    snr_data = defaultdict(lambda: {'snr_sum': 0.0, 'count': 0})
-    total_contacts = 0
-    contacts_with_snr = 0
 
-    # Regex pour extraire les champs
-    re_mode = re.compile(r'<MODE:\d+>([A-Z0-9]+)')
-    re_freq = re.compile(r'<FREQ:\d+>([\d.]+)')
+def _empty_snr():
+    """ Somme et nombre de SNR à zéro pour une combinaison (bande, mode). """
+    return {'snr_sum': 0.0, 'count': 0}
 
-    # *** NOUVELLE REGEX POUR APP_PSKREP_SNR ou RST_RCVD de WSJTX ***
-    # On cherche <APP_PSKREP_SNR:n> suivi d'un nombre (potentiellement négatif ou positif).
-    # re_snr = re.compile(r'<APP_PSKREP_SNR:\d+:?[A-Z]*>([-+]?\d+)|<RST_RCVD:\d+>([-+]?\d+)')
-    re_snr = re.compile(r'(?:<APP_PSKREP_SNR:\d+:?[A-Z]*>|<RST_RCVD:\d+>)([-+]?\d+)')
 
-    for record in adif_records:
-        if not record.strip():
-            continue
+class SnrAnalysis(common.Analysis):
+    """ Performance SNR par mode et bande. """
 
-        total_contacts += 1
+    # Champs ADIF utilisés
+    FIELDS = frozenset(['MODE', 'FREQ', 'APP_PSKREP_SNR', 'RST_RCVD'])
 
-        # 1. Extraction
-        match_mode = re_mode.search(record)
-        match_freq = re_freq.search(record)
-        match_snr = re_snr.search(record)
+    def __init__(self):
+        # Stockage : {(band, mode): {'snr_sum': float, 'count': int}}
+        self.snr_data = defaultdict(_empty_snr)
+        self.total_contacts = 0
+        self.contacts_with_snr = 0
 
-        if not (match_mode and match_freq and match_snr):
-            continue
+    def update(self, qso):
+        self.total_contacts += 1
 
-        mode = match_mode.group(1).strip()
-        freq_mhz = float(match_freq.group(1))
-        band = common.get_band_from_frequency(freq_mhz)
+        # 1. Extraction
+        # Le SNR provient de APP_PSKREP_SNR (ou RST_RCVD de WSJT-X), ex: -12, 5
+        mode, band, snr_value = qso.mode, qso.band, qso.snr
 
-        # Le SNR est extrait de APP_PSKREP_SNR. Conversion en float.
-        try:
-            # Assurez-vous que la valeur est numérique (ex: -12, 5)
-            snr_value = float(match_snr.group(1))
-        except ValueError:
-            continue
+        if not mode or band is None or snr_value is None:
+            return False
 
-        contacts_with_snr += 1
+        self.contacts_with_snr += 1
 
         # 2. Agrégation
         key = (band, mode)
-        snr_data[key]['snr_sum'] += snr_value
-        snr_data[key]['count'] += 1
-
-    # --- Calcul des Résultats Finals ---
-    results = []
-    for (band, mode), data in snr_data.items():
-        if data['count'] >= 10: # Minimum de 10 contacts pour une moyenne fiable
-            avg_snr = data['snr_sum'] / data['count']
-            results.append({
-                'band': band,
-                'mode': mode,
-                'count': data['count'],
-                'avg_snr': avg_snr
-            })
-
-    # Trier les résultats par SNR moyen (du plus grand au plus petit)
-    results.sort(key=lambda x: x['avg_snr'], reverse=True)
-
-    # --- Affichage ---
-    print("\n--- Analyse de Qualité du Signal (SNR) par Mode et Bande ---")
-    print(f"Total des contacts analysés : {total_contacts}")
-    print(f"Contacts avec une valeur SNR (numérique via APP_PSKREP_SNR ou RST_RCVD) : {contacts_with_snr}\n")
-
-    header = f"{'Bande':<6} | {'Mode':<6} | {'Contacts':<8} | {'SNR Moyen (dB)':<20}"
-    separator = "-" * len(header)
-
-    print("Classement des Combinaisons par SNR Moyen (Moyenne calculée avec >= 10 contacts) :")
-    print(separator)
-    print(header)
-    print(separator)
-
-    for item in results:
-        row = (
-            f"{item['band']:<6} | "
-            f"{item['mode']:<6} | "
-            f"{item['count']:<8} | "
-            f"{item['avg_snr']:<20.2f}"
-        )
-        print(row)
-
-    print(separator)
-    print("\n*Un SNR positif ou proche de zéro (dB) indique une excellente qualité de signal.")
+        self.snr_data[key]['snr_sum'] += snr_value
+        self.snr_data[key]['count'] += 1
+        return True
+
+    def run_store(self, store):
+        self.total_contacts += store.count()
+        for band, mode, snr_sum, count in store.select(
+                "band, mode, SUM(snr), COUNT(*)",
+                "mode IS NOT NULL AND band IS NOT NULL AND snr IS NOT NULL", "band, mode"):
+            self.contacts_with_snr += count
+            self.snr_data[(band, mode)]['snr_sum'] += snr_sum
+            self.snr_data[(band, mode)]['count'] += count
+        return self
+
+    def params(self):
+        return {'min_contacts': MIN_CONTACTS}
+
+    def ranking(self):
+        """ Combinaisons (bande, mode) classées par SNR moyen décroissant. """
+        results = []
+        for (band, mode), data in self.snr_data.items():
+            if data['count'] >= MIN_CONTACTS: # Minimum de contacts pour une moyenne fiable
+                avg_snr = data['snr_sum'] / data['count']
+                results.append({
+                    'band': band,
+                    'mode': mode,
+                    'count': data['count'],
+                    'avg_snr': avg_snr
+                })
+
+        # Trier les résultats par SNR moyen (du plus grand au plus petit)
+        results.sort(key=lambda x: x['avg_snr'], reverse=True)
+        return results
+
+    def retained_count(self):
+        # QSO avec SNR
+        return self.contacts_with_snr
+
+    def result(self):
+        return common.table_result(
+            "Qualité du signal (SNR) par mode et bande", ['band', 'mode', 'contacts', 'avg_snr_db'],
+            ((item['band'], item['mode'], item['count'], item['avg_snr']) for item in self.ranking()),
+            total_contacts=self.total_contacts, contacts_with_snr=self.contacts_with_snr)
+
+    def report(self):
+        results = self.ranking()
+
+        # --- Affichage ---
+        print("\n--- Analyse de Qualité du Signal (SNR) par Mode et Bande ---")
+        print(f"Total des contacts analysés : {self.total_contacts}")
+        print(f"Contacts avec une valeur SNR (numérique via APP_PSKREP_SNR ou RST_RCVD) : {self.contacts_with_snr}\n")
+
+        header = f"{'Bande':<6} | {'Mode':<6} | {'Contacts':<8} | {'SNR Moyen (dB)':<20}"
+        separator = "-" * len(header)
+
+        print(f"Classement des Combinaisons par SNR Moyen (Moyenne calculée avec >= {MIN_CONTACTS} contacts) :")
+        print(separator)
+        print(header)
+        print(separator)
+
+        for item in results:
+            row = (
+                f"{item['band']:<6} | "
+                f"{item['mode']:<6} | "
+                f"{item['count']:<8} | "
+                f"{item['avg_snr']:<20.2f}"
+            )
+            print(row)
+
+        print(separator)
+        print("\n*Un SNR positif ou proche de zéro (dB) indique une excellente qualité de signal.")
+
+
+def analyze_snr(adif_records):
+    """ Analyse la performance SNR par mode et bande à partir des enregistrements ADIF. """
+    SnrAnalysis().run(adif_records).report()
 
 # --- Exécution ---
 if __name__ == "__main__":
     args = common.get_args("Analyse de la Performance SNR")
     try:
-        records = common.read_file_content(args.file)
+        records = common.load_qso_logs(args.file, use_cache=args.cache, jobs=args.jobs,
+                                       fields=SnrAnalysis.FIELDS)
         analyze_snr(records)
-    except FileNotFoundError:
-        print(f"ERREUR: Le fichier {args.file} est introuvable.")
+    except FileNotFoundError as e:
+        print(f"ERREUR: Le fichier {e.filename} est introuvable.")
     except Exception as e:
         print(f"Une erreur s'est produite lors de l'analyse: {e}")
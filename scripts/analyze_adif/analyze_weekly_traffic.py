@@ -1,6 +1,4 @@
 """ Analyse du Trafic Hebdomadaire par Bande à partir d'un fichier ADIF."""
-import re
-from datetime import datetime
 from collections import defaultdict
 import common
 
@@ -8,104 +6,125 @@ import common
 # Liste des jours de la semaine (pour l'affichage)
 DAYS_OF_WEEK = ['Lundi', 'Mardi', 'Mercredi', 'Jeudi', 'Vendredi', 'Samedi', 'Dimanche'] # 0=Lundi, 6=Dimanche
 
-def analyze_weekly_traffic(adif_records):
-    """ Analyse la répartition hebdomadaire du trafic par bande à partir des enregistrements ADIF. """
-    # Stockage : {bande: [contacts_lundi, contacts_mardi, ..., contacts_dimanche]}
-    weekly_band_counts = defaultdict(lambda: [0] * 7)
-    all_bands = set()
-    total_contacts = 0
+def _empty_week():
+    """ Compteurs à zéro pour les 7 jours de la semaine. """
+    return [0] * 7
 
-    # Regex
-    re_date = re.compile(r'<QSO_DATE:\d+>(\d{8})')
-    re_freq = re.compile(r'<FREQ:\d+>([\d.]+)')
+class WeeklyTrafficAnalysis(common.Analysis):
+    """ Répartition hebdomadaire du trafic par bande. """
 
-    for record in adif_records:
-        if not record.strip():
-            continue
+    # Champs ADIF utilisés
+    FIELDS = frozenset(['QSO_DATE', 'FREQ'])
 
-        total_contacts += 1
+    def __init__(self):
+        # Stockage : {bande: [contacts_lundi, contacts_mardi, ..., contacts_dimanche]}
+        self.weekly_band_counts = defaultdict(_empty_week)
+        self.all_bands = set()
+        self.total_contacts = 0
 
-        # 1. Extraction
-        match_date = re_date.search(record)
-        match_freq = re_freq.search(record)
+    def update(self, qso):
+        self.total_contacts += 1
 
-        if not (match_date and match_freq):
-            continue
+        # 1. Extraction
+        band = qso.band
+        if band is None or qso.day is None:
+            return False
 
-        qso_date_str = match_date.group(1)
-        freq_mhz = float(match_freq.group(1))
-        band = common.get_band_from_frequency(freq_mhz)
-        all_bands.add(band)
+        self.all_bands.add(band)
 
-        # 2. Déterminer le jour de la semaine
-        # L'ADIF utilise le format AAAA MM JJ. La conversion en datetime permet d'obtenir le jour.
-        qso_date = datetime.strptime(qso_date_str, '%Y%m%d')
-        # weekday() retourne 0 (Lundi) à 6 (Dimanche)
-        day_index = qso_date.weekday()
+        # 2. Déterminer le jour de la semaine : 0 (Lundi) à 6 (Dimanche)
+        # Le 1er janvier 1970 (jour 0 de l'epoch) était un jeudi (3).
+        day_index = (qso.day + 3) % 7
 
         # 3. Incrémenter le compteur
-        weekly_band_counts[band][day_index] += 1
-
-    # --- Affichage des Résultats ---
-    print("\n--- Analyse de Tendance du Trafic par Bande et Jour de la Semaine ---")
-    print(f"Total des contacts analysés : {total_contacts}\n")
-
-    # 1. Préparer l'en-tête
-    sorted_bands = sorted(list(all_bands))
-    header_days = " | ".join(f"{day:<10}" for day in DAYS_OF_WEEK)
-    header = f"{'Bande':<6} | {header_days} | {'Total':<6}"
-    separator = "-" * len(header)
-
-    print("Volume de Contacts par Bande (Répartition Hebdomadaire) :")
-    print(separator)
-    print(header)
-    print(separator)
-
-    # 1. Initialisation d'une liste pour stocker les totaux par jour (7 jours)
-    daily_totals = [0] * 7
-    grand_total = 0
-
-    for band in sorted_bands:
-        counts = weekly_band_counts[band]
-        total_band = sum(counts)
-        grand_total += total_band
-
-        # Mise à jour des totaux par jour
-        for i in range(7):
-            daily_totals[i] += counts[i]
-
-        # Formatage des comptes pour la ligne de bande
-        counts_str = " | ".join(f"{count:<10}" for count in counts)
-
-        row = (
-            f"{band:<6} | "
-            f"{counts_str} | "
-            f"{total_band:<6}"
+        self.weekly_band_counts[band][day_index] += 1
+        return True
+
+    def run_store(self, store):
+        self.total_contacts += store.count()
+        for band, day_index, count in store.select(
+                "band, weekday, COUNT(*)", "band IS NOT NULL AND day IS NOT NULL", "band, weekday"):
+            self.all_bands.add(band)
+            self.weekly_band_counts[band][day_index] += count
+        return self
+
+    def retained_count(self):
+        # QSO avec bande et date
+        return sum(sum(counts) for counts in self.weekly_band_counts.values())
+
+    def result(self):
+        rows = ([band, *self.weekly_band_counts[band], sum(self.weekly_band_counts[band])]
+                for band in sorted(self.all_bands))
+        return common.table_result("Trafic par bande et jour de la semaine", ['band', *DAYS_OF_WEEK, 'total'],
+                                   rows, total_contacts=self.total_contacts)
+
+    def report(self):
+        # --- Affichage des Résultats ---
+        print("\n--- Analyse de Tendance du Trafic par Bande et Jour de la Semaine ---")
+        print(f"Total des contacts analysés : {self.total_contacts}\n")
+
+        # 1. Préparer l'en-tête
+        sorted_bands = sorted(list(self.all_bands))
+        header_days = " | ".join(f"{day:<10}" for day in DAYS_OF_WEEK)
+        header = f"{'Bande':<6} | {header_days} | {'Total':<6}"
+        separator = "-" * len(header)
+
+        print("Volume de Contacts par Bande (Répartition Hebdomadaire) :")
+        print(separator)
+        print(header)
+        print(separator)
+
+        # 1. Initialisation d'une liste pour stocker les totaux par jour (7 jours)
+        daily_totals = [0] * 7
+        grand_total = 0
+
+        for band in sorted_bands:
+            counts = self.weekly_band_counts[band]
+            total_band = sum(counts)
+            grand_total += total_band
+
+            # Mise à jour des totaux par jour
+            for i in range(7):
+                daily_totals[i] += counts[i]
+
+            # Formatage des comptes pour la ligne de bande
+            counts_str = " | ".join(f"{count:<10}" for count in counts)
+
+            row = (
+                f"{band:<6} | "
+                f"{counts_str} | "
+                f"{total_band:<6}"
+            )
+            print(row)
+
+        # 2. Affichage de la ligne de séparation
+        print("-" * len(row))
+
+        # 3. Affichage de la ligne TOTAL par jour
+        daily_totals_str = " | ".join(f"{total:<10}" for total in daily_totals)
+
+        total_row = (
+            f"{'TOTAL':<6} | "
+            f"{daily_totals_str} | "
+            f"{grand_total:<6}"
         )
-        print(row)
+        print(total_row)
+        print(separator)
+        print("")
 
-    # 2. Affichage de la ligne de séparation
-    print("-" * len(row))
 
-    # 3. Affichage de la ligne TOTAL par jour
-    daily_totals_str = " | ".join(f"{total:<10}" for total in daily_totals)
-
-    total_row = (
-        f"{'TOTAL':<6} | "
-        f"{daily_totals_str} | "
-        f"{grand_total:<6}"
-    )
-    print(total_row)
-    print(separator)
-    print("")
+def analyze_weekly_traffic(adif_records):
+    """ Analyse la répartition hebdomadaire du trafic par bande à partir des enregistrements ADIF. """
+    WeeklyTrafficAnalysis().run(adif_records).report()
 
 # --- Exécution ---
 if __name__ == "__main__":
     args = common.get_args("Analyse du Trafic Hebdomadaire")
     try:
-        records = common.read_file_content(args.file)
+        records = common.load_qso_logs(args.file, use_cache=args.cache, jobs=args.jobs,
+                                       fields=WeeklyTrafficAnalysis.FIELDS)
         analyze_weekly_traffic(records)
-    except FileNotFoundError:
-        print(f"ERREUR: Le fichier {args.file} est introuvable.")
+    except FileNotFoundError as e:
+        print(f"ERREUR: Le fichier {e.filename} est introuvable.")
     except Exception as e:
         print(f"Une erreur s'est produite lors de l'analyse: {e}")
@@ -0,0 +1,169 @@
+""" Banc de mesure des scripts d'analyse ADIF sur des logs synthétiques.
+
+Pour chaque taille, un fichier ADIF est généré (generate_adif, graine fixe)
+puis on mesure le parsing, chaque analyse du rapport et le rapport complet
+(analyze_adif.main). Les résultats sont écrits en JSON ; --compare affiche
+l'écart avec un résultat précédent (ex: celui d'un autre commit).
+
+--startup mesure plutôt le temps de démarrage (python -X importtime) de
+analyze_adif et des modules des analyses, et le compare à un budget.
+"""
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import subprocess
+from contextlib import redirect_stdout
+import analyze_adif
+import generate_adif
+import common
+
+# Tailles mesurées par défaut (nombre de QSO)
+DEFAULT_SIZES = [1000, 10000, 100000]
+# Budget (ms) du temps d'import de analyze_adif, au-delà de l'interpréteur nu
+STARTUP_BUDGET_MS = 40.0
+
+
+def git_commit():
+    """Commit courant du dépôt, ou None hors d'un dépôt git."""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def timed(func, *args, **kwargs):
+    """Exécute func sans afficher sa sortie ; retourne (résultat, durée en secondes)."""
+    start = time.perf_counter()
+    with redirect_stdout(io.StringIO()):
+        result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def import_time_ms(module, pycache_dir):
+    """Temps cumulé (ms) de l'import de module dans un interpréteur neuf (python -X importtime).
+
+    Les modules déjà chargés par l'interpréteur nu (site...) ne sont pas comptés.
+    Le bytecode est compilé dans pycache_dir lors d'un premier import non mesuré,
+    pour mesurer un démarrage normal et non la compilation des sources.
+    """
+    env = {key: value for key, value in os.environ.items() if key != 'PYTHONDONTWRITEBYTECODE'}
+    command = [sys.executable, '-X', f'pycache_prefix={pycache_dir}', '-X', 'importtime', '-c', f'import {module}']
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    subprocess.run(command, capture_output=True, check=True, cwd=cwd, env=env)
+    stderr = subprocess.run(command, capture_output=True, text=True, check=True, cwd=cwd, env=env).stderr
+    for line in reversed(stderr.splitlines()):
+        _, cumulative, name = line.split('|')
+        if name.strip() == module:
+            return int(cumulative) / 1000
+    return None
+
+
+def startup(budget_ms):
+    """Mesure le démarrage de analyze_adif et des modules des analyses ; retourne True si le budget est tenu."""
+    with tempfile.TemporaryDirectory() as pycache_dir:
+        total_ms = import_time_ms('analyze_adif', pycache_dir)
+        print(f"import {'analyze_adif':<28} : {total_ms:8.1f} ms (budget {budget_ms:g} ms)")
+        for name, (module, _) in analyze_adif.ANALYSES.items():
+            print(f"import {module:<28} : {import_time_ms(module, pycache_dir):8.1f} ms ({name})")
+    if total_ms > budget_ms:
+        print(f"ERREUR: budget de démarrage dépassé ({total_ms:.1f} ms > {budget_ms:g} ms)")
+        return False
+    return True
+
+
+def synthetic_log(workdir, count, seed, cty_dat_path=None):
+    """Chemin du log synthétique de count QSO, généré s'il n'existe pas encore."""
+    path = os.path.join(workdir, f"bench_{count}_{seed}.adif")
+    if not os.path.exists(path):
+        generate_adif.write_adif(path, count, seed, cty_dat_path)
+    return path
+
+
+def bench_size(adif_path, count, args):
+    """Mesure le parsing, chaque analyse et le rapport complet sur un fichier ; retourne le résultat."""
+    table, parse_s = timed(common.parse_qso_table, adif_path)
+    result = {
+        'qsos': count,
+        'file_bytes': os.path.getsize(adif_path),
+        'parse_s': parse_s,
+        'parse_qso_per_s': count / parse_s if parse_s else None,
+        'analyses': {},
+    }
+    for name in analyze_adif.analysis_names(args.only):
+        analysis = analyze_adif.build_analysis(name, args.locator, args.ctydat)
+        _, result['analyses'][name] = timed(lambda a=analysis: a.run(table).report())
+    if not args.only:
+        _, result['main_s'] = timed(analyze_adif.main, table, args.locator, cty_dat_path=args.ctydat)
+    return result
+
+
+def compare(results, previous_path):
+    """Affiche le rapport des durées entre ce résultat et un fichier JSON précédent."""
+    with open(previous_path, encoding='utf-8') as f:
+        previous = {item['qsos']: item for item in json.load(f)['results']}
+    print(f"\n--- Comparaison avec {previous_path} (ratio > 1 : plus lent) ---")
+    for item in results:
+        old = previous.get(item['qsos'])
+        if old is None:
+            continue
+        steps = [('parse', item['parse_s'], old['parse_s']), ('main', item.get('main_s'), old.get('main_s'))]
+        steps += [(name, seconds, old['analyses'].get(name)) for name, seconds in item['analyses'].items()]
+        for name, new_s, old_s in steps:
+            if new_s and old_s:
+                print(f"{item['qsos']:>9} QSO | {name:<10} | {old_s:>9.3f} s -> {new_s:>9.3f} s | x{new_s / old_s:.2f}")
+
+
+def main():
+    """Point d'entrée : mesure et écrit les résultats ; retourne le code de sortie."""
+    parser = argparse.ArgumentParser(description="Banc de mesure des analyses ADIF")
+    parser.add_argument('-n', '--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help=f"Tailles des logs synthétiques en QSO (defaut: {DEFAULT_SIZES})")
+    parser.add_argument('-s', '--seed', type=int, default=1, help="Graine du générateur (defaut: 1)")
+    parser.add_argument('-l', '--locator', default=common.MY_LOCATOR,
+                        help=f"Localisateur QRA (defaut: {common.MY_LOCATOR})")
+    parser.add_argument('-c', '--ctydat', default="cty.dat",
+                        help="Fichier cty.dat (préfixes du générateur, pays des analyses)")
+    parser.add_argument('--only', nargs='+', choices=analyze_adif.ANALYSES, metavar='ANALYSE',
+                        help="Ne mesurer que ces analyses (le rapport complet n'est alors pas mesuré)")
+    parser.add_argument('-w', '--workdir', default='.', help="Dossier des logs synthétiques (defaut: .)")
+    parser.add_argument('-o', '--output', default='benchmark.json', help="Fichier JSON des résultats")
+    parser.add_argument('--compare', metavar='JSON', help="Résultat précédent à comparer")
+    parser.add_argument('--startup', nargs='?', type=float, const=STARTUP_BUDGET_MS, metavar='BUDGET_MS',
+                        help="Mesurer seulement le temps d'import (python -X importtime) ; code de sortie 1"
+                        f" au-delà du budget (defaut: {STARTUP_BUDGET_MS:g} ms)")
+    args = parser.parse_args()
+    if args.startup is not None:
+        return 0 if startup(args.startup) else 1
+
+    results = []
+    for size in args.sizes:
+        adif_path = synthetic_log(args.workdir, size, args.seed, args.ctydat)
+        item = bench_size(adif_path, size, args)
+        results.append(item)
+        print(f"{size:>9} QSO : parsing {item['parse_s']:.3f} s ({item['parse_qso_per_s']:.0f} QSO/s)"
+              + (f", rapport complet {item['main_s']:.3f} s" if 'main_s' in item else ""))
+        for name, seconds in item['analyses'].items():
+            print(f"{'':>13} {name:<10} {seconds:>9.3f} s")
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump({
+            'commit': git_commit(),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'seed': args.seed,
+            'results': results,
+        }, f, indent=2)
+    print(f"Résultats écrits dans {args.output}")
+    if args.compare:
+        compare(results, args.compare)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
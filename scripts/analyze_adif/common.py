@@ -1,6 +1,18 @@
 """ Module commun. """
+import os
+import sys
+import errno
+import re
 import math
+import mmap
+import pickle
+import hashlib
 import argparse
+from array import array
+from collections import namedtuple
+from datetime import date
+import geodesy
+import locator
 
 # --- Configuration ---
 ADIF_FILE_PATH = 'f4lno.adif'
@@ -11,81 +23,13 @@ MY_LOCATOR = 'JN33' # <--- REMPLACEZ PAR VOTRE VRAI LOCALISATEUR QRA
 # Liste des bandes à afficher, dans l'ordre de préférence (du HF au VHF)
 ALL_BANDS = ['160m', '80m', '40m', '30m', '20m', '17m', '15m', '12m', '10m', '6m', '4m', '2m', '70cm']
 
-def locator_to_latlon(locator):
-    """Convertit un localisateur QRA (4 ou 6 chars) en (Latitude, Longitude)"""
-    locator = locator.upper().strip()
-    if len(locator) < 4:
-        return None, None
+# Conversions localisateur QRA <-> latitude/longitude (tables et lots dans le module locator)
+locator_to_latlon = locator.locator_to_latlon
+latlon_to_locator = locator.latlon_to_locator
 
-    lon = (ord(locator[0]) - ord('A')) * 20 - 180
-    lat = (ord(locator[1]) - ord('A')) * 10 - 90
-    lon += (int(locator[2])) * 2
-    lat += (int(locator[3])) * 1
 
-    if len(locator) >= 6:
-        lon += (ord(locator[4]) - ord('A')) * (2/24) + (1/24)
-        lat += (ord(locator[5]) - ord('A')) * (1/24) + (0.5/24)
-    elif len(locator) == 4:
-        lon += 1.0
-        lat += 0.5
-
-    return lat, lon
-
-
-def latlon_to_locator(lat, lon, precision=4):
-    """
-    Convert latitude/longitude to Maidenhead locator.
-
-    Args:
-    lat (float): Latitude in degrees (-90 to 90).
-    lon (float): Longitude in degrees (-180 to 180).
-    precision (int): 2 for 2-char (field), 4 for 4-char (square), 6 for 6-char (subsquare), etc.
-
-    Returns:
-    str: Maidenhead locator string.
-    """
-    # Adjust to 0-360 range for lon, 0-180 for lat
-    lat += 90
-    lon += 180
-
-    locator = ''
-
-    # Field level (20° lon x 10° lat, A-R / 0-9)
-    field_lat = int(lat / 10)
-    field_lon = int(lon / 20)
-    locator += chr(ord('A') + field_lon)
-    locator += chr(ord('A') + field_lat)
-    locator += str(int(int(lon) % 20 / 2))
-    locator += str(int(int(lat) % 10 / 1))
-
-    if precision <= 4:
-        return locator
-
-    # Subsquare level (2° lon x 1° lat, a-x / 0-9)
-    lat_rem = lat % 1
-    lon_rem = lon % 2
-    sub_lat = int(lat_rem * 10)
-    sub_lon = int(lon_rem * 10)
-    locator += chr(ord('a') + sub_lon)
-    locator += chr(ord('a') + sub_lat)
-
-    return locator[:precision]
-
-
-def haversine_distance(lat1, lon1, lat2, lon2):
-    """Calcule la distance en km entre deux points Lat/Lon (Formule Haversine)"""
-    r = 6371  # Rayon de la Terre en kilomètres
-    lat1_rad, lon1_rad = math.radians(lat1), math.radians(lon1)
-    lat2_rad, lon2_rad = math.radians(lat2), math.radians(lon2)
-
-    dlon = lon2_rad - lon1_rad
-    dlat = lat2_rad - lat1_rad
-
-    a = math.sin(dlat / 2)**2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(dlon / 2)**2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-
-    distance = r * c
-    return distance
+# Distance d'un point à un autre ; les calculs par lots sont dans geodesy
+haversine_distance = geodesy.haversine_distance
 
 
 # Mapping des fréquences (en MHz) vers les bandes amateur
@@ -120,22 +64,900 @@ def get_band_from_frequency(freq_mhz):
     return 'Autres'  # Regrouper les fréquences non standard
 
 
-def get_args(description="Analyze ADIF files"):
-    """Analyse les arguments de la ligne de commande"""
+def build_parser(description="Analyze ADIF files"):
+    """Construit l'analyseur des arguments communs à tous les scripts"""
     parser = argparse.ArgumentParser(description=description)
-    parser.add_argument('-f', '--file', help=f"Chemin vers le fichier ADIF (defaut: {ADIF_FILE_PATH})", default=ADIF_FILE_PATH)
+    parser.add_argument('-f', '--file', action='append', metavar='FICHIER',
+                        help="Fichier ADIF ou dossier à analyser, à répéter (-f a.adif -f b.adif) : les fichiers"
+                        f" sont fusionnés sans doublons (defaut: {ADIF_FILE_PATH})")
     parser.add_argument('-l', '--locator', help=f"Votre localisateur QRA (defaut: {MY_LOCATOR})", default=MY_LOCATOR)
     parser.add_argument('-c', '--ctydat', help="Chemin vers le fichier cty.dat pour les pays DXCC (https://www.country-files.com/)", default="cty.dat")
-    args = parser.parse_args()
+    parser.add_argument('--no-cache', dest='cache', action='store_false', help=f"Ne pas utiliser le cache de parsing (<fichier>{CACHE_SUFFIX}) ni celui des rapports"
+                        " (<fichier>.results)")
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help="Nombre de processus pour le parsing du fichier ADIF et les analyses (defaut: 1)")
+    return parser
+
+
+def get_args(description="Analyze ADIF files", parser=None, argv=None):
+    """Analyse les arguments de la ligne de commande (parser : issu de build_parser, complété ;
+    argv : arguments à analyser, sys.argv par défaut)"""
+    args = (parser or build_parser(description)).parse_args(argv)
 
+    args.file = args.file or [ADIF_FILE_PATH]
     args.locator = args.locator.upper()
 
-    print(f"Analyse de {args.file} avec le localisateur {args.locator}")
+    print(f"Analyse de {', '.join(args.file)} avec le localisateur {args.locator}", file=sys.stderr)
     return args
 
+# Taille des blocs lus par le lecteur ADIF en flux
+CHUNK_SIZE = 1 << 16
+
+# Balise ADIF : <CHAMP>, ou <CHAMP:longueur> suivi d'un éventuel :type
+RE_TAG = re.compile(rb'<([^:<>]+)(?::\s*(\d+)[^<>]*)?>')
+
+# Cache des noms de champs déjà décodés (b'call' -> 'CALL')
+_FIELD_NAMES = {}
+
+
+def _field_name(raw):
+    """Décode et met en majuscules un nom de champ ADIF."""
+    name = _FIELD_NAMES.get(raw)
+    if name is None:
+        name = _FIELD_NAMES[raw] = raw.strip().upper().decode('ascii', 'ignore')
+    return name
+
+
+def scan_adif(buf, pos=0, end=None, final=True, wanted=None):
+    """Tokenise buf[pos:end] (bytes ou mmap) en une liste de (CHAMP, valeur).
+
+    Chaque balise <CHAMP:longueur[:type]> n'est lue qu'une seule fois : la
+    longueur déclarée sert à découper la valeur (octets bruts), qui peut donc
+    contenir des '<' ou '>'. Seules les valeurs des champs de wanted (tous si
+    None) sont extraites, les autres valent None. Les balises sans valeur
+    (<EOR>, <EOH>) ont pour valeur la position (int) qui suit la balise.
+    Si final est faux, le balayage s'arrête au premier champ incomplet et sa
+    position est retournée pour reprendre au bloc suivant.
+    Retourne (champs, position de reprise).
+    """
+    if end is None:
+        end = len(buf)
+    fields = []
+    append = fields.append
+    search = RE_TAG.search
+    while True:
+        match = search(buf, pos, end)
+        if match is None:
+            if final:
+                return fields, end
+            # Une balise peut être coupée en fin de bloc : on reprend à son '<'
+            start = buf.rfind(b'<', pos, end)
+            return fields, (end if start < 0 else start)
+        raw_name, length = match.groups()
+        pos = match.end()
+        if length is None:
+            append((_field_name(raw_name), pos))
+            continue
+        value_end = pos + int(length)
+        if value_end > end:
+            if not final:
+                return fields, match.start()
+            value_end = end
+        name = _field_name(raw_name)
+        append((name, buf[pos:value_end] if wanted is None or name in wanted else None))
+        pos = value_end
+
+
+class RecordBuilder:
+    """ Assemble les champs produits par scan_adif en enregistrements {CHAMP: valeur}.
+
+        Seules les valeurs extraites sont décodées (UTF-8). Un enregistrement
+        dont aucun champ n'a été extrait est tout de même produit (vide).
+    """
+
+    def __init__(self):
+        self.record = {}
+        self.partial = False
+
+    def feed(self, fields, base=0):
+        """Produit les couples (enregistrement, fin) terminés par un <EOR> dans fields.
+
+        base est la position dans le fichier de l'octet 0 du tampon scanné.
+        """
+        for name, value in fields:
+            if isinstance(value, int):
+                if name == 'EOR':
+                    if self.record or self.partial:
+                        yield self.record, base + value
+                    self.record = {}
+                    self.partial = False
+                elif name == 'EOH':
+                    self.record = {}
+                    self.partial = False
+            elif value is None:
+                self.partial = True
+            else:
+                self.record[name] = value.decode('utf-8', 'ignore')
+
+    def flush(self):
+        """Produit le dernier enregistrement, sans <EOR> (fin = None)."""
+        if self.record or self.partial:
+            yield self.record, None
+
+
+def iter_adif_records_at(stream, offset=0, chunk_size=CHUNK_SIZE, end=None, wanted=None):
+    """Produit les couples (enregistrement, fin) d'un flux ADIF binaire.
+
+    Le flux, positionné à l'octet offset, est lu par blocs de chunk_size
+    octets (jusqu'à l'octet end s'il est donné) : un enregistrement
+    {CHAMP: valeur} est disponible dès que son <EOR> est lu, et fin est la
+    position (octets) qui suit ce <EOR>. Un dernier enregistrement sans
+    <EOR> est produit avec fin = None.
+    Les noms de champs sont mis en majuscules, pas les valeurs. Les champs
+    de l'en-tête (avant <EOH>) sont ignorés. Si wanted est donné, seuls ces
+    champs sont décodés.
+    """
+    builder = RecordBuilder()
+    buf = b''
+    pos = 0
+    read_pos = offset
+    while True:
+        size = chunk_size if end is None else min(chunk_size, end - read_pos)
+        chunk = stream.read(size) if size > 0 else b''
+        read_pos += len(chunk)
+        offset += pos
+        buf = buf[pos:] + chunk
+        fields, pos = scan_adif(buf, final=not chunk, wanted=wanted)
+        yield from builder.feed(fields, offset)
+        if not chunk:
+            break
+    yield from builder.flush()
+
+
+def iter_adif_records(stream, chunk_size=CHUNK_SIZE):
+    """Produit les enregistrements {CHAMP: valeur} d'un flux ADIF binaire.
+
+    La mémoire reste constante quelle que soit la taille du journal.
+    """
+    for record, _ in iter_adif_records_at(stream, chunk_size=chunk_size):
+        yield record
+
+
+def iter_adif_file(file_path, chunk_size=CHUNK_SIZE):
+    """Lit un fichier ADIF en flux et produit ses enregistrements un par un."""
+    with open(file_path, 'rb') as f:
+        yield from iter_adif_records(f, chunk_size)
+
+
+def iter_adif_buffer(buf, start=0, end=None, wanted=None):
+    """Produit les couples (enregistrement, fin) de buf[start:end] (bytes ou mmap).
+
+    Le tampon est balayé par fenêtres de CHUNK_SIZE octets, sans copie :
+    seules les valeurs des champs de wanted (tous si None) sont extraites et
+    décodées. Les positions de fin sont relatives au début du tampon.
+    """
+    end = len(buf) if end is None else end
+    builder = RecordBuilder()
+    pos = start
+    window = CHUNK_SIZE
+    while pos < end:
+        window_end = min(pos + window, end)
+        fields, next_pos = scan_adif(buf, pos, window_end, final=window_end == end, wanted=wanted)
+        yield from builder.feed(fields)
+        # Un champ plus long que la fenêtre : on l'élargit pour avancer
+        window = window * 2 if next_pos == pos else CHUNK_SIZE
+        pos = next_pos
+    yield from builder.flush()
+
+
+def iter_adif_mmap(file_path, start=0, end=None, wanted=None):
+    """Produit les couples (enregistrement, fin) d'un fichier ADIF projeté en mémoire (mmap).
+
+    Le fichier n'est ni lu en entier ni décodé : les balises sont cherchées
+    directement dans les octets et seules les valeurs des champs de wanted
+    (tous si None) sont décodées.
+    """
+    with open(file_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            yield from iter_adif_buffer(mm, start, end, wanted)
+
+
+def iter_adif_tail(file_path, offset=0, wanted=None):
+    """Produit les couples (enregistrement, fin) complets d'un fichier ADIF à partir de l'octet offset.
+
+    offset doit suivre un <EOR> (ou valoir 0). Un dernier enregistrement sans
+    <EOR> (en cours d'écriture par le logiciel de log) est laissé de côté.
+    """
+    for record, end in iter_adif_mmap(file_path, offset, wanted=wanted):
+        if end is not None:
+            yield record, end
+
+
+# Les plages d'un découpage parallèle font au moins cette taille (octets)
+MIN_RANGE_SIZE = 1 << 20
+RE_EOR = re.compile(rb'<EOR>', re.IGNORECASE)
+
+
+def split_adif_file(file_path, parts):
+    """Découpe un fichier ADIF en au plus parts plages d'octets (début, fin).
+
+    Chaque plage, sauf la dernière, se termine juste après un texte <EOR>.
+    C'est une frontière candidate : le texte peut aussi figurer dans la valeur
+    d'un champ (ex: COMMENT), ce que seule la lecture de la plage par le
+    tokeniseur confirme (voir parse_qso_table).
+    """
+    size = os.path.getsize(file_path)
+    parts = max(1, min(parts, size // MIN_RANGE_SIZE))
+    bounds = [0]
+    with open(file_path, 'rb') as f:
+        for i in range(1, parts):
+            bound = _next_eor_end(f, max(size * i // parts, bounds[-1]))
+            if bound is None:
+                break
+            if bound > bounds[-1]:
+                bounds.append(bound)
+    if bounds[-1] < size:
+        bounds.append(size)
+    return list(zip(bounds, bounds[1:]))
+
+
+def _next_eor_end(f, offset):
+    """Retourne la position qui suit le premier texte <EOR> après offset, ou None."""
+    f.seek(offset)
+    carry = b''
+    while True:
+        block = f.read(CHUNK_SIZE)
+        if not block:
+            return None
+        data = carry + block
+        match = RE_EOR.search(data)
+        if match:
+            return offset - len(carry) + match.end()
+        carry = data[-4:]
+        offset += len(block)
+
+
+def parse_adif_range(file_path, start=0, end=None, fields=None):
+    """Construit la QSOTable des enregistrements d'une plage d'octets d'un fichier ADIF.
+
+    Seuls les champs ADIF fields (par défaut QSO_FIELDS) sont décodés ; les
+    colonnes qui dépendent des autres restent vides.
+    """
+    records = (record for record, _ in iter_adif_mmap(file_path, start, end, wanted=fields or QSO_FIELDS))
+    return QSOTable.from_records(records)
+
+
+def parse_adif_part(file_path, start, end, fields=None):
+    """Lit une plage d'octets qui n'est pas la dernière du fichier (voir parse_qso_table).
+
+    Retourne (QSOTable des enregistrements terminés par un <EOR>, confirmée) :
+    confirmée est vrai si le tokeniseur lit un <EOR> qui finit exactement à
+    end, c'est-à-dire si end est une vraie frontière d'enregistrement. Un
+    enregistrement partiel en fin de plage est écarté.
+    """
+    records = []
+    last_end = None
+    for record, record_end in iter_adif_mmap(file_path, start, end, wanted=fields or QSO_FIELDS):
+        if record_end is not None:
+            records.append(record)
+        last_end = record_end
+    return QSOTable.from_records(records), last_end == end
+
+
+def parse_qso_table(file_path, jobs=1, fields=None):
+    """Construit la QSOTable d'un fichier ADIF, en parallèle sur jobs processus.
+
+    Le fichier est découpé en plages aux frontières <EOR> candidates, chaque
+    plage est lue par un processus, puis les tables sont concaténées dans
+    l'ordre. La première plage commence au début du fichier : si sa lecture
+    confirme sa fin, la suivante commence aussi sur un enregistrement, et ainsi
+    de suite. Dès qu'une frontière n'est pas confirmée (texte <EOR> dans une
+    valeur), le reste du fichier est relu d'un seul tenant à partir du début
+    de cette plage : le résultat est identique à une lecture séquentielle.
+    """
+    ranges = split_adif_file(file_path, jobs) if jobs > 1 else []
+    if len(ranges) < 2:
+        return parse_adif_range(file_path, fields=fields)
+    # Importé à la demande : multiprocessing alourdit le démarrage de tous les scripts
+    from concurrent.futures import ProcessPoolExecutor  # pylint: disable=import-outside-toplevel
+    table = QSOTable()
+    with ProcessPoolExecutor(max_workers=len(ranges)) as pool:
+        parts = [pool.submit(parse_adif_part, file_path, start, end, fields) for start, end in ranges[:-1]]
+        last = pool.submit(parse_adif_range, file_path, ranges[-1][0], None, fields)
+        for (start, _), part in zip(ranges, parts):
+            chunk, confirmed = part.result()
+            if not confirmed:
+                last.cancel()
+                table.extend(parse_adif_range(file_path, start, fields=fields))
+                return table
+            table.extend(chunk)
+        table.extend(last.result())
+    return table
+
+
 def read_file_content(file_path):
-    """Lit le contenu d'un fichier ADIF et retourne les enregistrements."""
-    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-        content = f.read().upper()
-        records = content.split('<EOR>')
-    return records
+    """Lit le contenu d'un fichier ADIF et retourne les enregistrements (dictionnaires)."""
+    return list(iter_adif_file(file_path))
+
+
+# --- Extraction des champs d'un enregistrement ---
+RE_GRID = re.compile(r'[A-R]{2}\d{2}(?:[A-X]{2})?')
+RE_SIGNED_INT = re.compile(r'[-+]?\d+')
+
+
+def get_text(record, field):
+    """Retourne la valeur d'un champ en majuscules ('' si absent)."""
+    return record.get(field, '').strip().upper()
+
+
+def get_frequency(record):
+    """Retourne la fréquence (MHz) d'un enregistrement, ou None."""
+    try:
+        return float(record['FREQ'])
+    except (KeyError, ValueError):
+        return None
+
+
+def get_grid(record, field='GRIDSQUARE'):
+    """Retourne le localisateur QRA (4 ou 6 chars) d'un enregistrement, ou None.
+
+    field='MY_GRIDSQUARE' donne le localisateur de la station au moment du QSO.
+    """
+    match = RE_GRID.match(get_text(record, field))
+    return match.group(0) if match else None
+
+
+def get_time_on(record):
+    """Retourne l'heure de début du QSO au format HHMMSS, ou None."""
+    time_on = record.get('TIME_ON', '').strip()
+    if len(time_on) not in (4, 6) or not time_on.isdigit():
+        return None
+    return time_on.ljust(6, '0')
+
+
+def get_qso_date(record):
+    """Retourne la date du QSO au format AAAAMMJJ, ou None."""
+    qso_date = record.get('QSO_DATE', '').strip()
+    if len(qso_date) != 8 or not qso_date.isdigit():
+        return None
+    return qso_date
+
+
+def get_snr(record):
+    """Retourne le SNR (APP_PSKREP_SNR, sinon RST_RCVD de WSJT-X) en dB, ou None."""
+    for field in ('APP_PSKREP_SNR', 'RST_RCVD'):
+        match = RE_SIGNED_INT.match(record.get(field, '').strip())
+        if match:
+            return float(match.group(0))
+    return None
+
+
+# Jour 0 de l'epoch Unix (1970-01-01) en ordinal grégorien
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+# Cache AAAAMMJJ -> nombre de jours depuis l'epoch
+_DATE_DAYS = {}
+
+
+def get_qso_day(record):
+    """Retourne la date du QSO (QSO_DATE) en jours depuis l'epoch UTC, ou None."""
+    qso_date = get_qso_date(record)
+    if not qso_date:
+        return None
+    days = _DATE_DAYS.get(qso_date)
+    if days is None:
+        try:
+            days = date(int(qso_date[:4]), int(qso_date[4:6]), int(qso_date[6:])).toordinal()
+        except ValueError:
+            return None
+        days = _DATE_DAYS[qso_date] = days - EPOCH_ORDINAL
+    return days
+
+
+def get_qso_hour(record):
+    """Retourne l'heure UTC (0-23) de début du QSO (TIME_ON), ou None."""
+    time_on = get_time_on(record)
+    return int(time_on[:2]) if time_on else None
+
+
+def get_qso_time(record):
+    """Retourne l'heure du QSO (QSO_DATE + TIME_ON) en secondes depuis l'epoch UTC, ou None."""
+    days = get_qso_day(record)
+    time_on = get_time_on(record)
+    if days is None or not time_on:
+        return None
+    return days * 86400 + int(time_on[:2]) * 3600 + int(time_on[2:4]) * 60 + int(time_on[4:])
+
+
+def parse_date(value):
+    """Convertit une date AAAAMMJJ en secondes depuis l'epoch UTC (ValueError si invalide)."""
+    if len(value) != 8 or not value.isdigit():
+        raise ValueError(f"date invalide : {value}")
+    days = date(int(value[:4]), int(value[4:6]), int(value[6:])).toordinal() - EPOCH_ORDINAL
+    return days * 86400
+
+
+def date_arg(value):
+    """Type argparse d'une option date AAAAMMJJ (ex: --since/--until) : date valide."""
+    try:
+        parse_date(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(f"date invalide : {value} (format AAAAMMJJ)") from e
+    return value
+
+
+# --- Table de QSO en colonnes ---
+
+# Un QSO normalisé ; les champs absents ou invalides valent None.
+# time : secondes depuis l'epoch UTC (QSO_DATE et TIME_ON) ; lat/lon : centre du localisateur
+# GRIDSQUARE ; my_grid : localisateur de la station (MY_GRIDSQUARE, ex: activation /P ou SOTA) ;
+# day : jours depuis l'epoch (QSO_DATE seul) ; hour : heure UTC 0-23 (TIME_ON seul).
+QSO = namedtuple('QSO', ['call', 'freq', 'band', 'mode', 'time', 'lat', 'lon', 'grid', 'snr', 'country',
+                         'my_grid', 'day', 'hour'])
+
+# Bandes connues : l'identifiant de bande d'une QSOTable est l'index dans cette liste
+BANDS = ALL_BANDS + ['Autres']
+BAND_IDS = {band: i for i, band in enumerate(BANDS)}
+# Valeur de la colonne time quand l'heure du QSO est inconnue
+NO_TIME = -(1 << 63)
+# Valeur de la colonne day quand la date du QSO est inconnue
+NO_DAY = -(1 << 31)
+NAN = float('nan')
+
+
+# Champs ADIF lus par record_to_qso : les autres ne sont pas décodés
+QSO_FIELDS = frozenset([
+    'CALL', 'FREQ', 'MODE', 'QSO_DATE', 'TIME_ON', 'GRIDSQUARE', 'APP_PSKREP_SNR', 'RST_RCVD', 'COUNTRY',
+    'MY_GRIDSQUARE',
+])
+# Champs ADIF de la clé de déduplication (voir qso_key)
+DEDUP_FIELDS = frozenset(['CALL', 'QSO_DATE', 'TIME_ON', 'FREQ', 'MODE'])
+
+
+def record_to_qso(record):
+    """Convertit un enregistrement ADIF {CHAMP: valeur} en QSO normalisé."""
+    freq = get_frequency(record)
+    grid = get_grid(record)
+    lat, lon = locator_to_latlon(grid) if grid else (None, None)
+    return QSO(
+        call=get_text(record, 'CALL') or None,
+        freq=freq,
+        band=get_band_from_frequency(freq) if freq is not None else None,
+        mode=get_text(record, 'MODE') or None,
+        time=get_qso_time(record),
+        lat=lat,
+        lon=lon,
+        grid=grid,
+        snr=get_snr(record),
+        country=record.get('COUNTRY', '').strip().title() or None,
+        my_grid=get_grid(record, 'MY_GRIDSQUARE'),
+        day=get_qso_day(record),
+        hour=get_qso_hour(record),
+    )
+
+
+class QSOTable:
+    """ Table de QSO stockée en colonnes (module array), construite une seule fois
+        et partagée par toutes les analyses.
+
+        Les chaînes (indicatif, mode, locators, pays) sont internées : leur colonne
+        contient un identifiant (-1 si absent) dans self.strings [nom]. Les nombres
+        absents valent NaN (freq, lat, lon, snr), -1 (band, hour), NO_TIME (time) ou
+        NO_DAY (day).
+        L'itération produit des QSO, dans l'ordre du fichier.
+    """
+
+    # Colonnes, dans l'ordre des champs de QSO : nom -> type array
+    COLUMNS = {
+        'call': 'i', 'freq': 'd', 'band': 'b', 'mode': 'i', 'time': 'q',
+        'lat': 'd', 'lon': 'd', 'grid': 'i', 'snr': 'd', 'country': 'i', 'my_grid': 'i',
+        'day': 'i', 'hour': 'b',
+    }
+    STRINGS = ('call', 'mode', 'grid', 'country', 'my_grid')
+
+    def __init__(self):
+        self.columns = {name: array(code) for name, code in self.COLUMNS.items()}
+        self.strings = {name: [] for name in self.STRINGS}
+        self._string_ids = {name: {} for name in self.STRINGS}
+
+    @classmethod
+    def from_records(cls, adif_records):
+        """Construit la table à partir d'enregistrements ADIF (dictionnaires)."""
+        table = cls()
+        for record in adif_records:
+            table.append(record_to_qso(record))
+        return table
+
+    def intern(self, name, value):
+        """Retourne l'identifiant de la chaîne value dans la colonne name (-1 si None)."""
+        if value is None:
+            return -1
+        ids = self._string_ids[name]
+        string_id = ids.get(value)
+        if string_id is None:
+            string_id = ids[value] = len(self.strings[name])
+            self.strings[name].append(value)
+        return string_id
+
+    def extend(self, other):
+        """Ajoute à la fin de la table les QSO d'une autre QSOTable."""
+        for name, column in self.columns.items():
+            if name in self.STRINGS:
+                # Les identifiants de l'autre table sont traduits dans celle-ci
+                ids = [self.intern(name, value) for value in other.strings[name]]
+                column.extend(array('i', [ids[i] if i >= 0 else -1 for i in other.columns[name]]))
+            else:
+                column.extend(other.columns[name])
+
+    def append(self, qso):
+        """Ajoute un QSO à la fin de la table."""
+        cols = self.columns
+        intern = self.intern
+        cols['call'].append(intern('call', qso.call))
+        cols['freq'].append(NAN if qso.freq is None else qso.freq)
+        cols['band'].append(-1 if qso.band is None else BAND_IDS[qso.band])
+        cols['mode'].append(intern('mode', qso.mode))
+        cols['time'].append(NO_TIME if qso.time is None else qso.time)
+        cols['lat'].append(NAN if qso.lat is None else qso.lat)
+        cols['lon'].append(NAN if qso.lon is None else qso.lon)
+        cols['grid'].append(intern('grid', qso.grid))
+        cols['snr'].append(NAN if qso.snr is None else qso.snr)
+        cols['country'].append(intern('country', qso.country))
+        cols['my_grid'].append(intern('my_grid', qso.my_grid))
+        cols['day'].append(NO_DAY if qso.day is None else qso.day)
+        cols['hour'].append(-1 if qso.hour is None else qso.hour)
+
+    def drop(self, rows):
+        """Copie de la table sans les lignes rows."""
+        dropped = set(rows)
+        kept = [row for row in range(len(self)) if row not in dropped]
+        table = QSOTable()
+        table.columns = {name: array(column.typecode, [column[row] for row in kept])
+                         for name, column in self.columns.items()}
+        # Internées dans le même ordre, les chaînes gardent leurs identifiants
+        for name, values in self.strings.items():
+            for value in values:
+                table.intern(name, value)
+        return table
+
+    def __len__(self):
+        return len(self.columns['call'])
+
+    def __getstate__(self):
+        return {'columns': self.columns, 'strings': self.strings}
+
+    def __setstate__(self, state):
+        self.columns = state['columns']
+        self.strings = state['strings']
+        self._string_ids = {name: {value: i for i, value in enumerate(values)}
+                            for name, values in self.strings.items()}
+
+    def __iter__(self):
+        calls, modes, grids, countries, my_grids = (self.strings[name] for name in self.STRINGS)
+        rows = zip(*(self.columns[name] for name in self.COLUMNS))
+        # pylint: disable=comparison-with-itself
+        for call, freq, band, mode, time, lat, lon, grid, snr, country, my_grid, day, hour in rows:
+            yield QSO(
+                calls[call] if call >= 0 else None,
+                freq if freq == freq else None,
+                BANDS[band] if band >= 0 else None,
+                modes[mode] if mode >= 0 else None,
+                time if time != NO_TIME else None,
+                lat if lat == lat else None,
+                lon if lon == lon else None,
+                grids[grid] if grid >= 0 else None,
+                snr if snr == snr else None,
+                countries[country] if country >= 0 else None,
+                my_grids[my_grid] if my_grid >= 0 else None,
+                day if day != NO_DAY else None,
+                hour if hour >= 0 else None,
+            )
+
+
+class Analysis:
+    """ Base des analyses : chaque QSO est accumulé par update(), puis report()
+        affiche le résultat. L'état accumulé est picklable, ce qui permet de le
+        sauvegarder et de le compléter plus tard avec les seuls nouveaux QSO.
+
+        FIELDS liste les champs ADIF dont l'analyse a besoin : seuls ceux-là
+        sont décodés quand elle est exécutée seule (voir analysis_fields).
+    """
+
+    FIELDS = QSO_FIELDS
+
+    def update(self, qso):
+        """Accumule un QSO ; retourne False s'il est ignoré (champs manquants, filtre)."""
+        raise NotImplementedError
+
+    def report(self):
+        """Affiche le résultat de l'analyse."""
+        raise NotImplementedError
+
+    def result(self):
+        """Retourne le résultat structuré de l'analyse (voir table_result)."""
+        raise NotImplementedError
+
+    def params(self):
+        """Paramètres dont dépend le résultat (localisateur, seuils...), pour le cache des résultats."""
+        return {}
+
+    def retained_count(self):
+        """Nombre de QSO retenus jusqu'ici selon le compteur de l'analyse, ou None si elle n'en a pas.
+
+        Le compteur est tenu par update() comme par run_table() et run_store() :
+        le profilage en déduit les QSO ignorés quel que soit le chemin suivi.
+        """
+        return None
+
+    def run(self, adif_records):
+        """Accumule tous les QSO d'une QSOTable, d'un QSOStore ou d'enregistrements ADIF."""
+        run_analyses([self], adif_records)
+        return self
+
+    def run_store(self, store):
+        """Accumule les QSO d'un qso_store.QSOStore (base SQLite).
+
+        Par défaut les QSO sont lus un par un ; les analyses qui s'expriment
+        en agrégats SQL redéfinissent cette méthode.
+        """
+        update = self.update
+        for qso in store:
+            update(qso)
+        return self
+
+    def run_table(self, table):
+        """Accumule les QSO d'une QSOTable.
+
+        Par défaut les QSO sont lus un par un ; les analyses qui se calculent
+        par lots sur les colonnes (geodesy, NumPy) redéfinissent cette méthode.
+        """
+        update = self.update
+        for qso in table:
+            update(qso)
+        return self
+
+
+def table_result(title, columns, rows, **summary):
+    """Résultat structuré d'une analyse : titre, valeurs de synthèse et tableau (colonnes, lignes)."""
+    return {'title': title, 'summary': summary, 'columns': list(columns), 'rows': [list(row) for row in rows]}
+
+
+def batch_method(adif_records):
+    """Nom de la méthode d'Analysis qui traite ces QSO d'un bloc (run_store, run_table), ou None."""
+    if hasattr(adif_records, 'select'):
+        return 'run_store'
+    if isinstance(adif_records, QSOTable):
+        return 'run_table'
+    return None
+
+
+def run_analyses(analyses, adif_records):
+    """Alimente toutes les analyses en un seul passage sur les QSO ; retourne analyses.
+
+    Chaque QSO est lu une seule fois et transmis à l'update() de chaque analyse.
+    Sur un QSOStore (ou une QSOTable), les analyses qui redéfinissent run_store
+    (ou run_table) exécutent leurs agrégats SQL (ou leurs calculs sur les
+    colonnes) et les autres partagent une seule lecture des QSO.
+    """
+    batch = batch_method(adif_records)
+    visitors = analyses
+    if batch:
+        visitors = []
+        for analysis in analyses:
+            if getattr(type(analysis), batch) is getattr(Analysis, batch):
+                visitors.append(analysis)
+            else:
+                getattr(analysis, batch)(adif_records)
+        if not visitors:
+            return analyses
+    updates = [analysis.update for analysis in visitors]
+    for qso in iter_qsos(adif_records):
+        for update in updates:
+            update(qso)
+    return analyses
+
+
+def analysis_fields(analyses):
+    """Union des champs ADIF (FIELDS) nécessaires à des analyses."""
+    return frozenset().union(*(analysis.FIELDS for analysis in analyses))
+
+
+def iter_qsos(adif_records):
+    """Produit les QSO d'une QSOTable ou d'un QSOStore, ou d'enregistrements ADIF convertis à la volée."""
+    if isinstance(adif_records, QSOTable) or hasattr(adif_records, 'select'):
+        return iter(adif_records)
+    return map(record_to_qso, adif_records)
+
+
+# --- Cache de parsing ---
+
+# Suffixe du fichier cache écrit à côté du fichier ADIF (ex: f4lno.adif.cache)
+CACHE_SUFFIX = '.cache'
+# Version du format du cache : à incrémenter quand QSO/QSOTable changent
+CACHE_VERSION = 4
+
+
+def file_digest(file_path, start=0, end=None):
+    """Retourne l'empreinte (BLAKE2b) du contenu d'un fichier (octets start à end)."""
+    digest = hashlib.blake2b(digest_size=20)
+    with open(file_path, 'rb') as f:
+        f.seek(start)
+        remaining = math.inf if end is None else end - start
+        while remaining > 0:
+            chunk = f.read(int(min(remaining, 1 << 20)))
+            if not chunk:
+                break
+            digest.update(chunk)
+            remaining -= len(chunk)
+    return digest.hexdigest()
+
+
+# Taille (octets) des zones d'un fichier vérifiées avant de reprendre sa lecture à un offset
+CHECK_SIZE = 4096
+
+
+def append_checks(file_path, offset):
+    """Empreintes du début du fichier et des octets qui précèdent offset.
+
+    Tant qu'elles sont inchangées, le fichier n'a fait que grandir depuis
+    la lecture jusqu'à offset.
+    """
+    return (file_digest(file_path, 0, min(offset, CHECK_SIZE)),
+            file_digest(file_path, max(0, offset - CHECK_SIZE), offset))
+
+
+def file_key(file_path):
+    """Retourne la clé rapide (chemin, taille, date de modification) d'un fichier."""
+    stat = os.stat(file_path)
+    return os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns
+
+
+def load_pickle(path, version):
+    """Charge un dictionnaire picklé, ou None s'il est absent, illisible ou d'une autre version."""
+    try:
+        with open(path, 'rb') as f:
+            data = pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+        return None
+    if not isinstance(data, dict) or data.get('version') != version:
+        return None
+    return data
+
+
+def save_pickle(path, data):
+    """Écrit un dictionnaire picklé de façon atomique (ignoré si le dossier est en lecture seule)."""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def load_qso_table(file_path, use_cache=True, jobs=1, fields=QSO_FIELDS):
+    """Construit la QSOTable d'un fichier ADIF, via le cache <fichier>.cache si possible.
+
+    Le cache est valide tant que le chemin, la taille et la date de modification
+    du fichier sont inchangés et qu'il contient les champs ADIF fields. Si seule
+    la date a changé, l'empreinte du contenu décide s'il faut reparser. Un cache
+    périmé est réécrit automatiquement ; s'il lui manque des champs, le fichier
+    est reparsé avec ses champs et ceux demandés, pour ne pas les perdre.
+    Le parsing éventuel est réparti sur jobs processus.
+    """
+    fields = frozenset(fields)
+    if not use_cache:
+        return parse_qso_table(file_path, jobs, fields)
+
+    key = file_key(file_path)
+    cache_path = file_path + CACHE_SUFFIX
+    cached = load_pickle(cache_path, CACHE_VERSION)
+    if cached and cached['key'] == key and fields <= cached['fields']:
+        return cached['table']
+
+    digest = file_digest(file_path)
+    if cached and cached['digest'] == digest:
+        if fields <= cached['fields']:
+            table = cached['table']
+        else:
+            fields |= cached['fields']
+            table = parse_qso_table(file_path, jobs, fields)
+    else:
+        table = parse_qso_table(file_path, jobs, fields)
+    save_pickle(cache_path, {'version': CACHE_VERSION, 'key': key, 'digest': digest,
+                             'fields': fields, 'table': table})
+    return table
+
+
+# --- Fusion de plusieurs fichiers ---
+
+# Extensions des fichiers ADIF retenus dans un dossier
+ADIF_EXTENSIONS = ('.adi', '.adif')
+
+
+def list_adif_files(paths):
+    """Retourne les fichiers ADIF désignés par paths (fichiers, ou dossiers parcourus sur un niveau)."""
+    if isinstance(paths, str):
+        paths = [paths]
+    files = []
+    for path in paths:
+        if not os.path.isdir(path):
+            files.append(path)
+            continue
+        found = sorted(os.path.join(path, name) for name in os.listdir(path)
+                       if name.lower().endswith(ADIF_EXTENSIONS)
+                       and os.path.isfile(os.path.join(path, name)))
+        if not found:
+            raise FileNotFoundError(errno.ENOENT, "Aucun fichier ADIF dans le dossier", path)
+        files.extend(found)
+    return files
+
+
+def qso_key(qso):
+    """Clé de déduplication d'un QSO : indicatif, date et heure à la minute, bande, mode."""
+    return ((qso.call or '').upper(), qso.time // 60, qso.band, (qso.mode or '').upper())
+
+
+def duplicate_rows(table, seen):
+    """Lignes de la QSOTable table dont la clé (voir qso_key) est dans seen ou sur une ligne précédente.
+
+    Les clés des autres lignes sont ajoutées à seen : le premier QSO d'une clé
+    est retenu, comme par l'index unique de qso_store. Les QSO sans date ni
+    heure ne sont jamais des doublons.
+    """
+    cols, strings = table.columns, table.strings
+    # Index -1 (valeur absente) : dernier élément de chaque liste
+    calls = [call.upper() for call in strings['call']] + ['']
+    modes = [mode.upper() for mode in strings['mode']] + ['']
+    bands = BANDS + [None]
+    duplicates = []
+    for row, (call, time, band, mode) in enumerate(zip(cols['call'], cols['time'], cols['band'], cols['mode'])):
+        if time == NO_TIME:
+            continue
+        key = (calls[call], time // 60, bands[band], modes[mode])
+        if key in seen:
+            duplicates.append(row)
+        else:
+            seen.add(key)
+    return duplicates
+
+
+def merge_qso_tables(tables):
+    """Fusionne des QSOTable en une seule, sans doublons (voir duplicate_rows).
+
+    Les tables sont lues une à une et seules les clés des QSO retenus sont
+    gardées en mémoire. Retourne (table, nombre de doublons ignorés).
+    """
+    merged = QSOTable()
+    seen = set()
+    duplicates = 0
+    for table in tables:
+        rows = duplicate_rows(table, seen)
+        merged.extend(table.drop(rows) if rows else table)
+        duplicates += len(rows)
+    return merged, duplicates
+
+
+def load_qso_logs(paths, use_cache=True, jobs=1, fields=QSO_FIELDS):
+    """Construit la QSOTable de plusieurs fichiers ADIF ou dossiers, sans doublons.
+
+    Chaque fichier garde son propre cache de parsing (voir load_qso_table).
+    Les doublons sont ignorés dans un même fichier comme entre fichiers, selon
+    la règle de la base SQLite (qso_store). Seuls les champs ADIF fields sont
+    décodés, plus ceux de la clé de déduplication.
+    """
+    files = list_adif_files(paths)
+    fields = frozenset(fields) | DEDUP_FIELDS
+    if len(files) == 1:
+        table = load_qso_table(files[0], use_cache=use_cache, jobs=jobs, fields=fields)
+        rows = duplicate_rows(table, set())
+        if not rows:
+            return table
+        print(f"{files[0]} : {len(rows)} doublons ignorés", file=sys.stderr)
+        return table.drop(rows)
+    table, duplicates = merge_qso_tables(
+        load_qso_table(file_path, use_cache=use_cache, jobs=jobs, fields=fields) for file_path in files)
+    print(f"{len(files)} fichiers ADIF fusionnés : {len(table)} QSO uniques, {duplicates} doublons ignorés", file=sys.stderr)
+    return table
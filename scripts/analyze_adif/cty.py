@@ -1,6 +1,31 @@
-""" Module pour analyser les informations de pays à partir d'un fichier cty.dat. """
+""" Module pour analyser les informations de pays à partir d'un fichier cty.dat.
+
+Le fichier texte n'est parsé qu'une fois : les tables compilées (préfixes,
+indicatifs exacts, préfixes triés) sont picklées à côté de lui (ex: cty.dat.cache) et
+relues tant que sa date de modification ou son empreinte sont inchangées.
+load_cty partage une seule instance par fichier dans le processus.
+"""
 import io
 import os
+import re
+from array import array
+from bisect import bisect_right
+from collections import namedtuple
+from functools import lru_cache
+import common
+
+# One cty.dat entity, as seen from a prefix or a callsign (overrides applied):
+# lat/lon in degrees, longitude positive to the west as in cty.dat, utc_offset
+# in hours (positive to the west too), dxcc_prefix the primary prefix of the entity
+CtyEntry = namedtuple ('CtyEntry', [
+    'country', 'lat', 'lon', 'cq_zone', 'itu_zone', 'continent', 'utc_offset', 'dxcc_prefix'])
+
+# Result of a lookup that matches no entity (or maritime/aeronautical mobile)
+UNKNOWN = CtyEntry (None, None, None, None, None, None, None, None)
+
+# Override markup after a prefix: (CQ zone) [ITU zone] <lat/lon> {continent} ~UTC offset~
+RE_OVERRIDE = re.compile (
+    r'\((\d+)\)|\[(\d+)\]|<([-+.\d]+)/([-+.\d]+)>|\{(\w+)\}|~([-+.\d]+)~')
 
 class CTY:
     """ Parse Country information in cty.dat format
@@ -11,10 +36,38 @@ class CTY:
     data = os.path.join (os.path.dirname (__file__), 'data', 'cty.dat')
 
     # After prefix, additional info can be appended enclosed in the
-    # following suffix markup. We ignore those currently.
+    # following suffix markup: it overrides the values of the entity
+    # (see RE_OVERRIDE)
     suffixes = '()', '[]', '<>', '{}', '~~'
 
-    def __init__ (self, filename):
+    # Suffixes of a compound callsign that do not change the entity,
+    # and those that leave it without entity (maritime, aeronautical mobile)
+    portable_suffixes  = frozenset (('P', 'M', 'A', 'QRP', 'QRPP', 'LH', 'AE', 'AG'))
+    no_entity_suffixes = frozenset (('MM', 'AM'))
+
+    # Number of resolved callsigns kept by callsign_lookup (LRU memo)
+    lookup_cache_size = 1 << 16
+
+    # Compiled tables, pickled next to cty.dat (see load_compiled)
+    cache_suffix  = '.cache'
+    cache_version = 2
+    tables        = 'exact_callsign', 'prefix', 'prf_max', 'countries', 'prefix_table'
+
+    def __init__ (self, filename, use_cache = False):
+        compiled = self.load_compiled (filename) if use_cache else None
+        if compiled is None:
+            self.parse (filename)
+            self.prefix_table = self.compile_prefixes (self.prefix)
+            if use_cache:
+                self.save_compiled (filename)
+        else:
+            for name in self.tables:
+                setattr (self, name, compiled [name])
+        self.memo = lru_cache (maxsize = self.lookup_cache_size) (self.resolve)
+    # end def __init__
+
+    def parse (self, filename):
+        """ Parse the text cty.dat file into the prefix and exact tables """
         # pylint: disable=unused-variable
         self.exact_callsign = {}
         self.prefix         = {}
@@ -29,7 +82,9 @@ class CTY:
                     line = line.rstrip (':')
                     l = [x.lstrip () for x in line.split (':')]
                     country, cq, itu, ctycode, lat, lon, gmtoff, pfx = l
-                    self.countries [country] = True
+                    entity = CtyEntry (country, float (lat), float (lon), int (cq),
+                                       int (itu), ctycode, float (gmtoff), pfx)
+                    self.countries [country] = entity
                     end = False
                 else:
                     # Docs say 'should' contain comma at the end on continuation
@@ -39,35 +94,168 @@ class CTY:
                     line = line.rstrip (',')
                     pfxs = line.split (',')
                     for pfx in pfxs:
-                        # discard any additional info at end of prefix
+                        entry = self.apply_overrides (entity, pfx)
+                        # discard the additional info at end of prefix
                         for s in self.suffixes:
                             s = s [0]
                             pfx = pfx.split (s, 1) [0]
                         if pfx.startswith ('='):
                             pfx = pfx.lstrip ('=')
                             if pfx not in self.exact_callsign:
-                                self.exact_callsign [pfx] = (country, lat, lon)
+                                self.exact_callsign [pfx] = entry
                         else:
                             l = len (pfx)
                             self.prf_max = max(self.prf_max, l)
                             if pfx not in self.prefix:
-                                self.prefix [pfx] = (country, lat, lon)
+                                self.prefix [pfx] = entry
                     if end:
                         country = None
                         end     = False
-    # end def __init__
+    # end def parse
+
+    @staticmethod
+    def apply_overrides (entity, pfx):
+        """ Entry of prefix pfx: the entity, with the values given in the
+            markup after the prefix (ex: VK2(30)[59]) replacing its own;
+            entries without markup share the entity tuple
+        """
+        overrides = {}
+        for cq, itu, lat, lon, cont, gmtoff in RE_OVERRIDE.findall (pfx):
+            if cq:
+                overrides ['cq_zone']    = int (cq)
+            elif itu:
+                overrides ['itu_zone']   = int (itu)
+            elif lat:
+                overrides ['lat']        = float (lat)
+                overrides ['lon']        = float (lon)
+            elif cont:
+                overrides ['continent']  = cont
+            else:
+                overrides ['utc_offset'] = float (gmtoff)
+        return entity._replace (**overrides) if overrides else entity
+    # end def apply_overrides
+
+    def load_compiled (self, filename):
+        """ Compiled tables of filename from its cache, or None if the
+            cache is missing or stale: valid while the modification date
+            of cty.dat is unchanged, or else while its digest is
+        """
+        cache_path = filename + self.cache_suffix
+        cached = common.load_pickle (cache_path, self.cache_version)
+        if cached is None:
+            return None
+        key = common.file_key (filename)
+        if cached ['key'] == key:
+            return cached
+        if cached ['digest'] != common.file_digest (filename):
+            return None
+        # Only the date changed (ex: file copied again): refresh the key
+        cached ['key'] = key
+        common.save_pickle (cache_path, cached)
+        return cached
+    # end def load_compiled
+
+    def save_compiled (self, filename):
+        """ Pickle the compiled tables next to filename (ignored if read-only) """
+        data = {name: getattr (self, name) for name in self.tables}
+        data ['version'] = self.cache_version
+        data ['key']     = common.file_key (filename)
+        data ['digest']  = common.file_digest (filename)
+        common.save_pickle (filename + self.cache_suffix, data)
+    # end def save_compiled
+
+    @staticmethod
+    def compile_prefixes (prefixes):
+        """ Compile {prefix: value} into a sorted-prefix table for bisect:
+            (sorted prefixes, index of the longest shorter prefix of each
+            one, or -1, values in the same order)
+        """
+        names   = sorted (pfx for pfx in prefixes if pfx)
+        parents = array ('i')
+        # Indexes of the prefixes of the current name, shortest first
+        chain   = []
+        for i, name in enumerate (names):
+            while chain and not name.startswith (names [chain [-1]]):
+                chain.pop ()
+            parents.append (chain [-1] if chain else -1)
+            chain.append (i)
+        return names, parents, [prefixes [name] for name in names]
+    # end def compile_prefixes
+
+    def prefix_lookup (self, callsign):
+        """ Longest prefix of callsign found in cty.dat: the greatest
+            prefix sorted before callsign, or else one of its own prefixes
+            Returns a CtyEntry or None if no prefix matches
+        """
+        names, parents, values = self.prefix_table
+        i = bisect_right (names, callsign) - 1
+        while i >= 0 and not callsign.startswith (names [i]):
+            i = parents [i]
+        return values [i] if i >= 0 else None
+    # end def prefix_lookup
+
+    def resolve (self, callsign):
+        """ Lookup callsign in cty.dat data, without the memo
+            Returns a CtyEntry, UNKNOWN if not found
+        """
+        entry = self.exact_callsign.get (callsign)
+        if entry is not None:
+            return entry
+        # Fast path: only compound callsigns need to be split
+        if '/' in callsign:
+            return self.resolve_compound (callsign)
+        return self.prefix_lookup (callsign) or UNKNOWN
+    # end def resolve
+
+    def resolve_compound (self, callsign):
+        """ Lookup a compound callsign: EA8/F4LNO and F4LNO/KH6 are located
+            by their shorter part, F4LNO/P and F4LNO/3 by the base call,
+            F4LNO/MM (maritime mobile) has no entity
+            Returns a CtyEntry, UNKNOWN if not found
+        """
+        parts = [p for p in callsign.split ('/') if p]
+        if any (p in self.no_entity_suffixes for p in parts [1:]):
+            return UNKNOWN
+        parts = [p for i, p in enumerate (parts)
+                 if not i or not (p in self.portable_suffixes or p.isdigit ())]
+        if not parts:
+            return UNKNOWN
+        if len (parts) == 1:
+            return self.resolve (parts [0])
+        designator, call = sorted (parts [:2], key = len)
+        return self.prefix_lookup (designator) or self.resolve (call)
+    # end def resolve_compound
 
     def callsign_lookup (self, callsign):
-        """ Lookup callsign in cty.dat data
-            Returns (country, lat, lon) or None if not found
+        """ Lookup callsign in cty.dat data, the most recently resolved
+            callsigns being memoized
+            Returns a CtyEntry, UNKNOWN if not found
         """
-        if callsign in self.exact_callsign:
-            return self.exact_callsign [callsign]
-        for n in reversed (range (self.prf_max)):
-            pfx = callsign [:n+1]
-            if pfx in self.prefix:
-                return self.prefix [pfx]
-        return None, None, None
+        return self.memo (callsign)
     # end def callsign_lookup
 
+    def callsign_lookups (self, callsigns):
+        """ Lookup each distinct callsign of an iterable once
+            (ex: the callsigns of a whole log)
+            Returns {callsign: CtyEntry}
+        """
+        resolve = self.resolve
+        return {callsign: resolve (callsign) for callsign in set (callsigns)}
+    # end def callsign_lookups
+
 # end class CTY
+
+@lru_cache (maxsize = None)
+def shared_cty (path):
+    """ CTY of the cty.dat at absolute path, loaded through its compiled
+        cache on first call and then shared by the whole process
+    """
+    return CTY (path, use_cache = True)
+# end def shared_cty
+
+def load_cty (cty_dat_path):
+    """ Shared CTY of cty.dat if a path is given and the file exists, else None """
+    if cty_dat_path and os.path.exists (cty_dat_path):
+        return shared_cty (os.path.abspath (cty_dat_path))
+    return None
+# end def load_cty
@@ -0,0 +1,173 @@
+""" Cache persistant des distances et azimuts entre la station et les locators contactés.
+
+Une station contacte souvent les mêmes quelques milliers de locators : la
+distance (km) et l'azimut initial (degrés) de chaque couple (locator de la
+station, locator contacté) sont calculés une seule fois, puis conservés d'une
+exécution à l'autre. Le cache est partagé par toutes les analyses (voir
+shared_cache) et borné : au plus MAX_STATIONS locators de station, et
+MAX_GRIDS_PER_STATION locators contactés par station (les moins récemment
+utilisés sont oubliés). Les valeurs d'une station sont recalculées si la
+position de son locator change. Un log peut mêler plusieurs stations
+(MY_GRIDSQUARE des activations /P ou SOTA) : voir lookup_rows.
+"""
+import os
+import atexit
+from collections import OrderedDict
+from functools import lru_cache
+import geodesy
+import locator
+import common
+
+# Emplacement du cache, commun à tous les logs (XDG_CACHE_HOME ou ~/.cache)
+DISTANCE_CACHE_PATH = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'),
+                                   'analyze_adif', 'distances.cache')
+# Version du cache : à incrémenter quand son format ou le calcul des distances change
+DISTANCE_CACHE_VERSION = 2
+# Nombre maximal de locators de station, et de locators contactés par station
+MAX_STATIONS = 8
+MAX_GRIDS_PER_STATION = 50000
+
+
+class DistanceCache:
+    """ Distances et azimuts {locator de station: {locator contacté: (km, degrés)}},
+        picklés dans path.
+
+        Les stations sont rangées de la moins à la plus récemment utilisée,
+        de même que les locators contactés de chaque station. L'ordre
+        d'utilisation n'est écrit qu'avec de nouvelles valeurs : une lecture
+        seule ne réécrit pas le cache.
+    """
+
+    def __init__(self, path=DISTANCE_CACHE_PATH, max_stations=MAX_STATIONS,
+                 max_grids=MAX_GRIDS_PER_STATION):
+        self.path = path
+        self.max_stations = max_stations
+        self.max_grids = max_grids
+        cached = common.load_pickle(path, DISTANCE_CACHE_VERSION)
+        # Locator de station -> {'origin': (lat, lon), 'grids': OrderedDict {locator: (km, degrés)}}
+        self.stations = cached['stations'] if cached else {}
+        self.dirty = False
+
+    def grids(self, my_locator):
+        """Table {locator contacté: (km, degrés)} de la station my_locator (vide si nouvelle)."""
+        station = self.stations.get(my_locator)
+        if station is not None and next(reversed(self.stations)) == my_locator:
+            return station['grids']
+        origin = locator.locator_to_latlon(my_locator)
+        if station is None or station['origin'] != origin:
+            station = {'origin': origin, 'grids': OrderedDict()}
+            self.dirty = True
+        # La station devient la plus récemment utilisée
+        self.stations.pop(my_locator, None)
+        self.stations[my_locator] = station
+        while len(self.stations) > self.max_stations:
+            del self.stations[next(iter(self.stations))]
+        return station['grids']
+
+    def _store(self, grids, values):
+        """Ajoute des valeurs {locator: (km, degrés)} à une table, dans la limite de max_grids."""
+        grids.update(values)
+        # Les moins récemment utilisés sont oubliés, chacun en O(1)
+        while len(grids) > self.max_grids:
+            grids.popitem(last=False)
+        self.dirty = True
+
+    def lookup(self, my_locator, grid):
+        """(distance km, azimut degrés) de la station my_locator vers le locator grid."""
+        grids = self.grids(my_locator)
+        values = grids.get(grid)
+        if values is not None:
+            # Le locator devient le plus récemment utilisé
+            grids.move_to_end(grid)
+        else:
+            lat, lon = self.stations[my_locator]['origin']
+            other_lat, other_lon = locator.locator_to_latlon(grid)
+            values = (geodesy.haversine_distance(lat, lon, other_lat, other_lon),
+                      geodesy.initial_bearing(lat, lon, other_lat, other_lon))
+            self._store(grids, {grid: values})
+        return values
+
+    def lookup_many(self, my_locator, grid_list):
+        """Distances et azimuts de la station vers chaque locator de grid_list.
+
+        Les locators absents du cache sont calculés en un seul lot (geodesy).
+        Retourne (distances, azimuts) : tableaux NumPy, ou listes sans NumPy.
+        """
+        grids = self.grids(my_locator)
+        found = {grid: grids.get(grid) for grid in grid_list}
+        missing = [grid for grid, values in found.items() if values is None]
+        for grid, values in found.items():
+            if values is not None:
+                grids.move_to_end(grid)
+        if missing:
+            lat, lon = self.stations[my_locator]['origin']
+            other_lats, other_lons = locator.locators_to_latlon(missing)
+            distances, bearings = geodesy.distances_bearings(lat, lon, other_lats, other_lons)
+            computed = dict(zip(missing, zip([float(d) for d in distances], [float(b) for b in bearings])))
+            found.update(computed)
+            self._store(grids, computed)
+        distances = [found[grid][0] for grid in grid_list]
+        bearings = [found[grid][1] for grid in grid_list]
+        np = geodesy.numpy_module()
+        if np is None:
+            return distances, bearings
+        return np.array(distances, dtype=float), np.array(bearings, dtype=float)
+
+    def lookup_rows(self, table, my_locator, rows=None):
+        """Distances et azimuts de chaque QSO de la QSOTable table (restreinte aux lignes rows).
+
+        L'origine d'un QSO est son locator de station (colonne my_grid), ou
+        my_locator s'il n'en a pas : un seul lookup_many par station distincte,
+        limité aux locators contactés depuis celle-ci. Les QSO sans locator
+        donnent NaN. Retourne (distances, azimuts) en tableaux NumPy (NumPy requis).
+        """
+        np = geodesy.numpy_module()
+        rows = np.arange(len(table)) if rows is None else np.asarray(rows)
+        grids = np.asarray(table.columns['grid'])[rows]
+        homes = np.asarray(table.columns['my_grid'])[rows]
+        distances = np.full(len(rows), np.nan)
+        bearings = np.full(len(rows), np.nan)
+        for home_id in np.unique(homes).tolist():
+            home = table.strings['my_grid'][home_id] if home_id >= 0 else my_locator
+            selected = np.flatnonzero((homes == home_id) & (grids >= 0))
+            grid_ids, inverse = np.unique(grids[selected], return_inverse=True)
+            home_distances, home_bearings = self.lookup_many(
+                home, [table.strings['grid'][i] for i in grid_ids.tolist()])
+            distances[selected] = home_distances[inverse]
+            bearings[selected] = home_bearings[inverse]
+        return distances, bearings
+
+    def save(self):
+        """Écrit le cache s'il a changé (ignoré si le dossier n'est pas accessible en écriture)."""
+        if not self.dirty:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        except OSError:
+            return
+        common.save_pickle(self.path, {'version': DISTANCE_CACHE_VERSION, 'stations': self.stations})
+        self.dirty = False
+
+
+def home_positions(table, my_locator, rows=None):
+    """Positions (latitudes, longitudes) de la station de chaque QSO de la QSOTable table.
+
+    La station est celle du QSO (colonne my_grid), sinon my_locator ; chaque
+    locator de station n'est décodé qu'une fois. Retourne deux tableaux NumPy
+    (NumPy requis), restreints aux lignes rows si fourni.
+    """
+    np = geodesy.numpy_module()
+    # L'identifiant -1 (pas de MY_GRIDSQUARE) désigne le dernier locator : my_locator
+    lats, lons = locator.locators_to_latlon(table.strings['my_grid'] + [my_locator])
+    homes = np.asarray(table.columns['my_grid'])
+    if rows is not None:
+        homes = homes[rows]
+    return lats[homes], lons[homes]
+
+
+@lru_cache(maxsize=None)
+def shared_cache():
+    """Cache commun aux analyses du processus, chargé au premier appel et écrit à la fin du processus."""
+    cache = DistanceCache()
+    atexit.register(cache.save)
+    return cache
@@ -1,151 +1,258 @@
 """ Script pour trouver les contacts DX les plus éloignés dans un fichier ADIF. """
-import re
-import os
-from cty import CTY
+import heapq
+from cty import load_cty
+import geodesy
+import distance_cache
 import common
 
 # --- Fonction d'Analyse Principale ---
 
-def find_top_dx(adif_records, my_locator, top_n=100, cty_dat_path=None):
-    """ Trouve les contacts DX les plus éloignés dans les enregistrements ADIF. """
-    my_loc_lat, my_loc_lon = common.locator_to_latlon(my_locator)
+# Paramètres (locator, top_n, cty.dat) et position de la station comme dans les
+# autres analyses, cty.dat chargé, meilleurs contacts et deux compteurs : rien à regrouper
+class TopDxAnalysis(common.Analysis):  # pylint: disable=too-many-instance-attributes
+    """ Contacts DX les plus éloignés (un seul contact par indicatif). """
+
+    # Champs ADIF utilisés
+    FIELDS = frozenset(['CALL', 'MODE', 'FREQ', 'GRIDSQUARE', 'COUNTRY', 'MY_GRIDSQUARE'])
+
+    def __init__(self, my_locator, top_n=100, cty_dat_path=None):
+        self.my_locator = my_locator
+        self.top_n = top_n
+        self.my_loc_lat, self.my_loc_lon = common.locator_to_latlon(my_locator)
 
-    if my_loc_lat is None:
-        print(f"ERREUR: Localisateur QRA '{my_locator}' invalide ou trop court. Le programme s'arrête.")
-        return
+        # Meilleur contact (le plus éloigné) par indicatif : {callsign: contact}
+        self.best_by_call = {}
+        self.total_contacts = 0
+        self.contacts_with_locators = 0
 
-    all_contacts_data = []
-    total_contacts = 0
-    contacts_with_locators = 0
+        # Chargement du fichier cty.dat si fourni et disponible (pour recherche de pays par callsign)
+        self.cty_dat_path = cty_dat_path
+        self.cty = load_cty(cty_dat_path)
 
-    # Regex pour extraire les champs
-    re_call = re.compile(r'<CALL:\d+>([A-Z0-9/]+)')
-    re_mode = re.compile(r'<MODE:\d+>([A-Z0-9]+)')
-    re_freq = re.compile(r'<FREQ:\d+>([\d.]+)')
-    re_grid = re.compile(r'<GRIDSQUARE:\d+>([A-Z]{2}\d{2}[A-Z]{0,2})')
-    # NOUVELLE REGEX pour le Pays/DXCC
-    # On cherche le tag <COUNTRY:n> suivi du nom, jusqu'à la balise suivante <
-    re_country = re.compile(r'<COUNTRY:\d+>(.+?)<')
+    def __getstate__(self):
+        # Les données cty.dat ne sont pas sauvegardées : elles sont rechargées
+        state = self.__dict__.copy()
+        del state['cty']
+        return state
 
-    # Chargement du fichier cty.dat si fourni et disponible (pour recherche de pays par callsign)
-    cty = CTY(cty_dat_path) if cty_dat_path and os.path.exists(cty_dat_path) else None
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.cty = load_cty(self.cty_dat_path)
 
-    for record in adif_records:
-        if not record.strip():
-            continue
+    def update(self, qso):
+        if self.my_loc_lat is None:
+            return False
 
-        total_contacts += 1
+        self.total_contacts += 1
 
         # 1. Extraction des champs
-        match_call = re_call.search(record)
-        match_mode = re_mode.search(record)
-        match_freq = re_freq.search(record)
-        match_grid = re_grid.search(record)
-        match_country = re_country.search(record) # Extraction du pays
-
-        if not (match_call and match_mode and match_freq) or (not match_grid and cty is None):
-            continue
-
-        # Nettoyage des données
-        callsign = match_call.group(1).strip()
-        mode = match_mode.group(1).strip()
-        freq_mhz = float(match_freq.group(1))
-        other_locator = match_grid.group(1).strip() if match_grid else None
-        other_lat, other_lon = None, None
-
-        # Pays : utilisation de la valeur trouvée sinon recherche via cty.dat
-        if match_country:
-            country = match_country.group(1).strip().title()
-        elif cty:
-            # Recherche du pays dans le fichier cty.dat
-            country, lat, lon = cty.callsign_lookup(callsign)
-            if not match_grid:
-                other_lat, other_lon = float(lat), -float(lon)
+        callsign, mode, freq_mhz = qso.call, qso.mode, qso.freq
+        other_locator = qso.grid
+        other_lat, other_lon = qso.lat, qso.lon
+
+        if not (callsign and mode and freq_mhz is not None) or (not other_locator and self.cty is None):
+            return False
+
+        # Pays : utilisation de la valeur trouvée (champ COUNTRY) sinon recherche via cty.dat
+        if qso.country:
+            country = qso.country
+        elif self.cty:
+            # Recherche du pays dans le fichier cty.dat (ND si l'indicatif est inconnu)
+            entry = self.cty.callsign_lookup(callsign)
+            country = entry.country or "ND"
+            if not other_locator and entry.lat is not None:
+                # cty.dat donne la longitude positive vers l'ouest
+                other_lat, other_lon = entry.lat, -entry.lon
                 other_locator = common.latlon_to_locator(other_lat, other_lon, precision=6)
         else:
             country = "ND"
 
         if not other_locator or len(other_locator) < 4:
-            continue
+            return False
 
-        contacts_with_locators += 1
+        self.contacts_with_locators += 1
 
         # 2. Calcul de la distance
-        if not other_lat or not other_lon:
-            other_lat, other_lon = common.locator_to_latlon(other_locator)
         if other_lat is None:
-            continue
+            return False
+
+        # Depuis la station du QSO (MY_GRIDSQUARE), sinon depuis my_locator
+        if qso.grid:
+            distance_km = distance_cache.shared_cache().lookup(qso.my_grid or self.my_locator, qso.grid)[0]
+        else:
+            my_lat, my_lon = (common.locator_to_latlon(qso.my_grid) if qso.my_grid
+                              else (self.my_loc_lat, self.my_loc_lon))
+            distance_km = geodesy.haversine_distance(my_lat, my_lon, other_lat, other_lon)
 
-        distance_km = common.haversine_distance(my_loc_lat, my_loc_lon, other_lat, other_lon)
+        # 3. Stockage du contact s'il est le plus éloigné pour cet indicatif
+        best = self.best_by_call.get(callsign)
+        if best is None or distance_km > best['distance_km']:
+            self.best_by_call[callsign] = {
+                'distance_km': distance_km,
+                'callsign': callsign,
+                'locator': other_locator,
+                'mode': mode,
+                'freq_mhz': freq_mhz,
+                'country': country, # AJOUT DE LA DONNÉE PAYS
+                'rank': self.contacts_with_locators, # Ordre d'arrivée, pour départager les ex aequo
+            }
+        return True
 
-        # 3. Stockage du contact
-        all_contacts_data.append({
+    def run_table(self, table):
+        np = geodesy.numpy_module()
+        if np is None or self.my_loc_lat is None:
+            return super().run_table(table)
+
+        self.total_contacts += len(table)
+        cols, strings = table.columns, table.strings
+        calls, grids = np.asarray(cols['call']), np.asarray(cols['grid'])
+        rows = (calls >= 0) & (np.asarray(cols['mode']) >= 0) & ~np.isnan(np.asarray(cols['freq']))
+        lats, lons = np.array(cols['lat']), np.array(cols['lon'])
+        if self.cty is None:
+            rows &= grids >= 0
+        else:
+            # Sans locator ni champ COUNTRY : position du pays de l'indicatif (cty.dat),
+            # cherchée une fois par indicatif ; avec COUNTRY ou un indicatif inconnu,
+            # le QSO est ignoré comme dans update()
+            countries = np.asarray(cols['country'])
+            rows &= (grids >= 0) | (countries < 0)
+            missing = np.flatnonzero(rows & (grids < 0))
+            call_ids = np.unique(calls[missing]).tolist()
+            found = self.cty.callsign_lookups(strings['call'][i] for i in call_ids)
+            positions = {}
+            for call_id in call_ids:
+                entry = found[strings['call'][call_id]]
+                if entry.lat is not None:
+                    positions[call_id] = (entry.lat, -entry.lon)
+            for i in missing.tolist():
+                if int(calls[i]) in positions:
+                    lats[i], lons[i] = positions[int(calls[i])]
+                else:
+                    rows[i] = False
+        rows = np.flatnonzero(rows)
+        first_rank = self.contacts_with_locators + 1
+        self.contacts_with_locators += len(rows)
+        # Distances depuis la station de chaque QSO : par locator (cache partagé),
+        # position cty.dat : calcul direct en un lot, une origine par QSO
+        cache = distance_cache.shared_cache()
+        distances, _ = cache.lookup_rows(table, self.my_locator, rows)
+        no_grid = grids[rows] < 0
+        home_lats, home_lons = distance_cache.home_positions(table, self.my_locator, rows[no_grid])
+        distances[no_grid] = geodesy.distances_km(home_lats, home_lons,
+                                                  lats[rows[no_grid]], lons[rows[no_grid]])
+
+        # Meilleur QSO de chaque indicatif : le plus éloigné, le premier en cas d'égalité
+        order = np.lexsort((rows, -distances, calls[rows]))
+        sorted_calls = calls[rows][order]
+        best = order
+        if sorted_calls.size:
+            first = np.ones(sorted_calls.size, dtype=bool)
+            first[1:] = sorted_calls[1:] != sorted_calls[:-1]
+            best = order[first]
+        for i in np.sort(best).tolist():
+            self._keep_best(table, int(rows[i]), float(distances[i]), first_rank + i)
+        cache.save()
+        return self
+
+    def _keep_best(self, table, row, distance_km, rank):
+        """ Retient le QSO row de la table s'il est le plus éloigné de son indicatif. """
+        cols, strings = table.columns, table.strings
+        callsign = strings['call'][cols['call'][row]]
+        best = self.best_by_call.get(callsign)
+        if best is not None and distance_km <= best['distance_km']:
+            return
+        country_id, grid_id = cols['country'][row], cols['grid'][row]
+        if country_id >= 0:
+            country = strings['country'][country_id]
+        else:
+            country = (self.cty.callsign_lookup(callsign).country or "ND") if self.cty else "ND"
+        if grid_id >= 0:
+            locator = strings['grid'][grid_id]
+        else:
+            entry = self.cty.callsign_lookup(callsign)
+            locator = common.latlon_to_locator(entry.lat, -entry.lon, precision=6)
+        self.best_by_call[callsign] = {
             'distance_km': distance_km,
             'callsign': callsign,
-            'locator': other_locator,
-            'mode': mode,
-            'freq_mhz': freq_mhz,
-            'country': country # AJOUT DE LA DONNÉE PAYS
-        })
-
-    # --- Traitement Final ---
-
-    all_contacts_data.sort(key=lambda x: x['distance_km'], reverse=True)
-    top_dx = all_contacts_data[:top_n]
-
-    # --- Affichage ---
-    print(f"\n--- Top DX : Les {len(top_dx)} Contacts les Plus Éloignés ---")
-    print(f"Position de la station : {my_locator}")
-    print(f"Total des contacts lus : {total_contacts}")
-    print(f"Contacts avec localisateur QRA : {contacts_with_locators}\n")
-
-    # NOUVEL EN-TÊTE avec Pays/DXCC
-    header = f"{'Rang':<4} | {'Distance (km)':<15} | {'Pays/DXCC':<20} | {'Callsign':<10} | {'Locator':<8} | {'Mode':<6} | {'Fréquence (MHz)':<15}"
-    separator = "-" * len(header)
-
-    print(separator)
-    print(header)
-    print(separator)
-
-    # --- FILTRAGE DES DOUBLONS ---
-    seen_calls = set()
-    unique_dx = []
-
-    # On suppose que 'all_contacts' contient tous tes QSOs extraits
-    # On les trie d'abord par distance (du plus loin au plus proche)
-    sorted_all = sorted(all_contacts_data, key=lambda x: x['distance_km'], reverse=True)
-
-    for qso in sorted_all:
-        call = qso['callsign']
-        if call not in seen_calls:
-            seen_calls.add(call)
-            unique_dx.append(qso)
-
-        # On s'arrête quand on en a 100
-        if len(unique_dx) >= 100:
-            break
-
-    for i, item in enumerate(unique_dx, 1):
-        row = (
-            f"{i:<4} | "
-            f"{item['distance_km']:<15.2f} | "
-            f"{item['country']:<20} | "
-            f"{item['callsign']:<10} | "
-            f"{item['locator']:<8} | "
-            f"{item['mode']:<6} | "
-            f"{item['freq_mhz']:<15.3f}"
-        )
-        print(row)
-
-    print(separator)
+            'locator': locator,
+            'mode': strings['mode'][cols['mode'][row]],
+            'freq_mhz': cols['freq'][row],
+            'country': country,
+            'rank': rank,
+        }
+
+    def retained_count(self):
+        # QSO localisés (locator ou cty.dat)
+        return self.contacts_with_locators
+
+    def params(self):
+        return {'locator': self.my_locator, 'top_n': self.top_n, 'cty_dat_path': self.cty_dat_path}
+
+    def top_contacts(self):
+        """ Les top_n contacts les plus éloignés, un seul par indicatif. """
+        return heapq.nlargest(self.top_n, self.best_by_call.values(),
+                              key=lambda x: (x['distance_km'], -x['rank']))
+
+    def result(self):
+        return common.table_result(
+            f"Top DX : les {self.top_n} contacts les plus éloignés",
+            ['rank', 'distance_km', 'country', 'call', 'locator', 'mode', 'freq_mhz'],
+            ((i, item['distance_km'], item['country'], item['callsign'], item['locator'], item['mode'],
+              item['freq_mhz']) for i, item in enumerate(self.top_contacts(), 1)),
+            locator=self.my_locator, locator_valid=self.my_loc_lat is not None,
+            total_contacts=self.total_contacts, contacts_with_locators=self.contacts_with_locators)
+
+    def report(self):
+        if self.my_loc_lat is None:
+            print(f"ERREUR: Localisateur QRA '{self.my_locator}' invalide ou trop court. Le programme s'arrête.")
+            return
+
+        # --- Affichage ---
+        nb_top = min(self.top_n, self.contacts_with_locators)
+        print(f"\n--- Top DX : Les {nb_top} Contacts les Plus Éloignés ---")
+        print(f"Position de la station : {self.my_locator}")
+        print(f"Total des contacts lus : {self.total_contacts}")
+        print(f"Contacts avec localisateur QRA : {self.contacts_with_locators}\n")
+
+        # NOUVEL EN-TÊTE avec Pays/DXCC
+        header = f"{'Rang':<4} | {'Distance (km)':<15} | {'Pays/DXCC':<20} | {'Callsign':<10} | {'Locator':<8} | {'Mode':<6} | {'Fréquence (MHz)':<15}"
+        separator = "-" * len(header)
+
+        print(separator)
+        print(header)
+        print(separator)
+
+        # --- FILTRAGE DES DOUBLONS ---
+        # Un seul contact par indicatif (le plus éloigné) : on garde les top_n plus éloignés
+        unique_dx = self.top_contacts()
+
+        for i, item in enumerate(unique_dx, 1):
+            row = (
+                f"{i:<4} | "
+                f"{item['distance_km']:<15.2f} | "
+                f"{item['country']:<20} | "
+                f"{item['callsign']:<10} | "
+                f"{item['locator']:<8} | "
+                f"{item['mode']:<6} | "
+                f"{item['freq_mhz']:<15.3f}"
+            )
+            print(row)
+
+        print(separator)
+
+
+def find_top_dx(adif_records, my_locator, top_n=100, cty_dat_path=None):
+    """ Trouve les contacts DX les plus éloignés dans les enregistrements ADIF. """
+    TopDxAnalysis(my_locator, top_n=top_n, cty_dat_path=cty_dat_path).run(adif_records).report()
 
 # --- Exécution ---
 if __name__ == "__main__":
     args = common.get_args("Trouver les Contacts DX les Plus Éloignés")
     try:
-        records = common.read_file_content(args.file)
+        records = common.load_qso_logs(args.file, use_cache=args.cache, jobs=args.jobs,
+                                       fields=TopDxAnalysis.FIELDS)
         find_top_dx(records, args.locator, cty_dat_path=args.ctydat)
-    except FileNotFoundError:
-        print(f"ERREUR: Le fichier {args.file} est introuvable.")
+    except FileNotFoundError as e:
+        print(f"ERREUR: Le fichier {e.filename} est introuvable.")
     except Exception as e:
         print(f"Une erreur s'est produite lors de l'exécution: {e}")
@@ -0,0 +1,141 @@
+""" Générateur déterministe de fichiers ADIF synthétiques (pour les benchmarks).
+
+Les distributions imitent un log réel : bandes et modes pondérés (FT8 en tête),
+fréquences cohérentes avec la bande et le mode, indicatifs formés sur des
+préfixes de cty.dat avec un locator proche du pays, SNR pour les modes
+numériques, RST pour la phonie et la CW, activité plus forte le soir.
+"""
+import random
+import argparse
+from itertools import accumulate
+from datetime import datetime, timedelta, timezone
+from cty import load_cty
+import common
+
+# Bande -> (poids, fréquence de base en MHz pour FT8, CW, SSB)
+BAND_PLAN = {
+    '160m': (2, 1.840, 1.830, 1.850),
+    '80m': (6, 3.573, 3.530, 3.700),
+    '40m': (16, 7.074, 7.020, 7.150),
+    '30m': (8, 10.136, 10.120, 10.136),
+    '20m': (24, 14.074, 14.030, 14.200),
+    '17m': (9, 18.100, 18.080, 18.130),
+    '15m': (12, 21.074, 21.030, 21.250),
+    '12m': (5, 24.915, 24.900, 24.950),
+    '10m': (10, 28.074, 28.030, 28.500),
+    '6m': (5, 50.313, 50.090, 50.150),
+    '2m': (2, 144.174, 144.050, 144.300),
+    '70cm': (1, 432.174, 432.050, 432.200),
+}
+# Mode -> poids ; les modes numériques ont un SNR (APP_PSKREP_SNR)
+MODES = {'FT8': 60, 'FT4': 12, 'CW': 10, 'SSB': 12, 'RTTY': 3, 'JT65': 1, 'PSK31': 2}
+DIGITAL_MODES = {'FT8', 'FT4', 'RTTY', 'JT65', 'PSK31'}
+
+# Préfixes utilisés sans cty.dat : préfixe -> (pays, latitude, longitude est)
+DEFAULT_PREFIXES = {
+    'F': ('France', 46.0, 2.0), 'DL': ('Fed. Rep. of Germany', 51.0, 10.0),
+    'G': ('England', 52.8, -1.5), 'EA': ('Spain', 40.4, -3.7), 'I': ('Italy', 42.8, 12.8),
+    'ON': ('Belgium', 50.7, 4.6), 'PA': ('Netherlands', 52.3, 5.5), 'SP': ('Poland', 52.3, 19.3),
+    'UA': ('European Russia', 55.8, 37.6), 'UA9': ('Asiatic Russia', 55.0, 83.0),
+    'K': ('United States', 37.5, -91.7), 'VE': ('Canada', 44.4, -78.8),
+    'JA': ('Japan', 36.4, 138.4), 'VK': ('Australia', -23.7, 132.3), 'ZL': ('New Zealand', -41.8, 174.0),
+    'PY': ('Brazil', -10.0, -53.0), 'LU': ('Argentina', -34.8, -65.9), 'ZS': ('South Africa', -29.1, 22.0),
+    'BY': ('China', 36.0, 102.0), 'VU': ('India', 22.5, 77.6),
+}
+
+
+def prefix_table(cty_dat_path=None):
+    """Liste des (préfixe, pays, latitude, longitude est), depuis cty.dat si disponible."""
+    cty = load_cty(cty_dat_path)
+    if cty is None:
+        return [(prefix, *info) for prefix, info in sorted(DEFAULT_PREFIXES.items())]
+    # cty.dat donne la longitude positive vers l'ouest
+    return [(prefix, entry.country, entry.lat, -entry.lon)
+            for prefix, entry in sorted(cty.prefix.items())
+            if prefix.isalnum()]
+
+
+def _callsign(rng, prefix):
+    """Forme un indicatif plausible sur un préfixe (ex: F -> F4ABC)."""
+    digit = '' if prefix[-1].isdigit() else str(rng.randrange(10))
+    suffix = ''.join(rng.choice('ABCDEFGHIJKLMNOPQRSTUVWXYZ') for _ in range(rng.choice((1, 2, 3, 3))))
+    return f"{prefix}{digit}{suffix}"
+
+
+def _field(name, value):
+    return f"<{name}:{len(value)}>{value} "
+
+
+def iter_qso_records(count, seed=1, cty_dat_path=None, start=datetime(2020, 1, 1, tzinfo=timezone.utc)):
+    """Produit count enregistrements ADIF (texte, terminés par <EOR>) déterministes pour seed."""
+    rng = random.Random(seed)
+    prefixes = prefix_table(cty_dat_path)
+    # Un petit nombre de correspondants revient souvent, comme dans un vrai log
+    regulars = [(_callsign(rng, prefix), lat, lon, country)
+                for prefix, country, lat, lon in rng.choices(prefixes, k=200)]
+    bands, band_weights = list(BAND_PLAN), list(accumulate(plan[0] for plan in BAND_PLAN.values()))
+    modes, mode_weights = list(MODES), list(accumulate(MODES.values()))
+    current = start
+    for _ in range(count):
+        # Activité plus forte le soir (UTC) : pas plus courts entre 16h et 23h
+        current += timedelta(seconds=rng.expovariate(1 / (60 if 16 <= current.hour <= 23 else 240)))
+        band = rng.choices(bands, cum_weights=band_weights)[0]
+        mode = rng.choices(modes, cum_weights=mode_weights)[0]
+        _, ft8_freq, cw_freq, ssb_freq = BAND_PLAN[band]
+        if mode in DIGITAL_MODES:
+            freq = ft8_freq + rng.randrange(200, 3000) / 1e6
+        else:
+            freq = (cw_freq if mode == 'CW' else ssb_freq) + rng.randrange(0, 40) / 1e3
+
+        if rng.random() < 0.3:
+            callsign, lat, lon, country = rng.choice(regulars)
+        else:
+            prefix, country, lat, lon = rng.choice(prefixes)
+            callsign = _callsign(rng, prefix)
+
+        fields = [
+            _field('CALL', callsign),
+            _field('QSO_DATE', current.strftime('%Y%m%d')),
+            _field('TIME_ON', current.strftime('%H%M%S')),
+            _field('BAND', band),
+            _field('FREQ', f"{freq:.6f}"),
+            _field('MODE', mode),
+        ]
+        # Locator proche du pays, absent pour environ un QSO sur cinq
+        if rng.random() < 0.8:
+            grid_lat = max(-89.9, min(89.9, lat + rng.uniform(-4, 4)))
+            grid_lon = (lon + rng.uniform(-6, 6) + 180) % 360 - 180
+            precision = 6 if rng.random() < 0.3 else 4
+            grid = common.latlon_to_locator(grid_lat, grid_lon, precision=precision)
+            fields.append(_field('GRIDSQUARE', grid))
+        if mode in DIGITAL_MODES:
+            snr = max(-26, min(20, round(rng.gauss(-10, 6))))
+            fields.append(_field('APP_PSKREP_SNR', str(snr)))
+            fields.append(_field('RST_RCVD', f"{snr:+03d}"))
+        else:
+            fields.append(_field('RST_RCVD', rng.choice(('599', '579', '559')) if mode == 'CW'
+                                 else rng.choice(('59', '57', '55'))))
+        if rng.random() < 0.5:
+            fields.append(_field('COUNTRY', country))
+        yield ''.join(fields) + '<EOR>\n'
+
+
+def write_adif(path, count, seed=1, cty_dat_path=None):
+    """Écrit un fichier ADIF synthétique de count QSO ; retourne sa taille en octets."""
+    with open(path, 'w', encoding='utf-8', newline='\n') as f:
+        f.write(f"Log ADIF synthétique ({count} QSO, graine {seed})\n"
+                "<ADIF_VER:5>3.1.4 <PROGRAMID:13>generate_adif <EOH>\n")
+        for record in iter_qso_records(count, seed, cty_dat_path):
+            f.write(record)
+        return f.tell()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Générer un fichier ADIF synthétique")
+    parser.add_argument('output', help="Fichier ADIF à écrire")
+    parser.add_argument('-n', '--count', type=int, default=10000, help="Nombre de QSO (defaut: 10000)")
+    parser.add_argument('-s', '--seed', type=int, default=1, help="Graine du générateur (defaut: 1)")
+    parser.add_argument('-c', '--ctydat', help="Fichier cty.dat pour les préfixes des indicatifs")
+    args = parser.parse_args()
+    size = write_adif(args.output, args.count, args.seed, args.ctydat)
+    print(f"{args.output} : {args.count} QSO, {size} octets")
@@ -1,29 +1,66 @@
 '''Module create compass rose in ascii from adif file.'''
-import re
 import math
+import geodesy
+import distance_cache
 import common
 
-def calculate_initial_bearing(lat1, lon1, lat2, lon2):
-    '''calculate_initial_bearing function'''
-    lat1, lon1, lat2, lon2 = map(math.radians, [lat1, lon1, lat2, lon2])
-    dlon = lon2 - lon1
-    y = math.sin(dlon) * math.cos(lat2)
-    x = math.cos(lat1) * math.sin(lat2) - math.sin(lat1) * math.cos(lat2) * math.cos(dlon)
-    return (math.degrees(math.atan2(y, x)) + 360) % 360
+# Azimut d'un point à un autre ; les calculs par lots sont dans geodesy
+calculate_initial_bearing = geodesy.initial_bearing
+
+class StarRadarAnalysis(common.Analysis):
+    '''Count contacts in 16 compass sectors and draw them as a star radar'''
+
+    # Champs ADIF utilisés
+    FIELDS = frozenset(['GRIDSQUARE', 'MY_GRIDSQUARE'])
+
+    def __init__(self, my_locator, radius=12):
+        self.my_locator = my_locator
+        self.radius = radius
+        self.my_lat, self.my_lon = common.locator_to_latlon(my_locator)
+        self.sectors = [0] * 16
+
+    def update(self, qso):
+        if not qso.grid:
+            return False
+        # Azimut depuis la station du QSO (MY_GRIDSQUARE), sinon depuis my_locator
+        brng = distance_cache.shared_cache().lookup(qso.my_grid or self.my_locator, qso.grid)[1]
+        self.sectors[int(((brng + 11.25) % 360) / 22.5) % 16] += 1
+        return True
+
+    def run_table(self, table):
+        np = geodesy.numpy_module()
+        if np is None:
+            return super().run_table(table)
+        # Un azimut par couple (station, locator) distinct, lu dans le cache partagé
+        # ou calculé en un lot
+        cache = distance_cache.shared_cache()
+        _, brng = cache.lookup_rows(table, self.my_locator, np.flatnonzero(np.asarray(table.columns['grid']) >= 0))
+        counts = np.bincount(((brng + 11.25) % 360 / 22.5).astype(int) % 16, minlength=16)
+        self.sectors = [total + int(count) for total, count in zip(self.sectors, counts)]
+        cache.save()
+        return self
+
+    def retained_count(self):
+        # QSO avec locator, un par secteur
+        return sum(self.sectors)
+
+    def params(self):
+        return {'locator': self.my_locator, 'radius': self.radius}
+
+    def result(self):
+        return common.table_result("Rosace de réception", ['bearing_deg', 'contacts'],
+                                   ((i * 22.5, count) for i, count in enumerate(self.sectors)),
+                                   locator=self.my_locator, total=sum(self.sectors))
+
+    def report(self):
+        print_star_radar(self.sectors, self.my_locator, self.radius)
 
 def draw_star_radar(adif_records, my_locator, radius=12):
     '''Draw star radar function'''
-    my_lat, my_lon = common.locator_to_latlon(my_locator)
-    sectors = [0] * 16
-    re_grid = re.compile(r'(?i)<GRIDSQUARE:\d+>([A-Z]{2}\d{2})')
-
-    for record in adif_records:
-        match = re_grid.search(record)
-        if match and (other := common.locator_to_latlon(match.group(1))):
-            if other[0] is not None:
-                brng = calculate_initial_bearing(my_lat, my_lon, other[0], other[1])
-                sectors[int(((brng + 11.25) % 360) / 22.5) % 16] += 1
+    StarRadarAnalysis(my_locator, radius).run(adif_records).report()
 
+def print_star_radar(sectors, my_locator, radius=12):
+    '''Print star radar from the 16 sector counts'''
     max_val = max(sectors) if max(sectors) > 0 else 1
     size = radius * 2 + 3
     grid = [[" " for _ in range(size)] for _ in range(size)]
@@ -61,6 +98,6 @@ def draw_star_radar(adif_records, my_locator, radius=12):
 
 if __name__ == "__main__":
     args = common.get_args()
-    with open(args.file, "r", encoding="ascii") as f:
-        records = re.split(r'(?i)<EOR>', f.read())
+    records = common.load_qso_logs(args.file, use_cache=args.cache, jobs=args.jobs,
+                                   fields=StarRadarAnalysis.FIELDS)
     draw_star_radar(records, args.locator)
@@ -0,0 +1,103 @@
+""" Distances orthodromiques et azimuts, point par point ou par lots.
+
+Les fonctions par lots prennent une origine et des séquences de latitudes et
+longitudes (listes, colonnes array d'une QSOTable, tableaux NumPy) et font le
+calcul en un seul passage NumPy. L'origine est un point, ou une séquence de
+points de même longueur (une origine par ligne : locator de la station de
+chaque QSO, voir QSO.my_grid). Sans NumPy, elles retombent sur une boucle
+Python et retournent des listes ; numpy_module() indique lequel est utilisé.
+NumPy est importé au premier calcul par lots, pour ne pas ralentir le démarrage.
+"""
+import math
+from functools import lru_cache
+
+# Rayon moyen de la Terre en kilomètres
+EARTH_RADIUS_KM = 6371
+
+
+@lru_cache(maxsize=None)
+def numpy_module():
+    """Module numpy, importé au premier appel ; None s'il n'est pas installé."""
+    try:
+        import numpy  # pylint: disable=import-outside-toplevel
+    except ImportError:
+        return None
+    return numpy
+
+
+def haversine_distance(lat1, lon1, lat2, lon2):
+    """Calcule la distance en km entre deux points Lat/Lon (Formule Haversine)"""
+    lat1_rad, lon1_rad = math.radians(lat1), math.radians(lon1)
+    lat2_rad, lon2_rad = math.radians(lat2), math.radians(lon2)
+
+    dlon = lon2_rad - lon1_rad
+    dlat = lat2_rad - lat1_rad
+
+    a = math.sin(dlat / 2)**2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(dlon / 2)**2
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+    return EARTH_RADIUS_KM * c
+
+
+def initial_bearing(lat1, lon1, lat2, lon2):
+    """Azimut initial (degrés, 0 = nord, sens horaire) du point 1 vers le point 2."""
+    lat1, lon1, lat2, lon2 = map(math.radians, [lat1, lon1, lat2, lon2])
+    dlon = lon2 - lon1
+    y = math.sin(dlon) * math.cos(lat2)
+    x = math.cos(lat1) * math.sin(lat2) - math.sin(lat1) * math.cos(lat2) * math.cos(dlon)
+    return (math.degrees(math.atan2(y, x)) + 360) % 360
+
+
+def _pairs(lat, lon, lats, lons):
+    """Couples (origine, point) du calcul sans NumPy : origine fixe ou une par point."""
+    if isinstance(lat, (int, float)):
+        return ((lat, lon, lat2, lon2) for lat2, lon2 in zip(lats, lons))
+    return zip(lat, lon, lats, lons)
+
+
+def _origin(np, lat, lon):
+    """Origine en radians : (lat, lon, cos lat, sin lat), scalaires ou tableaux NumPy."""
+    if np.ndim(lat) == 0:
+        lat1, lon1 = math.radians(lat), math.radians(lon)
+        return lat1, lon1, math.cos(lat1), math.sin(lat1)
+    lat1 = np.radians(np.asarray(lat, dtype=float))
+    return lat1, np.radians(np.asarray(lon, dtype=float)), np.cos(lat1), np.sin(lat1)
+
+
+def distances_km(lat, lon, lats, lons):
+    """Distances (km) de l'origine (lat, lon) vers chaque point (lats[i], lons[i]).
+
+    Retourne un tableau NumPy, ou une liste sans NumPy ; les points sans
+    position (NaN) donnent NaN.
+    """
+    np = numpy_module()
+    if np is None:
+        return [haversine_distance(*pair) for pair in _pairs(lat, lon, lats, lons)]
+
+    lat1, lon1, cos_lat1, _ = _origin(np, lat, lon)
+    lat2 = np.radians(np.asarray(lats, dtype=float))
+    dlon = np.radians(np.asarray(lons, dtype=float)) - lon1
+
+    a = np.sin((lat2 - lat1) / 2)**2 + cos_lat1 * np.cos(lat2) * np.sin(dlon / 2)**2
+    return EARTH_RADIUS_KM * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+def bearings_deg(lat, lon, lats, lons):
+    """Azimuts initiaux (degrés) de l'origine (lat, lon) vers chaque point (voir distances_km)."""
+    np = numpy_module()
+    if np is None:
+        return [initial_bearing(*pair) for pair in _pairs(lat, lon, lats, lons)]
+
+    _, lon1, cos_lat1, sin_lat1 = _origin(np, lat, lon)
+    lat2 = np.radians(np.asarray(lats, dtype=float))
+    dlon = np.radians(np.asarray(lons, dtype=float)) - lon1
+    cos_lat2 = np.cos(lat2)
+
+    y = np.sin(dlon) * cos_lat2
+    x = cos_lat1 * np.sin(lat2) - sin_lat1 * cos_lat2 * np.cos(dlon)
+    return (np.degrees(np.arctan2(y, x)) + 360) % 360
+
+
+def distances_bearings(lat, lon, lats, lons):
+    """Distances (km) et azimuts initiaux (degrés) de l'origine vers chaque point, en un seul appel."""
+    return distances_km(lat, lon, lats, lons), bearings_deg(lat, lon, lats, lons)
@@ -0,0 +1,145 @@
+""" Localisateurs QRA (Maidenhead) : conversions avec la latitude et la longitude.
+
+Le centre des 32 400 carrés (4 caractères, ex: JN33) est précalculé dans une
+table construite au premier appel : décoder un carré est une simple lecture de
+dictionnaire. Les sous-carrés (6 caractères, ex: JN33AB) passent par un cache
+LRU. latlon_to_locators et locators_to_latlon traitent des séquences entières
+(en un seul passage NumPy si NumPy est installé, voir geodesy.numpy_module).
+"""
+from functools import lru_cache
+import geodesy
+
+# Lettres des champs (20° x 10°) et des sous-carrés (5' x 2,5')
+FIELD_LETTERS = 'ABCDEFGHIJKLMNOPQR'
+SUBSQUARE_LETTERS = 'ABCDEFGHIJKLMNOPQRSTUVWX'
+# Nombre de carrés de 4 caractères (18 x 18 champs de 10 x 10 carrés)
+SQUARE_COUNT = 32400
+# Nombre de sous-carrés (6 caractères) gardés dans le cache LRU
+SUBSQUARE_CACHE_SIZE = 1 << 16
+
+
+def _square_origin(locator):
+    """Coin sud-ouest (lat, lon) du carré des 4 premiers caractères (ValueError si invalide)."""
+    lon = (ord(locator[0]) - ord('A')) * 20 - 180
+    lat = (ord(locator[1]) - ord('A')) * 10 - 90
+    lon += (int(locator[2])) * 2
+    lat += (int(locator[3])) * 1
+    return lat, lon
+
+
+@lru_cache(maxsize=None)
+def square_names():
+    """Noms des 32 400 carrés, dans l'ordre de leur index (voir square_index)."""
+    return [f"{lon_field}{lat_field}{lon_square}{lat_square}"
+            for lon_field in FIELD_LETTERS for lat_field in FIELD_LETTERS
+            for lon_square in '0123456789' for lat_square in '0123456789']
+
+
+@lru_cache(maxsize=None)
+def square_table():
+    """Table {carré (4 caractères): (lat, lon) de son centre}, construite au premier appel."""
+    table = {}
+    for name in square_names():
+        lat, lon = _square_origin(name)
+        table[name] = (lat + 0.5, lon + 1.0)
+    return table
+
+
+@lru_cache(maxsize=SUBSQUARE_CACHE_SIZE)
+def _subsquare_center(locator):
+    """Centre (lat, lon) d'un sous-carré (6 caractères ou plus, en majuscules)."""
+    lat, lon = _square_origin(locator)
+    lon += (ord(locator[4]) - ord('A')) * (2/24) + (1/24)
+    lat += (ord(locator[5]) - ord('A')) * (1/24) + (0.5/24)
+    return lat, lon
+
+
+def locator_to_latlon(locator):
+    """Convertit un localisateur QRA (4 ou 6 chars) en (Latitude, Longitude)"""
+    center = square_table().get(locator)
+    if center is not None:
+        return center
+    locator = locator.upper().strip()
+    if len(locator) < 4:
+        return None, None
+    if len(locator) >= 6:
+        return _subsquare_center(locator)
+    center = square_table().get(locator)
+    if center is not None:
+        return center
+    # Carré hors table (caractères hors A-R) : calculé comme les autres
+    lat, lon = _square_origin(locator)
+    return lat + 0.5, lon + 1.0
+
+
+def locators_to_latlon(locators):
+    """Centres (latitudes, longitudes) d'une séquence de localisateurs (NaN si absent ou invalide).
+
+    Retourne deux tableaux NumPy, ou deux listes sans NumPy.
+    """
+    lats, lons = [], []
+    nan = float('nan')
+    for locator in locators:
+        try:
+            lat, lon = locator_to_latlon(locator) if locator else (None, None)
+        except ValueError:
+            lat = lon = None
+        lats.append(nan if lat is None else lat)
+        lons.append(nan if lon is None else lon)
+    np = geodesy.numpy_module()
+    if np is None:
+        return lats, lons
+    return np.array(lats), np.array(lons)
+
+
+def _indexes(lat, lon):
+    """Index du champ, du carré et du sous-carré (en longitude, puis latitude) d'un point."""
+    # Décalage en 0-360 pour la longitude, 0-180 pour la latitude ; les pôles et
+    # l'antiméridien est restent dans le dernier champ
+    lat = min(max(lat + 90, 0.0), 179.999999)
+    lon = min(max(lon + 180, 0.0), 359.999999)
+    return (int(lon / 20), int(lat / 10), int(lon % 20 / 2), int(lat % 10),
+            int(lon % 2 * 12), int(lat % 1 * 24))
+
+
+def latlon_to_locator(lat, lon, precision=4):
+    """
+    Convert latitude/longitude to Maidenhead locator.
+
+    Args:
+    lat (float): Latitude in degrees (-90 to 90).
+    lon (float): Longitude in degrees (-180 to 180).
+    precision (int): 2 for 2-char (field), 4 for 4-char (square), 6 for 6-char (subsquare), etc.
+
+    Returns:
+    str: Maidenhead locator string.
+    """
+    field_lon, field_lat, square_lon, square_lat, sub_lon, sub_lat = _indexes(lat, lon)
+    locator = f"{FIELD_LETTERS[field_lon]}{FIELD_LETTERS[field_lat]}{square_lon}{square_lat}"
+    if precision <= 4:
+        return locator[:precision]
+    # Sous-carré (5' de longitude x 2,5' de latitude, a-x)
+    return (locator + SUBSQUARE_LETTERS[sub_lon].lower() + SUBSQUARE_LETTERS[sub_lat].lower())[:precision]
+
+
+def latlon_to_locators(lats, lons, precision=4):
+    """Localisateurs d'une séquence de points (voir latlon_to_locator) ; retourne une liste.
+
+    Avec NumPy, les index sont calculés en un seul passage et les noms lus
+    dans la table des carrés.
+    """
+    np = geodesy.numpy_module()
+    if np is None:
+        return [latlon_to_locator(lat, lon, precision) for lat, lon in zip(lats, lons)]
+
+    lat = np.clip(np.asarray(lats, dtype=float) + 90, 0.0, 179.999999)
+    lon = np.clip(np.asarray(lons, dtype=float) + 180, 0.0, 359.999999)
+    squares = ((((lon // 20) * 18 + lat // 10) * 10 + lon % 20 // 2) * 10 + lat % 10 // 1).astype(np.int64)
+    names = square_names()
+    locators = [names[i][:precision] for i in squares.tolist()]
+    if precision <= 4:
+        return locators
+    subsquares = ((lon % 2 * 12) // 1 * 24 + (lat % 1 * 24) // 1).astype(np.int64)
+    letters = SUBSQUARE_LETTERS.lower()
+    return [(locator + letters[i // 24] + letters[i % 24])[:precision]
+            for locator, i in zip(locators, subsquares.tolist())]
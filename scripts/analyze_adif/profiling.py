@@ -0,0 +1,98 @@
+""" Profilage du rapport : temps, QSO traités ou ignorés et pic mémoire de chaque étape. """
+import sys
+import json
+import time
+import cProfile
+import tracemalloc
+
+
+def run_counted(analysis, adif_records):
+    """Exécute une analyse seule ; retourne (QSO traités, QSO ignorés).
+
+    Les QSO ignorés sont ceux que le compteur de l'analyse ne retient pas
+    (voir Analysis.retained_count) : le décompte est le même que les QSO
+    soient lus un par un, par lots sur une QSOTable ou en agrégats SQL. Il
+    vaut None pour une analyse sans compteur.
+    """
+    retained = analysis.retained_count()
+    analysis.run(adif_records)
+    processed = len(adif_records)
+    if retained is None:
+        return processed, None
+    return processed, processed - (analysis.retained_count() - retained)
+
+
+class Profiler:
+    """ Mesure les étapes du rapport (chargement, puis chaque analyse exécutée seule).
+
+        Le suivi mémoire (tracemalloc) est actif du début à la fin du bloc with :
+        il ralentit l'exécution, les temps sont donc à comparer entre eux.
+    """
+
+    def __init__(self, cprofile_name=None):
+        # Analyse à profiler en détail avec cProfile (fichier <nom>.pstats)
+        self.cprofile_name = cprofile_name
+        self.steps = []
+
+    def __enter__(self):
+        tracemalloc.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        tracemalloc.stop()
+
+    def measure(self, name, func, *args):
+        """Exécute func(*args) comme étape name ; retourne (résultat, mesures de l'étape)."""
+        tracemalloc.reset_peak()
+        start_memory = tracemalloc.get_traced_memory()[0]
+        start_wall, start_cpu = time.perf_counter(), time.process_time()
+        result = func(*args)
+        step = {
+            'name': name,
+            'wall_s': time.perf_counter() - start_wall,
+            'cpu_s': time.process_time() - start_cpu,
+            'processed': None,
+            'skipped': None,
+            'peak_kb': (tracemalloc.get_traced_memory()[1] - start_memory) / 1024,
+        }
+        self.steps.append(step)
+        return result, step
+
+    def run_analyses(self, named_analyses, adif_records):
+        """Exécute les analyses (nom, analyse) une par une en mesurant chacune ; retourne les analyses."""
+        for name, analysis in named_analyses:
+            if name == self.cprofile_name:
+                profiler = cProfile.Profile()
+                counts, step = self.measure(name, profiler.runcall, run_counted, analysis, adif_records)
+                profiler.dump_stats(f"{name}.pstats")
+                print(f"Profil cProfile de '{name}' écrit dans {name}.pstats (python -m pstats {name}.pstats)",
+                      file=sys.stderr)
+            else:
+                counts, step = self.measure(name, run_counted, analysis, adif_records)
+            step['processed'], step['skipped'] = counts
+        return [analysis for _, analysis in named_analyses]
+
+    def report(self):
+        """Affiche le tableau récapitulatif des étapes sur stderr, pour ne pas se mêler au rapport."""
+        header = (f"{'Étape':<12} | {'Réel (s)':>9} | {'CPU (s)':>9} | {'QSO traités':>11} | "
+                  f"{'QSO ignorés':>11} | {'Pic mémoire (Ko)':>16}")
+        separator = "-" * len(header)
+
+        print("\n--- Profil du Rapport ---", file=sys.stderr)
+        print(separator, file=sys.stderr)
+        print(header, file=sys.stderr)
+        print(separator, file=sys.stderr)
+        for step in self.steps:
+            processed = '-' if step['processed'] is None else step['processed']
+            skipped = '-' if step['skipped'] is None else step['skipped']
+            print(f"{step['name']:<12} | {step['wall_s']:>9.3f} | {step['cpu_s']:>9.3f} | {processed:>11} | "
+                  f"{skipped:>11} | {step['peak_kb']:>16.1f}", file=sys.stderr)
+        print(separator, file=sys.stderr)
+        print(f"{'TOTAL':<12} | {sum(step['wall_s'] for step in self.steps):>9.3f} | "
+              f"{sum(step['cpu_s'] for step in self.steps):>9.3f} |", file=sys.stderr)
+        print(separator, file=sys.stderr)
+
+    def write_json(self, path):
+        """Écrit les mesures des étapes dans un fichier JSON."""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'steps': self.steps}, f, indent=2, ensure_ascii=False)
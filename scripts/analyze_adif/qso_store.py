@@ -0,0 +1,168 @@
+""" Stockage des QSO dans une base SQLite locale, indexée pour les analyses.
+
+La base est alimentée de façon incrémentale : seuls les octets ajoutés aux
+fichiers ADIF depuis la dernière synchronisation sont lus. Les doublons
+(même clé que common.qso_key, dans un fichier ou entre fichiers) sont
+ignorés à l'insertion, comme par common.load_qso_logs.
+"""
+import os
+import sqlite3
+import common
+
+# Suffixe de la base créée à côté du premier fichier ADIF (ex: f4lno.adif.sqlite)
+STORE_SUFFIX = '.sqlite'
+# Version du schéma (PRAGMA user_version) : à incrémenter quand il change
+SCHEMA_VERSION = 4
+
+# Colonnes de la table qso qui forment un QSO (weekday en est dérivée)
+QSO_COLUMNS = ', '.join(common.QSO._fields)
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS qso (
+    call TEXT, freq REAL, band TEXT, mode TEXT, time INTEGER,
+    lat REAL, lon REAL, grid TEXT, snr REAL, country TEXT, my_grid TEXT,
+    day INTEGER, hour INTEGER, weekday INTEGER
+);
+CREATE UNIQUE INDEX IF NOT EXISTS qso_key
+    ON qso (upper(coalesce(call, '')), time / 60, coalesce(band, ''), upper(coalesce(mode, '')));
+CREATE INDEX IF NOT EXISTS qso_day ON qso (day);
+CREATE INDEX IF NOT EXISTS qso_band ON qso (band);
+CREATE INDEX IF NOT EXISTS qso_mode ON qso (mode);
+CREATE INDEX IF NOT EXISTS qso_grid ON qso (grid);
+CREATE INDEX IF NOT EXISTS qso_call ON qso (call);
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY, offset INTEGER, head_check TEXT, tail_check TEXT
+);
+PRAGMA user_version = {SCHEMA_VERSION};
+"""
+
+
+def _qso_row(qso):
+    """Ligne de la table qso : champs du QSO et jour de la semaine (0 = lundi)."""
+    # Le 1er janvier 1970 (jour 0 de l'epoch) était un jeudi (3)
+    return (*qso, None if qso.day is None else (qso.day + 3) % 7)
+
+
+class QSOStore:
+    """ Base SQLite des QSO, avec un filtre optionnel (bande, mode, période)
+        appliqué à toutes les requêtes.
+
+        Les analyses l'utilisent via Analysis.run_store : select() fournit
+        les agrégats SQL, l'itération fournit les QSO un par un.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path)
+        if self.conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            self.conn.executescript("DROP TABLE IF EXISTS qso; DROP TABLE IF EXISTS files;")
+        self.conn.executescript(SCHEMA)
+        self.filter_sql = []
+        self.filter_params = []
+
+    def close(self):
+        """Ferme la base."""
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def sync(self, file_paths):
+        """Ajoute les QSO écrits dans les fichiers ADIF depuis la dernière synchronisation.
+
+        Si un fichier a été réécrit (et non seulement complété) ou si la liste
+        des fichiers a changé, la base est reconstruite. Retourne le nombre de
+        QSO lus (doublons compris).
+        """
+        paths = [os.path.abspath(path) for path in file_paths]
+        files = {path: (offset, checks) for path, offset, *checks
+                 in self.conn.execute("SELECT path, offset, head_check, tail_check FROM files")}
+        if not set(files) <= set(paths) or any(
+                os.path.getsize(path) < files[path][0]
+                or common.append_checks(path, files[path][0]) != tuple(files[path][1])
+                for path in files if path in paths):
+            self.conn.execute("DELETE FROM qso")
+            self.conn.execute("DELETE FROM files")
+            files = {}
+
+        new_qsos = 0
+        with self.conn:
+            for path in paths:
+                offset = files.get(path, (0,))[0]
+                rows = []
+                for record, end in common.iter_adif_tail(path, offset, wanted=common.QSO_FIELDS):
+                    rows.append(_qso_row(common.record_to_qso(record)))
+                    offset = end
+                self.conn.executemany(
+                    "INSERT OR IGNORE INTO qso VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    rows)
+                self.conn.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)",
+                                  (path, offset, *common.append_checks(path, offset)))
+                new_qsos += len(rows)
+        return new_qsos
+
+    def set_filter(self, band=None, mode=None, since=None, until=None):
+        """Restreint les requêtes à une bande, un mode et une période (dates AAAAMMJJ incluses)."""
+        self.filter_sql = []
+        self.filter_params = []
+        if band:
+            self.filter_sql.append("band = ?")
+            self.filter_params.append(band)
+        if mode:
+            self.filter_sql.append("upper(mode) = upper(?)")
+            self.filter_params.append(mode)
+        if since:
+            self.filter_sql.append("day >= ?")
+            self.filter_params.append(common.parse_date(since) // 86400)
+        if until:
+            self.filter_sql.append("day <= ?")
+            self.filter_params.append(common.parse_date(until) // 86400)
+
+    def _where(self, where=None):
+        """Clause WHERE combinant le filtre et la condition where."""
+        conditions = self.filter_sql + ([where] if where else [])
+        if not conditions:
+            return ""
+        return " WHERE " + " AND ".join(f"({condition})" for condition in conditions)
+
+    def select(self, columns, where=None, group_by=None):
+        """Exécute SELECT columns sur les QSO filtrés ; retourne un curseur.
+
+        Les groupes sont produits dans l'ordre de leur premier QSO, comme les
+        dictionnaires remplis par Analysis.update.
+        """
+        sql = f"SELECT {columns} FROM qso" + self._where(where)
+        if group_by:
+            sql += f" GROUP BY {group_by} ORDER BY MIN(rowid)"
+        else:
+            sql += " ORDER BY rowid"
+        return self.conn.execute(sql, self.filter_params)
+
+    def count(self, where=None):
+        """Nombre de QSO filtrés (et vérifiant where)."""
+        sql = "SELECT COUNT(*) FROM qso" + self._where(where)
+        return self.conn.execute(sql, self.filter_params).fetchone()[0]
+
+    def __len__(self):
+        return self.count()
+
+    def __iter__(self):
+        return map(common.QSO._make, self.select(QSO_COLUMNS))
+
+
+def open_store(file_paths, db_path=None):
+    """Ouvre (ou crée) la base des fichiers ADIF et la synchronise.
+
+    Par défaut, la base est écrite à côté du premier fichier (<fichier>.sqlite).
+    Retourne (store, nombre de QSO lus).
+    """
+    files = common.list_adif_files(file_paths)
+    store = QSOStore(db_path or files[0] + STORE_SUFFIX)
+    try:
+        return store, store.sync(files)
+    except BaseException:
+        store.close()
+        raise
@@ -0,0 +1,95 @@
+""" Rendu des résultats du rapport (texte, JSON ou CSV) et cache des rendus.
+
+Chaque analyse fournit un résultat structuré (Analysis.result : titre,
+valeurs de synthèse, colonnes et lignes) ; le texte reste celui de report().
+Le cache associe au rendu d'un rapport une clé formée des fichiers ADIF
+(chemin, taille, date), de cty.dat, du format et des paramètres des analyses :
+un rapport déjà calculé sur des fichiers inchangés est réaffiché sans relire
+ni réanalyser les QSO.
+"""
+import io
+import csv
+import json
+import os
+import hashlib
+from datetime import datetime
+from contextlib import redirect_stdout
+import common
+
+# Formats de sortie du rapport
+FORMATS = ('text', 'json', 'csv')
+# Suffixe du cache des rendus, écrit à côté du premier fichier ADIF (ex: f4lno.adif.results)
+RESULTS_SUFFIX = '.results'
+# Version du format du cache : à incrémenter quand les résultats des analyses changent
+RESULTS_VERSION = 5
+# Nombre maximal de rendus conservés (les plus anciens sont oubliés)
+MAX_CACHED_RESULTS = 32
+
+
+def _json_default(value):
+    """Conversion JSON des valeurs non standard des résultats (dates en ISO 8601)."""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"valeur non convertible en JSON : {value!r}")
+
+
+def render(named_analyses, fmt='text'):
+    """Rendu des analyses (nom, analyse) exécutées, dans le format fmt ; retourne le texte."""
+    if fmt == 'text':
+        output = io.StringIO()
+        with redirect_stdout(output):
+            for _, analysis in named_analyses:
+                analysis.report()
+        return output.getvalue()
+    if fmt == 'json':
+        return json.dumps({name: analysis.result() for name, analysis in named_analyses},
+                          indent=2, ensure_ascii=False, default=_json_default) + "\n"
+    # CSV : une section par analyse (en-tête, lignes) séparée par une ligne vide
+    output = io.StringIO()
+    writer = csv.writer(output, lineterminator="\n")
+    for name, analysis in named_analyses:
+        result = analysis.result()
+        writer.writerow(['analysis', *result['columns']])
+        writer.writerows([name, *(value.isoformat() if isinstance(value, datetime) else value
+                                  for value in row)] for row in result['rows'])
+        writer.writerow([])
+    return output.getvalue()
+
+
+def result_key(file_paths, cty_dat_path, fmt, named_analyses, extra=()):
+    """Clé du rendu d'un rapport : fichiers, cty.dat, format, paramètres des analyses et extra."""
+    cty_key = common.file_key(cty_dat_path) if cty_dat_path and os.path.exists(cty_dat_path) else None
+    key = (
+        [common.file_key(path) for path in file_paths],
+        cty_key,
+        fmt,
+        [(name, sorted(analysis.params().items())) for name, analysis in named_analyses],
+        tuple(extra),
+    )
+    return hashlib.blake2b(repr(key).encode('utf-8'), digest_size=20).hexdigest()
+
+
+class ResultCache:
+    """ Cache des rendus de rapports, picklé dans <premier fichier>.results.
+
+        Les rendus sont conservés dans l'ordre de leur enregistrement,
+        dans la limite de MAX_CACHED_RESULTS.
+    """
+
+    def __init__(self, file_paths, max_entries=MAX_CACHED_RESULTS):
+        self.path = file_paths[0] + RESULTS_SUFFIX
+        self.max_entries = max_entries
+        cached = common.load_pickle(self.path, RESULTS_VERSION)
+        self.entries = cached['entries'] if cached else {}
+
+    def get(self, key):
+        """Rendu associé à key, ou None."""
+        return self.entries.get(key)
+
+    def put(self, key, output):
+        """Enregistre le rendu de key et réécrit le cache."""
+        self.entries.pop(key, None)
+        self.entries[key] = output
+        while len(self.entries) > self.max_entries:
+            del self.entries[next(iter(self.entries))]
+        common.save_pickle(self.path, {'version': RESULTS_VERSION, 'entries': self.entries})
@@ -0,0 +1,87 @@
+""" Analyses en parallèle sur les colonnes d'une QSOTable en mémoire partagée.
+
+Les colonnes (module array) sont copiées une fois dans des blocs
+multiprocessing.shared_memory ; chaque processus de travail les lit sans
+copie et n'en renvoie que l'état accumulé de son analyse.
+"""
+from array import array
+from contextlib import contextmanager
+from itertools import repeat
+import common
+
+
+def share_qso_table(table):
+    """Copie les colonnes d'une QSOTable dans des blocs multiprocessing.shared_memory.
+
+    Retourne (blocs, descripteur) : le descripteur, picklable, permet aux
+    autres processus de lire la table sans la recopier (voir attached_qso_table).
+    Les blocs sont à fermer puis supprimer (close, unlink) par l'appelant.
+    """
+    from multiprocessing import shared_memory  # pylint: disable=import-outside-toplevel
+    blocks = []
+    columns = {}
+    try:
+        for name, column in table.columns.items():
+            data = memoryview(column).cast('B')
+            block = shared_memory.SharedMemory(create=True, size=max(len(data), 1))
+            blocks.append(block)
+            block.buf[:len(data)] = data
+            columns[name] = (block.name, column.typecode, len(column))
+    except BaseException:
+        release_shared_blocks(blocks)
+        raise
+    return blocks, {'columns': columns, 'strings': table.strings}
+
+
+def release_shared_blocks(blocks):
+    """Ferme et supprime des blocs de mémoire partagée créés par share_qso_table."""
+    for block in blocks:
+        block.close()
+        block.unlink()
+
+
+@contextmanager
+def attached_qso_table(descriptor):
+    """Donne accès, le temps du bloc with, à une QSOTable partagée par share_qso_table."""
+    from multiprocessing import shared_memory  # pylint: disable=import-outside-toplevel
+    blocks = []
+    views = {}
+    try:
+        for name, (block_name, typecode, length) in descriptor['columns'].items():
+            block = shared_memory.SharedMemory(name=block_name)
+            blocks.append(block)
+            views[name] = block.buf[:length * array(typecode).itemsize].cast(typecode)
+        table = common.QSOTable.__new__(common.QSOTable)
+        table.__setstate__({'columns': views, 'strings': descriptor['strings']})
+        yield table
+    finally:
+        # Les vues doivent être libérées avant de fermer les blocs
+        for view in views.values():
+            view.release()
+        for block in blocks:
+            block.close()
+
+
+def _run_shared_analysis(analysis, descriptor):
+    """Exécute une analyse dans un processus de travail ; retourne son état accumulé."""
+    with attached_qso_table(descriptor) as table:
+        return analysis.run(table)
+
+
+def run_analyses_parallel(analyses, adif_records, jobs=1):
+    """Exécute des analyses indépendantes en parallèle sur jobs processus ; retourne les analyses.
+
+    Les colonnes de la QSOTable sont placées en mémoire partagée, chaque
+    analyse est exécutée par un processus, puis son état est renvoyé : les
+    analyses retournées (dans l'ordre d'origine) sont des copies prêtes pour
+    report(). Hors QSOTable ou avec un seul processus, voir common.run_analyses.
+    """
+    if jobs < 2 or len(analyses) < 2 or not isinstance(adif_records, common.QSOTable):
+        return common.run_analyses(analyses, adif_records)
+    from concurrent.futures import ProcessPoolExecutor  # pylint: disable=import-outside-toplevel
+    blocks, descriptor = share_qso_table(adif_records)
+    try:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(analyses))) as pool:
+            return list(pool.map(_run_shared_analysis, analyses, repeat(descriptor)))
+    finally:
+        release_shared_blocks(blocks)
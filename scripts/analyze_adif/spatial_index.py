@@ -0,0 +1,135 @@
+""" Index spatial des locators contactés : plus proches voisins et recherche par rayon.
+
+Les points sont placés sur la sphère unité (vecteurs x, y, z) et rangés dans un
+arbre k-d : la distance en ligne droite (corde) varie comme la distance sur le
+grand cercle, une requête visite donc O(log n) nœuds au lieu de tous les QSO.
+L'index d'une QSOTable ne contient qu'un point par locator distinct (celui de
+son premier QSO) : il est construit une fois et sert à toutes les requêtes.
+"""
+import math
+import heapq
+import geodesy
+
+
+def unit_vector(lat, lon):
+    """Vecteur unitaire (x, y, z) d'un point de latitude/longitude en degrés."""
+    lat, lon = math.radians(lat), math.radians(lon)
+    return (math.cos(lat) * math.cos(lon), math.cos(lat) * math.sin(lon), math.sin(lat))
+
+
+def chord_length(distance_km):
+    """Longueur de la corde (sphère unité) d'un arc de distance_km sur le grand cercle."""
+    return 2 * math.sin(min(distance_km / geodesy.EARTH_RADIUS_KM, math.pi) / 2)
+
+
+class GridIndex:
+    """ Arbre k-d de points (lat, lon, valeur) sur la sphère unité.
+
+        Les résultats sont triés par distance croissante ; à distance égale,
+        le point ajouté en premier passe devant (comme une recherche linéaire).
+    """
+
+    def __init__(self, points):
+        # points : itérable de (lat, lon, valeur) ; le rang d'un point est sa position
+        self.points = list(points)
+        self.vectors = [unit_vector(lat, lon) for lat, lon, _ in self.points]
+        # Nœud : (rang du point, axe, sous-arbre gauche, sous-arbre droit), ou None
+        self.root = self._build(list(range(len(self.points))))
+
+    @classmethod
+    def from_table(cls, table, rows=None):
+        """Index des locators de la QSOTable table (restreinte aux lignes rows si fourni).
+
+        La valeur d'un point est la ligne du premier QSO de son locator.
+        """
+        grids, lats, lons = table.columns['grid'], table.columns['lat'], table.columns['lon']
+        np = geodesy.numpy_module()
+        if np is not None:
+            rows = np.arange(len(table)) if rows is None else np.asarray(rows)
+            rows = rows[np.asarray(grids)[rows] >= 0]
+            _, firsts = np.unique(np.asarray(grids)[rows], return_index=True)
+            first_rows = rows[np.sort(firsts)].tolist()
+        else:
+            first_by_grid = {}
+            for row in range(len(table)) if rows is None else rows:
+                if grids[row] >= 0:
+                    first_by_grid.setdefault(grids[row], row)
+            first_rows = sorted(first_by_grid.values())
+        return cls((lats[row], lons[row], row) for row in first_rows)
+
+    def __len__(self):
+        return len(self.points)
+
+    def _build(self, ranks):
+        """Construit le sous-arbre des points ranks, coupé à la médiane de l'axe le plus étendu."""
+        if not ranks:
+            return None
+        vectors = self.vectors
+        axis = max(range(3), key=lambda a: (max(vectors[r][a] for r in ranks)
+                                             - min(vectors[r][a] for r in ranks)))
+        ranks.sort(key=lambda r: vectors[r][axis])
+        middle = len(ranks) // 2
+        return ranks[middle], axis, self._build(ranks[:middle]), self._build(ranks[middle + 1:])
+
+    def _result(self, lat, lon, ranks):
+        """Liste (distance km, valeur) des points ranks, triée par distance du grand cercle puis par rang.
+
+        Le tri est refait sur la distance retournée : la corde et le grand cercle
+        varient ensemble, mais leurs arrondis peuvent départager différemment
+        deux points confondus (ex: longitudes 180 et -180).
+        """
+        points = self.points
+        found = sorted((geodesy.haversine_distance(points[r][0], points[r][1], lat, lon), r) for r in ranks)
+        return [(distance, points[r][2]) for distance, r in found]
+
+    def nearest(self, lat, lon, k=1):
+        """Les k points les plus proches de (lat, lon) : liste de (distance km, valeur)."""
+        if k <= 0:
+            return []
+        target = unit_vector(lat, lon)
+        vectors = self.vectors
+        # Tas des k meilleurs, le moins bon en tête : (-corde², -rang)
+        best = []
+        # Pile de (nœud, minorant de la corde² de ses points)
+        stack = [(self.root, 0.0)]
+        while stack:
+            node, bound = stack.pop()
+            # Un sous-arbre n'est visité que s'il peut contenir un point aussi proche
+            if node is None or (len(best) == k and bound > -best[0][0]):
+                continue
+            rank, axis, left, right = node
+            vector = vectors[rank]
+            key = (-sum((a - b) ** 2 for a, b in zip(vector, target)), -rank)
+            if len(best) < k:
+                heapq.heappush(best, key)
+            elif key > best[0]:
+                heapq.heapreplace(best, key)
+            diff = target[axis] - vector[axis]
+            near, far = (left, right) if diff < 0 else (right, left)
+            stack.append((far, max(bound, diff * diff)))
+            stack.append((near, bound))
+        return self._result(lat, lon, [-rank for _, rank in best])
+
+    def within(self, lat, lon, radius_km):
+        """Les points à moins de radius_km de (lat, lon) : liste de (distance km, valeur), triée."""
+        target = unit_vector(lat, lon)
+        radius = chord_length(radius_km)
+        vectors = self.vectors
+        found = []
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            if node is None:
+                continue
+            rank, axis, left, right = node
+            vector = vectors[rank]
+            chord2 = sum((a - b) ** 2 for a, b in zip(vector, target))
+            if chord2 <= radius * radius:
+                found.append(rank)
+            diff = target[axis] - vector[axis]
+            # À droite, les coordonnées sur l'axe sont >= à celle du nœud ; à gauche, <=
+            if diff >= -radius:
+                stack.append(right)
+            if diff <= radius:
+                stack.append(left)
+        return [item for item in self._result(lat, lon, found) if item[0] <= radius_km]
@@ -0,0 +1,183 @@
+""" Tests de la ligne de commande et du chargement des journaux ADIF. """
+import os
+import io
+import json
+import tempfile
+import contextlib
+import unittest
+from unittest import mock
+
+import analyze_adif
+import common
+import profiling  # pylint: disable=wrong-import-order
+import qso_store
+import results
+from analyze_adif_schedule import ScheduleAnalysis
+
+
+def adif_record(**fields):
+    """ Enregistrement ADIF des champs donnés, terminé par <EOR>. """
+    return " ".join(f"<{name}:{len(value)}>{value}" for name, value in fields.items()) + " <EOR>\n"
+
+
+# Journal avec doublons : 8 enregistrements, 5 QSO uniques
+DUPLICATED_LOG = "".join([
+    adif_record(CALL='F4ABC', QSO_DATE='20240101', TIME_ON='120000', FREQ='14.074', MODE='FT8'),
+    # Même QSO, puis même minute avec une autre casse : doublons
+    adif_record(CALL='F4ABC', QSO_DATE='20240101', TIME_ON='120000', FREQ='14.074', MODE='FT8'),
+    adif_record(CALL='f4abc', QSO_DATE='20240101', TIME_ON='120030', FREQ='14.075', MODE='ft8'),
+    # Sans mode : le second est un doublon
+    adif_record(CALL='DL1XX', QSO_DATE='20240101', TIME_ON='130000', FREQ='7.074'),
+    adif_record(CALL='DL1XX', QSO_DATE='20240101', TIME_ON='130000', FREQ='7.074'),
+    # Sans heure : jamais des doublons
+    adif_record(CALL='EA1YY', QSO_DATE='20240101', FREQ='21.074', MODE='FT8'),
+    adif_record(CALL='EA1YY', QSO_DATE='20240101', FREQ='21.074', MODE='FT8'),
+    # Autre bande : QSO distinct
+    adif_record(CALL='F4ABC', QSO_DATE='20240101', TIME_ON='120000', FREQ='7.074', MODE='FT8'),
+])
+
+
+def parse(argv):
+    """ Analyse argv avec l'analyseur de analyze_adif.py (bannière ignorée). """
+    with contextlib.redirect_stderr(io.StringIO()):
+        return common.get_args(parser=analyze_adif.build_parser(), argv=argv)
+
+
+class CommandLineTest(unittest.TestCase):
+    """ Arguments de analyze_adif.py. """
+
+    def test_file_then_analyses(self):
+        """ -f ne prend qu'un fichier : les sous-commandes qui suivent sont des analyses. """
+        args = parse(['-f', 'log.adif', 'schedule', 'snr'])
+        self.assertEqual(args.file, ['log.adif'])
+        self.assertEqual(args.analyses, ['schedule', 'snr'])
+
+    def test_repeated_file(self):
+        """ -f répété : plusieurs fichiers, fusionnés. """
+        args = parse(['-f', 'a.adif', '-f', 'b.adif', 'mode'])
+        self.assertEqual(args.file, ['a.adif', 'b.adif'])
+        self.assertEqual(args.analyses, ['mode'])
+
+    def test_default_file(self):
+        """ Sans -f : le fichier par défaut. """
+        args = parse(['schedule'])
+        self.assertEqual(args.file, [common.ADIF_FILE_PATH])
+        self.assertEqual(args.analyses, ['schedule'])
+
+    def test_unknown_analysis(self):
+        """ Une sous-commande inconnue est refusée. """
+        with contextlib.redirect_stderr(io.StringIO()), self.assertRaises(SystemExit):
+            parse(['-f', 'log.adif', 'nothing'])
+
+
+class DeduplicationTest(unittest.TestCase):
+    """ Même règle de déduplication en mémoire, en mode incrémental et dans la base SQLite. """
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.path = os.path.join(self.tmpdir.name, 'log.adif')
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write(DUPLICATED_LOG)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def load(self, paths):
+        """ QSOTable des fichiers paths, sans cache (messages ignorés). """
+        with contextlib.redirect_stderr(io.StringIO()):
+            return common.load_qso_logs(paths, use_cache=False)
+
+    def test_single_file(self):
+        """ Les doublons d'un même fichier sont ignorés. """
+        self.assertEqual(len(self.load([self.path])), 5)
+
+    def test_several_files(self):
+        """ Entre fichiers, seul le premier QSO d'une clé est gardé. """
+        other = os.path.join(self.tmpdir.name, 'other.adif')
+        with open(other, 'w', encoding='utf-8') as f:
+            f.write(DUPLICATED_LOG.split("\n", 1)[0] + "\n")
+        self.assertEqual(len(self.load([other, self.path])), 5)
+
+    def test_store(self):
+        """ La base SQLite garde les mêmes QSO que la QSOTable. """
+        with qso_store.QSOStore(':memory:') as store:
+            store.sync([self.path])
+            stored = sorted(map(tuple, store), key=repr)
+        self.assertEqual(stored, sorted(map(tuple, self.load([self.path])), key=repr))
+
+    def test_incremental(self):
+        """ Le mode incrémental ignore les mêmes doublons que le rapport complet. """
+        state = analyze_adif.load_state(self.path, common.MY_LOCATOR, only=['schedule'])
+        self.assertEqual(analyze_adif.update_state(state, self.path), 8)
+        expected = ScheduleAnalysis().run(self.load([self.path]))
+        self.assertEqual(state['analyses'][0].result(), expected.result())
+
+
+class IncrementalOutputTest(unittest.TestCase):
+    """ Options de sortie (--format, --output) des modes incrémental et surveillance. """
+
+    def test_json_to_file(self):
+        """ Le mode incrémental écrit le même rapport JSON que le rapport complet. """
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'log.adif')
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(DUPLICATED_LOG)
+            output = os.path.join(tmpdir, 'report.json')
+            with contextlib.redirect_stderr(io.StringIO()):
+                analyze_adif.run_incremental(path, common.MY_LOCATOR, only=['schedule'], fmt='json', output=output)
+            with open(output, encoding='utf-8') as f:
+                report = f.read()
+            with contextlib.redirect_stderr(io.StringIO()):
+                table = common.load_qso_logs([path], use_cache=False)
+        self.assertEqual(report, results.render([('schedule', ScheduleAnalysis().run(table))], 'json'))
+
+    def test_watch_csv(self):
+        """ La surveillance rend le rapport dans le format demandé (ici un seul passage, en CSV). """
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'log.adif')
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(DUPLICATED_LOG)
+            output = io.StringIO()
+            with mock.patch('time.sleep', side_effect=KeyboardInterrupt), \
+                    contextlib.redirect_stdout(output), contextlib.redirect_stderr(io.StringIO()):
+                analyze_adif.watch(path, common.MY_LOCATOR, only=['schedule'], fmt='csv')
+            with contextlib.redirect_stderr(io.StringIO()):
+                table = common.load_qso_logs([path], use_cache=False)
+        self.assertEqual(output.getvalue(), results.render([('schedule', ScheduleAnalysis().run(table))], 'csv'))
+
+
+class ProfilingTest(unittest.TestCase):
+    """ Décompte des QSO ignorés par le profilage. """
+
+    def test_same_count_for_table_and_store(self):
+        """ En mémoire ou via la base SQLite, une analyse ignore les mêmes QSO. """
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'log.adif')
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(DUPLICATED_LOG)
+            with contextlib.redirect_stderr(io.StringIO()):
+                table = common.load_qso_logs([path], use_cache=False)
+            with qso_store.QSOStore(':memory:') as store:
+                store.sync([path])
+                for name in ('map', 'weekly', 'mode', 'schedule', 'snr'):
+                    counts = [profiling.run_counted(analyze_adif.build_analysis(name, common.MY_LOCATOR), records)
+                              for records in (table, store)]
+                    self.assertEqual(counts[0], counts[1], name)
+                    self.assertIsNotNone(counts[0][1], name)
+
+    def test_json_output(self):
+        """ Avec --profile --format json, stdout ne contient que le rapport JSON. """
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'log.adif')
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(DUPLICATED_LOG)
+            args = parse(['-f', path, '--no-cache', '--profile', '--format', 'json', 'schedule', 'mode'])
+            args.only = args.analyses
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output), contextlib.redirect_stderr(io.StringIO()):
+                analyze_adif.run_report(args)
+        self.assertEqual(set(json.loads(output.getvalue())), {'schedule', 'mode'})
+
+
+if __name__ == "__main__":
+    unittest.main()
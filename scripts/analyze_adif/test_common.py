@@ -0,0 +1,180 @@
+""" Tests de la lecture des fichiers ADIF : découpage parallèle et invalidation du cache de parsing. """
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import common
+from test_analyze_adif import adif_record
+
+
+def qso_record(i, comment=None):
+    """ Enregistrement ADIF d'un QSO numéroté i, avec un commentaire éventuel. """
+    fields = {'CALL': f'F{i}ABC', 'QSO_DATE': '20240101', 'TIME_ON': f'{i // 60 % 24:02d}{i % 60:02d}00',
+              'FREQ': '14.074', 'MODE': 'FT8', 'GRIDSQUARE': 'JN33'}
+    if comment is not None:
+        fields['COMMENT'] = comment
+    return adif_record(**fields)
+
+
+class ParseTestCase(unittest.TestCase):
+    """ Fichier ADIF temporaire et comparaison de QSOTable. """
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.path = os.path.join(self.tmpdir.name, 'log.adif')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def write(self, content):
+        """ Écrit content dans le fichier ADIF du test. """
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write(content)
+
+    def assertSameTable(self, table, expected):  # pylint: disable=invalid-name
+        """ Mêmes colonnes octet pour octet (NaN compris), et mêmes chaînes internées. """
+        self.assertEqual({name: column.tobytes() for name, column in table.columns.items()},
+                         {name: column.tobytes() for name, column in expected.columns.items()})
+        self.assertEqual(table.strings, expected.strings)
+
+
+@mock.patch.object(common, 'MIN_RANGE_SIZE', 64)
+class ParallelParsingTest(ParseTestCase):
+    """ La lecture parallèle donne exactement la QSOTable d'une lecture séquentielle. """
+
+    def test_confirmed_boundaries(self):
+        """ Sans <EOR> dans les valeurs, toutes les plages sont confirmées et lues en parallèle. """
+        self.write("".join(qso_record(i) for i in range(200)))
+        serial = common.parse_qso_table(self.path)
+        self.assertEqual(len(serial), 200)
+        for jobs in (2, 3, 8):
+            ranges = common.split_adif_file(self.path, jobs)
+            self.assertEqual(len(ranges), jobs)
+            for start, end in ranges[:-1]:
+                self.assertTrue(common.parse_adif_part(self.path, start, end)[1])
+            self.assertSameTable(common.parse_qso_table(self.path, jobs=jobs), serial)
+
+    def test_comment_boundaries(self):
+        """ <EOR> dans des commentaires : plages confirmées, puis repli à la première qui ne l'est pas. """
+        self.write("".join(qso_record(i, 'a <EOR> b' if i % 7 == 0 else None) for i in range(200)))
+        serial = common.parse_qso_table(self.path)
+        self.assertEqual(len(serial), 200)
+        confirmed = set()
+        for jobs in (2, 3, 8):
+            ranges = common.split_adif_file(self.path, jobs)
+            confirmed.update(common.parse_adif_part(self.path, start, end)[1] for start, end in ranges[:-1])
+            self.assertSameTable(common.parse_qso_table(self.path, jobs=jobs), serial)
+        self.assertEqual(confirmed, {True, False})
+
+    def test_unconfirmed_boundary(self):
+        """ Frontière candidate dans un COMMENT : le reste du fichier est relu séquentiellement. """
+        self.write("".join([*(qso_record(i) for i in range(4)),
+                            qso_record(4, 'x' * 400 + ' <EOR> ' + 'y' * 40),
+                            *(qso_record(i) for i in range(5, 9))]))
+        ranges = common.split_adif_file(self.path, 2)
+        self.assertEqual(len(ranges), 2)
+        # La coupure tombe après le <EOR> du commentaire, que le tokeniseur ne lit pas comme une fin
+        _, confirmed = common.parse_adif_part(self.path, *ranges[0])
+        self.assertFalse(confirmed)
+        serial = common.parse_qso_table(self.path)
+        self.assertEqual(len(serial), 9)
+        self.assertSameTable(common.parse_qso_table(self.path, jobs=2), serial)
+
+    def test_fields(self):
+        """ La projection des champs est la même en parallèle. """
+        self.write("".join(qso_record(i, 'c <eor> d' if i % 3 == 0 else None) for i in range(50)))
+        fields = frozenset({'CALL', 'QSO_DATE', 'TIME_ON'})
+        self.assertSameTable(common.parse_qso_table(self.path, jobs=4, fields=fields),
+                             common.parse_qso_table(self.path, fields=fields))
+
+    def test_small_file(self):
+        """ Fichier plus petit que MIN_RANGE_SIZE : une seule plage, lecture séquentielle. """
+        self.write(qso_record(0))
+        self.assertEqual(len(common.split_adif_file(self.path, 4)), 1)
+        self.assertEqual(len(common.parse_qso_table(self.path, jobs=4)), 1)
+
+
+class ParseCacheTest(ParseTestCase):
+    """ Invalidation du cache de parsing <fichier>.cache de load_qso_table. """
+
+    def setUp(self):
+        super().setUp()
+        self.write("".join(qso_record(i) for i in range(20)))
+        self.set_mtime(1_700_000_000)
+
+    def set_mtime(self, seconds):
+        """ Fixe la date de modification du fichier ADIF. """
+        os.utime(self.path, ns=(seconds * 10**9, seconds * 10**9))
+
+    def load(self, fields=common.QSO_FIELDS):
+        """ (QSOTable de load_qso_table, le fichier a-t-il été parsé). """
+        with mock.patch.object(common, 'parse_qso_table', wraps=common.parse_qso_table) as parse:
+            table = common.load_qso_table(self.path, fields=fields)
+        return table, parse.called
+
+    def rewrite(self, content, seconds):
+        """ Remplace le contenu du fichier ADIF et fixe sa date de modification. """
+        self.write(content)
+        self.set_mtime(seconds)
+
+    def test_unchanged(self):
+        """ Fichier inchangé : la table vient du cache. """
+        table, parsed = self.load()
+        self.assertTrue(parsed)
+        cached, parsed = self.load()
+        self.assertFalse(parsed)
+        self.assertSameTable(cached, table)
+
+    def test_size_change(self):
+        """ Fichier complété : reparsé. """
+        self.load()
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(qso_record(20))
+        self.set_mtime(1_700_000_000)
+        table, parsed = self.load()
+        self.assertTrue(parsed)
+        self.assertEqual(len(table), 21)
+
+    def test_mtime_change(self):
+        """ Seule la date a changé : l'empreinte est la même, la table vient du cache dont la clé est rafraîchie. """
+        expected, _ = self.load()
+        self.set_mtime(1_700_000_100)
+        table, parsed = self.load()
+        self.assertFalse(parsed)
+        self.assertSameTable(table, expected)
+        with mock.patch.object(common, 'file_digest', wraps=common.file_digest) as digest:
+            self.load()
+        self.assertFalse(digest.called)
+
+    def test_same_size_new_contents(self):
+        """ Même taille, autre contenu et autre date : l'empreinte diffère, le fichier est reparsé. """
+        self.load()
+        with open(self.path, encoding='utf-8') as f:
+            content = f.read()
+        self.rewrite(content.replace('F0ABC', 'F0XYZ'), 1_700_000_100)
+        table, parsed = self.load()
+        self.assertTrue(parsed)
+        self.assertEqual(table.strings['call'][table.columns['call'][0]], 'F0XYZ')
+
+    def test_version_mismatch(self):
+        """ Cache d'une autre version : ignoré, puis réécrit dans la version courante. """
+        expected, _ = self.load()
+        with mock.patch.object(common, 'CACHE_VERSION', common.CACHE_VERSION + 1):
+            table, parsed = self.load()
+            self.assertTrue(parsed)
+            self.assertSameTable(table, expected)
+            self.assertFalse(self.load()[1])
+        self.assertTrue(self.load()[1])
+
+    def test_missing_fields(self):
+        """ Cache sans les champs demandés : reparsé avec ses champs et les nouveaux. """
+        self.load(fields={'CALL', 'QSO_DATE'})
+        table, parsed = self.load(fields={'CALL', 'FREQ'})
+        self.assertTrue(parsed)
+        self.assertFalse(self.load(fields={'QSO_DATE', 'FREQ'})[1])
+        self.assertEqual(len(table), 20)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,216 @@
+""" Tests de la recherche des entités cty.dat (préfixes, indicatifs exacts, indicatifs composés). """
+import os
+import random
+import tempfile
+import unittest
+import contextlib
+import io
+
+import common
+import qso_store
+from analyze_by_zone import ZoneAnalysis
+from cty import CTY, UNKNOWN
+from test_analyze_adif import adif_record
+
+# Extrait de cty.dat : préfixes imbriqués (K, KH6 ; EA, EA8), indicatifs exacts et surcharges
+CTY_DAT = """\
+France:                   14:  27:  EU:   46.00:    -2.00:    -1.0:  F:
+    F,HW,HX,HY,TH,TM,TO(08)[11],TP,TQ,TV,TW,TX;
+Spain:                    14:  37:  EU:   40.32:     3.43:    -1.0:  EA:
+    AM,AN,AO,EA,EB,EC,ED,EE,EF,EG,EH;
+Canary Islands:           33:  36:  AF:   28.32:    15.85:     0.0:  EA8:
+    AM8,AN8,AO8,EA8,EB8,EC8,ED8,EE8,EF8,EG8,EH8;
+United States:            05:  08:  NA:   37.53:    91.67:     5.0:  K:
+    AA,AB,AC,K,N,W,
+    =W1AW(4)[7];
+Hawaii:                   31:  61:  OC:   21.12:   157.48:    10.0:  KH6:
+    AH6,AH7,KH6,KH7,NH6,NH7,WH6,WH7;
+Alaska:                   01:  01:  NA:   61.40:   148.87:     8.0:  KL:
+    AL,KL,NL,WL,=KL7AA/P;
+England:                  14:  27:  EU:   52.77:     1.47:     0.0:  G:
+    2E,G,GX,M,=G4XYZ/P;
+European Russia:          16:  29:  EU:   53.65:   -41.37:    -4.0:  UA:
+    R,U,UA9(17)[30]<55.88/-84.08>{AS}~-7.0~;
+"""
+
+
+class CtyTestCase(unittest.TestCase):
+    """ cty.dat de CTY_DAT écrit dans un répertoire temporaire. """
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.path = os.path.join(self.tmpdir.name, 'cty.dat')
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write(CTY_DAT)
+        self.cty = CTY(self.path)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def entity(self, country):
+        """ Entrée cty.dat de l'entité country, sans surcharge. """
+        return self.cty.countries[country]
+
+
+class PrefixLookupTest(CtyTestCase):
+    """ Plus long préfixe par bisection sur la table triée, indicatifs exacts, mémo et lots. """
+
+    def linear_lookup(self, callsign):
+        """ Plus long préfixe de callsign par parcours de tous les préfixes. """
+        matches = [prefix for prefix in self.cty.prefix if callsign.startswith(prefix)]
+        return self.cty.prefix[max(matches, key=len)] if matches else None
+
+    def random_callsigns(self, count):
+        """ Indicatifs aléatoires : un préfixe connu suivi de caractères, ou des caractères seuls. """
+        rng = random.Random(0)
+        prefixes = sorted(self.cty.prefix)
+        alphabet = 'ABEFGHKLMNORSTUWX0126789'
+        for _ in range(count):
+            start = rng.choice(prefixes) if rng.random() < 0.7 else ''
+            yield start + ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 4)))
+
+    def test_prefix_lookup(self):
+        """ Même entrée qu'un parcours linéaire des préfixes, pour des indicatifs aléatoires. """
+        for callsign in self.random_callsigns(5000):
+            self.assertIs(self.cty.prefix_lookup(callsign), self.linear_lookup(callsign), callsign)
+
+    def test_nested_prefixes(self):
+        """ Le plus long préfixe l'emporte, y compris quand un préfixe plus long est trié entre les deux. """
+        self.assertEqual(self.cty.resolve('K1ABC').country, 'United States')
+        self.assertEqual(self.cty.resolve('KH6ABC').country, 'Hawaii')
+        self.assertEqual(self.cty.resolve('KH7ABC').country, 'Hawaii')
+        self.assertEqual(self.cty.resolve('KH8ABC').country, 'United States')
+        self.assertEqual(self.cty.resolve('EA8XYZ').country, 'Canary Islands')
+        self.assertEqual(self.cty.resolve('EA9XYZ').country, 'Spain')
+        self.assertIs(self.cty.resolve('9A1ABC'), UNKNOWN)
+        self.assertIs(self.cty.resolve(''), UNKNOWN)
+
+    def test_exact_callsigns(self):
+        """ Un indicatif =CALL prime sur les préfixes, avec ses propres surcharges. """
+        w1aw = self.cty.resolve('W1AW')
+        self.assertEqual((w1aw.country, w1aw.cq_zone, w1aw.itu_zone), ('United States', 4, 7))
+        self.assertIs(self.cty.resolve('W1AX'), self.entity('United States'))
+        # Seul l'indicatif exact est concerné, pas ceux qui le prolongent
+        self.assertIs(self.cty.resolve('W1AWX'), self.entity('United States'))
+        # Un indicatif composé exact n'est pas découpé
+        self.assertIs(self.cty.resolve('KL7AA/P'), self.entity('Alaska'))
+
+    def test_memo_and_batch(self):
+        """ La recherche mémorisée et la recherche par lot donnent les mêmes entrées que resolve. """
+        callsigns = list(self.random_callsigns(500)) + ['W1AW', 'EA8/F4LNO', 'F4LNO/MM']
+        batch = self.cty.callsign_lookups(callsigns)
+        self.assertEqual(set(batch), set(callsigns))
+        for callsign in callsigns:
+            expected = self.cty.resolve(callsign)
+            self.assertIs(batch[callsign], expected)
+            self.assertIs(self.cty.callsign_lookup(callsign), expected)
+            self.assertIs(self.cty.callsign_lookup(callsign), expected)
+
+
+class CompoundCallsignTest(CtyTestCase):
+    """ Indicatifs composés : préfixe de localisation, suffixes portables, /MM et /AM. """
+
+    def test_designator(self):
+        """ La partie la plus courte localise l'indicatif, qu'elle soit avant ou après. """
+        self.assertIs(self.cty.resolve('EA8/F4LNO'), self.entity('Canary Islands'))
+        self.assertIs(self.cty.resolve('F4LNO/KH6'), self.entity('Hawaii'))
+        self.assertIs(self.cty.resolve('F4LNO/EA8'), self.entity('Canary Islands'))
+        self.assertIs(self.cty.resolve('EA8/F4LNO/P'), self.entity('Canary Islands'))
+
+    def test_portable_suffixes(self):
+        """ /P, /QRP ou un chiffre ne changent pas l'entité de l'indicatif. """
+        for callsign in ('F4LNO/P', 'F4LNO/QRP', 'F4LNO/3', 'KH6AB/P'):
+            self.assertIs(self.cty.resolve(callsign), self.cty.resolve(callsign.split('/', maxsplit=1)[0]), callsign)
+
+    def test_no_entity(self):
+        """ Mobile maritime ou aéronautique : pas d'entité. """
+        for callsign in ('F4LNO/MM', 'F4LNO/AM', 'EA8/F4LNO/MM'):
+            self.assertIs(self.cty.resolve(callsign), UNKNOWN, callsign)
+
+
+class OverrideTest(CtyTestCase):
+    """ Surcharges (zone CQ) [zone ITU] <lat/lon> {continent} ~décalage UTC~ après un préfixe. """
+
+    def test_all_overrides(self):
+        """ Chaque valeur surchargée remplace celle de l'entité, les autres sont gardées. """
+        entry = self.cty.resolve('UA9ABC')
+        self.assertEqual(entry.country, 'European Russia')
+        self.assertEqual(entry.cq_zone, 17)
+        self.assertEqual(entry.itu_zone, 30)
+        self.assertEqual(entry.lat, 55.88)
+        self.assertEqual(entry.lon, -84.08)
+        self.assertEqual(entry.continent, 'AS')
+        self.assertEqual(entry.utc_offset, -7.0)
+        self.assertEqual(entry.dxcc_prefix, 'UA')
+        # Le préfixe surchargé ne modifie pas l'entité
+        self.assertEqual(self.cty.resolve('UA1ABC'),
+                         ('European Russia', 53.65, -41.37, 16, 29, 'EU', -4.0, 'UA'))
+
+    def test_zone_overrides(self):
+        """ Surcharge des zones seules : position, continent et décalage de l'entité. """
+        self.assertEqual(self.cty.resolve('TO5X'), self.entity('France')._replace(cq_zone=8, itu_zone=11))
+        self.assertIs(self.cty.resolve('TM5X'), self.entity('France'))
+
+
+class ZoneAnalysisTest(CtyTestCase):
+    """ Comptes par continent, zone CQ et zone ITU de analyze_by_zone. """
+
+    # (indicatif, fréquence) -> continent, zone CQ et zone ITU attendus, ou None sans entité
+    QSOS = [
+        ('F4ABC', '14.074', ('EU', 14, 27)),
+        ('TO5X', '14.074', ('EU', 8, 11)),
+        ('EA8/F4LNO', '7.074', ('AF', 33, 36)),
+        ('F4LNO/KH6', '14.074', ('OC', 31, 61)),
+        ('W1AW', '14.074', ('NA', 4, 7)),
+        ('K1ABC', '7.074', ('NA', 5, 8)),
+        ('UA9ABC', '14.074', ('AS', 17, 30)),
+        ('F4LNO/MM', '14.074', None),
+        ('9A1ABC', '7.074', None),
+    ]
+
+    def setUp(self):
+        super().setUp()
+        self.log = os.path.join(self.tmpdir.name, 'log.adif')
+        with open(self.log, 'w', encoding='utf-8') as f:
+            for i, (call, freq, _) in enumerate(self.QSOS):
+                f.write(adif_record(CALL=call, FREQ=freq, QSO_DATE='20240101', TIME_ON=f'12{i:02d}00'))
+        with contextlib.redirect_stderr(io.StringIO()):
+            self.table = common.load_qso_logs([self.log], use_cache=False)
+
+    def expected(self):
+        """ {(groupe, clé): {bande: nombre}} attendu d'après QSOS. """
+        counts = {}
+        for _, freq, zones in self.QSOS:
+            if zones is None:
+                continue
+            band = '20m' if freq == '14.074' else '40m'
+            for group, key in zip(('continent', 'cq_zone', 'itu_zone'), zones):
+                bands = counts.setdefault((group, key), {})
+                bands[band] = bands.get(band, 0) + 1
+        return counts
+
+    def assertCounts(self, analysis):  # pylint: disable=invalid-name
+        """ Comptes de analysis conformes à QSOS. """
+        self.assertEqual({(group, key): dict(bands) for group, key, bands in analysis.groups()}, self.expected())
+        self.assertEqual((analysis.total_count, analysis.unknown_count), (7, 2))
+
+    def test_table(self):
+        """ Lecture par lots d'une QSOTable. """
+        self.assertCounts(ZoneAnalysis(cty_dat_path=self.path).run(self.table))
+
+    def test_qso_by_qso(self):
+        """ Lecture QSO par QSO (mode incrémental). """
+        analysis = ZoneAnalysis(cty_dat_path=self.path)
+        for qso in self.table:
+            analysis.update(qso)
+        self.assertCounts(analysis)
+
+    def test_store(self):
+        """ Agrégats de la base SQLite. """
+        with qso_store.QSOStore(':memory:') as store:
+            store.sync([self.log])
+            self.assertCounts(ZoneAnalysis(cty_dat_path=self.path).run(store))
+
+
+if __name__ == "__main__":
+    unittest.main()
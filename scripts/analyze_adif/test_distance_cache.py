@@ -0,0 +1,73 @@
+""" Tests du cache persistant des distances et azimuts. """
+import os
+import tempfile
+import unittest
+
+import geodesy
+import locator
+from distance_cache import DistanceCache
+
+HOME = 'JN33'
+
+
+class DistanceCacheTest(unittest.TestCase):
+    """ Valeurs, bornes et ordre d'éviction (moins récemment utilisé) du cache. """
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.path = os.path.join(self.tmpdir.name, 'distances.cache')
+        self.cache = DistanceCache(path=self.path, max_stations=2, max_grids=3)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def cached_grids(self, station=HOME):
+        """ Locators contactés en cache pour station, du moins au plus récemment utilisé. """
+        return list(self.cache.stations[station]['grids'])
+
+    def test_values(self):
+        """ Mêmes distance et azimut qu'un calcul direct, par lookup comme par lookup_many. """
+        lat, lon = locator.locator_to_latlon(HOME)
+        other_lat, other_lon = locator.locator_to_latlon('FN42')
+        expected = (geodesy.haversine_distance(lat, lon, other_lat, other_lon),
+                    geodesy.initial_bearing(lat, lon, other_lat, other_lon))
+        distances, bearings = self.cache.lookup_many(HOME, ['FN42'])
+        self.assertAlmostEqual(float(distances[0]), expected[0], places=6)
+        self.assertAlmostEqual(float(bearings[0]), expected[1], places=6)
+        self.assertEqual(self.cache.lookup(HOME, 'FN42'), (float(distances[0]), float(bearings[0])))
+
+    def test_lookup_eviction(self):
+        """ Au plus max_grids locators ; un locator relu échappe à l'éviction. """
+        for grid in ('FN42', 'JO62', 'PM95'):
+            self.cache.lookup(HOME, grid)
+        self.cache.lookup(HOME, 'FN42')
+        self.cache.lookup(HOME, 'QF56')
+        self.assertEqual(self.cached_grids(), ['PM95', 'FN42', 'QF56'])
+
+    def test_lookup_many_eviction(self):
+        """ lookup_many rafraîchit les locators trouvés avant d'ajouter les nouveaux. """
+        self.cache.lookup_many(HOME, ['FN42', 'JO62', 'PM95'])
+        self.cache.lookup_many(HOME, ['JO62', 'QF56'])
+        self.assertEqual(self.cached_grids(), ['PM95', 'JO62', 'QF56'])
+        self.cache.lookup_many(HOME, ['GG87', 'JO62'])
+        self.assertEqual(self.cached_grids(), ['QF56', 'JO62', 'GG87'])
+
+    def test_station_eviction(self):
+        """ Au plus max_stations stations ; la moins récemment utilisée est oubliée. """
+        for station in ('JN33', 'IN88', 'JN33', 'KP20'):
+            self.cache.lookup(station, 'FN42')
+        self.assertEqual(list(self.cache.stations), ['JN33', 'KP20'])
+
+    def test_persistence(self):
+        """ Le cache relu garde ses valeurs et leur ordre d'utilisation. """
+        self.cache.lookup_many(HOME, ['FN42', 'JO62'])
+        self.cache.lookup(HOME, 'FN42')
+        self.cache.lookup(HOME, 'PM95')
+        self.cache.save()
+        reloaded = DistanceCache(path=self.path, max_grids=3)
+        self.assertEqual(list(reloaded.stations[HOME]['grids']), ['JO62', 'FN42', 'PM95'])
+        self.assertFalse(reloaded.dirty)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+""" Tests de l'index spatial (arbre k-d) contre une recherche exhaustive. """
+import random
+import unittest
+
+import geodesy
+from spatial_index import GridIndex
+
+
+def random_points(count, seed=0):
+    """ Points (lat, lon) aléatoires, avec des points sur l'antiméridien, aux pôles et en double. """
+    rng = random.Random(seed)
+    points = [(rng.uniform(-90, 90), rng.uniform(-180, 180)) for _ in range(count)]
+    points += [(0.0, 180.0), (0.0, -180.0), (10.0, 179.99), (10.0, -179.99), (-45.0, 179.5),
+               (90.0, 0.0), (-90.0, 0.0), (89.9, 45.0), (-89.9, -135.0)]
+    # Points confondus : à distance égale, le premier ajouté passe devant
+    points += [points[3], points[0], (10.0, 179.99), (90.0, 0.0), points[0]]
+    return points
+
+
+class GridIndexTest(unittest.TestCase):
+    """ nearest et within donnent les mêmes points, dans le même ordre, qu'un parcours de tous les points. """
+
+    def setUp(self):
+        self.points = random_points(300)
+        # La valeur d'un point est son rang d'ajout
+        self.index = GridIndex((lat, lon, rank) for rank, (lat, lon) in enumerate(self.points))
+        rng = random.Random(1)
+        self.targets = [(rng.uniform(-90, 90), rng.uniform(-180, 180)) for _ in range(30)]
+        self.targets += [(0.0, 180.0), (0.0, -179.9), (10.0, 179.99), (-45.0, -179.9),
+                         (90.0, 0.0), (-90.0, 90.0), (89.5, -170.0), *self.points[:3]]
+
+    def exhaustive(self, lat, lon):
+        """ Liste (distance km, rang) de tous les points, triée par distance puis rang. """
+        return sorted((geodesy.haversine_distance(plat, plon, lat, lon), rank)
+                      for rank, (plat, plon) in enumerate(self.points))
+
+    def assertSameResults(self, found, expected, msg):  # pylint: disable=invalid-name
+        """ Mêmes valeurs dans le même ordre, mêmes distances. """
+        self.assertEqual([value for _, value in found], [value for _, value in expected], msg)
+        for (distance, _), (expected_distance, _) in zip(found, expected):
+            self.assertAlmostEqual(distance, expected_distance, places=6, msg=msg)
+
+    def test_nearest(self):
+        """ Les k plus proches voisins, pour k de 1 à plus que le nombre de points. """
+        for lat, lon in self.targets:
+            expected = self.exhaustive(lat, lon)
+            for k in (1, 2, 7, 50, len(self.points) + 3):
+                self.assertSameResults(self.index.nearest(lat, lon, k), expected[:k], (lat, lon, k))
+
+    def test_within(self):
+        """ Les points à moins d'un rayon, jusqu'à la demi-circonférence terrestre. """
+        for lat, lon in self.targets:
+            expected = self.exhaustive(lat, lon)
+            for radius in (0.0, 50.0, 500.0, 3000.0, 12000.0, 21000.0):
+                self.assertSameResults(self.index.within(lat, lon, radius),
+                                       [item for item in expected if item[0] <= radius], (lat, lon, radius))
+
+    def test_ties(self):
+        """ À distance égale (points confondus), le point ajouté en premier passe devant. """
+        lat, lon = self.points[0]
+        self.assertEqual([rank for _, rank in self.index.nearest(lat, lon, 3)],
+                         [0, len(self.points) - 4, len(self.points) - 1])
+        self.assertEqual([rank for _, rank in self.index.within(90.0, 0.0, 0.0)],
+                         [rank for rank, point in enumerate(self.points) if point == (90.0, 0.0)])
+
+    def test_empty(self):
+        """ Index vide ou k nul : aucun résultat. """
+        self.assertEqual(GridIndex([]).nearest(0.0, 0.0, 3), [])
+        self.assertEqual(GridIndex([]).within(0.0, 0.0, 1000.0), [])
+        self.assertEqual(self.index.nearest(0.0, 0.0, 0), [])
+
+
+if __name__ == "__main__":
+    unittest.main()